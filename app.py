@@ -1,14 +1,55 @@
 from flask import Flask
 from routes.routes import register_routes
+import atexit
 import os
 from dotenv import load_dotenv
+from db import close_pool, get_connection
+from services.dimension_cache import dimension_cache
+from services import migrations
 
 load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY")
 
-register_routes(app)
+def install_schema():
+    """Apply pending schema migrations. Run once per deployment, not per worker."""
+    try:
+        conn = migrations.connect()
+        try:
+            migrations.upgrade(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Could not apply schema migrations: {e}")
+
+
+def warm_caches():
+    if os.getenv("DIM_CACHE_WARM") == "1":
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                dimension_cache.warm(cur)
+
+
+def create_app(setup=True):
+    """Build the Flask app.
+
+    With setup=True (the dev server) the schema is installed and caches
+    warmed here. Under gunicorn, gunicorn.conf.py does the schema once in
+    the master and the per-worker pool and caches after each fork, so
+    wsgi.py passes setup=False.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.getenv("SECRET_KEY")
+
+    register_routes(app)
+    atexit.register(close_pool)
+
+    if setup:
+        install_schema()
+        warm_caches()
+        # Don't carry startup connections into forked workers; the pool reopens lazily.
+        close_pool()
+    return app
+
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    create_app().run(debug=True, host="0.0.0.0", port=5000)
@@ -0,0 +1,449 @@
+"""Synthetic dataset for scale testing.
+
+Creates the tables the services expect and fills them with realistic-looking
+data: Arabic names, Egyptian phone numbers and plates, skewed supplier and
+factory volumes, weekday/seasonal naqla counts and drifting prices. Rows are
+streamed into Postgres with COPY into the bare tables of the first
+migration; the remaining migrations (search, change tracking, indexes,
+foreign keys) run after the load, so it neither fires their triggers nor
+maintains their indexes row by row.
+
+Everything is derived from --seed (each table has its own random stream),
+so the same seed, scale and date range always give the same database:
+
+    python -m benchmarks.generate_data --scale 1 --seed 42 --drop
+
+Scale 1 is about a million naqla rows; --scale 0.01 makes a quick dev set.
+The connection comes from the same PG_* settings as the app.
+"""
+import argparse
+import bisect
+import hashlib
+import itertools
+import math
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from services import migrations
+
+# Row counts at --scale 1, and the floor each keeps at small scales.
+SCALE_1 = {
+    "suppliers": (10_000, 20),
+    "truck_owners": (8_000, 20),
+    "factories": (60, 5),
+    "zones": (150, 5),
+    "representatives": (200, 5),
+    "users": (40, 5),
+    "main": (1_000_000, 500),
+    "transactions": (200_000, 100),
+    "custody": (100_000, 100),
+    "suppliers_payment": (120_000, 50),
+    "truck_owners_payment": (200_000, 50),
+}
+
+# The migration that creates the tables, before any index or trigger.
+BASE_TABLES_VERSION = 1
+
+# table -> serial column whose sequence must continue after the explicit ids
+SERIAL_COLUMNS = {
+    "dim_date": "date_id",
+    "suppliers": "supplier_id",
+    "representatives": "representative_id",
+    "zones": "zone_id",
+    "factories": "factory_id",
+    "bank_name": "bank_id",
+    "truck_owners": "owner_id",
+    "main": "naqla_id",
+    "senders": "sender_id",
+    "users": "user_id",
+    "custody": "custody_id",
+    "suppliers_payment": "supplier_transaction_id",
+    "truck_owners_payment": "truck_owner_transaction_id",
+}
+
+# Dropped by --drop, dependants first.
+TABLES = [
+    "schema_migrations", "rollup_dirty_dates", "rollup_monthly", "rollup_daily",
+    "custody_monthly", "party_balances_monthly", "party_balances",
+    "main_changes", "table_versions", "custody", "users", "transactions", "senders",
+    "suppliers_payment", "truck_owners_payment", "main", "trucks", "truck_owners",
+    "bank_name", "factories", "zones", "representatives", "suppliers", "dim_date",
+]
+
+FIRST_NAMES = [
+    "محمد", "أحمد", "محمود", "مصطفى", "علي", "حسن", "حسين", "إبراهيم", "عبد الله", "عبد الرحمن",
+    "يوسف", "عمر", "خالد", "سعيد", "طارق", "عادل", "سامي", "ماهر", "رامي", "هشام",
+    "شريف", "وليد", "أشرف", "جمال", "كمال", "صلاح", "فتحي", "رضا", "ناصر", "عماد",
+    "إسلام", "كريم", "هاني", "أيمن", "مجدي", "حمدي", "سيد", "عصام", "ياسر", "منير",
+]
+FAMILY_NAMES = [
+    "السيد", "عبد العزيز", "الشافعي", "المصري", "النجار", "الحداد", "الشربيني", "البنا", "الجمال", "حسانين",
+    "عبد الحميد", "الدسوقي", "سليمان", "عطية", "شحاتة", "منصور", "رمضان", "عثمان", "بدوي", "فرج",
+    "الغريب", "القاضي", "زكي", "عوض", "خليل", "مرسي", "العطار", "صالح", "نصار", "قنديل",
+]
+PLACES = [
+    "القاهرة", "الجيزة", "الإسكندرية", "السويس", "الإسماعيلية", "بورسعيد", "دمياط", "المنصورة", "طنطا", "الزقازيق",
+    "بنها", "شبين الكوم", "دمنهور", "كفر الشيخ", "الفيوم", "بني سويف", "المنيا", "أسيوط", "سوهاج", "قنا",
+    "الأقصر", "أسوان", "العريش", "الغردقة", "مرسى مطروح", "حلوان", "العاشر من رمضان", "السادات", "العامرية", "القطامية",
+    "العين السخنة", "برج العرب", "أبو رواش", "طرة", "الواسطى", "سمالوط", "ملوي", "إدفو", "كوم أمبو", "نجع حمادي",
+]
+FACTORY_KINDS = ["مصنع أسمنت", "مصنع طوب", "شركة حديد", "مصنع جبس", "محجر", "مصنع رخام"]
+BANKS = [
+    "البنك الأهلي المصري", "بنك مصر", "بنك القاهرة", "البنك التجاري الدولي", "بنك الإسكندرية",
+    "بنك قناة السويس", "البنك الزراعي المصري", "بنك فيصل الإسلامي", "إنستاباي", "فودافون كاش",
+    "أورنج كاش", "نقدي",
+]
+CASH_BANK_ID = BANKS.index("نقدي") + 1
+PLATE_LETTERS = "أبجدرسصطعفقلمنهوى"
+TRANSACTION_STATUSES = (["تمت"] * 95) + (["مرفوضة"] * 3) + (["معلقة"] * 2)
+PAYMENT_NOTES = [None] * 6 + ["دفعة تحت الحساب", "تسوية حساب الشهر", "دفعة مقدمة", "باقي حساب"]
+CUSTODY_INCOMING = ["عهدة من الإدارة", "تحويل عهدة", "استرداد مصروفات"]
+CUSTODY_OUTGOING = ["سولار", "صيانة سيارة", "رسوم طريق", "إكراميات تحميل", "مصاريف ميزان", "أدوات مكتبية", "وجبات"]
+
+
+def table_rng(seed, table):
+    # A str seed is hashed with SHA-512, so this doesn't depend on PYTHONHASHSEED.
+    return random.Random(f"{seed}:{table}")
+
+
+def scaled(name, scale):
+    count, floor = SCALE_1[name]
+    return max(floor, round(count * scale))
+
+
+class CumulativeWeights:
+    """Weighted index picks with bisect, fast enough for millions of rows."""
+
+    def __init__(self, weights):
+        self.cumulative = list(itertools.accumulate(weights))
+        self.total = self.cumulative[-1]
+
+    def pick(self, rng):
+        return bisect.bisect_right(self.cumulative, rng.random() * self.total)
+
+
+def zipf_weights(rng, n, s=1.1):
+    # A few big parties and a long tail, in random id order.
+    weights = [1 / (rank + 1) ** s for rank in range(n)]
+    rng.shuffle(weights)
+    return CumulativeWeights(weights)
+
+
+def unique_names(rng, n, make):
+    seen = set()
+    names = []
+    while len(names) < n:
+        name = make(rng)
+        if name in seen:
+            name = f"{name} {len(names) + 1}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def person_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(FAMILY_NAMES)}"
+
+
+def supplier_name(rng):
+    return ("الحاج " if rng.random() < 0.2 else "") + person_name(rng)
+
+
+def phone(rng):
+    return f"01{rng.choice('0125')}{rng.randrange(10 ** 8):08d}"
+
+
+def plate(rng):
+    letters = " ".join(rng.choice(PLATE_LETTERS) for _ in range(rng.choice((2, 3))))
+    return f"{letters} {rng.randrange(100, 10000)}"
+
+
+def money(value):
+    return f"{value:.2f}"
+
+
+class CopyStream:
+    """File-like object COPY reads from; rows are formatted as they're read."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._pending = ""
+        self.count = 0
+
+    def read(self, size=-1):
+        chunks, length = [self._pending], len(self._pending)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = "\t".join(r"\N" if value is None else str(value) for value in row) + "\n"
+            chunks.append(line)
+            length += len(line)
+            self.count += 1
+        data = "".join(chunks)
+        if size < 0:
+            self._pending = ""
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+
+class Generator:
+    def __init__(self, seed, scale, start, end, password):
+        self.seed = seed
+        self.scale = scale
+        self.days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        self.password = password
+        self.sizes = {name: scaled(name, scale) for name in SCALE_1}
+
+        # Shared shape of the data, drawn from its own stream so table
+        # sizes can change without reshuffling everything else.
+        rng = table_rng(seed, "shape")
+        self.supplier_weights = zipf_weights(rng, self.sizes["suppliers"])
+        self.factory_weights = zipf_weights(rng, self.sizes["factories"], s=0.8)
+        self.zone_weights = zipf_weights(rng, self.sizes["zones"], s=0.9)
+        self.bank_weights = zipf_weights(rng, len(BANKS), s=0.7)
+        self.day_weights = CumulativeWeights([self.day_weight(i, day) for i, day in enumerate(self.days)])
+        self.factory_base_price = [rng.uniform(650, 1100) for _ in range(self.sizes["factories"])]
+        self.zone_margin = [rng.uniform(20, 120) for _ in range(self.sizes["zones"])]
+        self.supplier_rep = [rng.randrange(self.sizes["representatives"]) + 1 for _ in range(self.sizes["suppliers"])]
+        # trucks per owner: mostly one or two, some fleets
+        self.owner_trucks = [min(40, int(rng.paretovariate(1.6))) for _ in range(self.sizes["truck_owners"])]
+        self.truck_count = sum(self.owner_trucks)
+
+    def day_weight(self, index, day):
+        # Fridays are quiet, volume grows over the range, summer is busier.
+        weekday = 0.25 if day.weekday() == 4 else 1.0
+        growth = 0.8 + 0.4 * index / max(1, len(self.days) - 1)
+        season = 1 + 0.15 * math.sin((day.timetuple().tm_yday - 80) / 365 * 2 * math.pi)
+        return weekday * growth * season
+
+    def years_in(self, day):
+        return (day - self.days[0]).days / 365
+
+    # One generator per table, yielding COPY rows in column order.
+
+    def dim_date(self):
+        for date_id, day in enumerate(self.days, 1):
+            # Same text as TO_CHAR(date, 'Day'), which the app uses for new dates.
+            yield date_id, day.isoformat(), day.year, day.month, day.day, day.strftime("%A").ljust(9)
+
+    def suppliers(self):
+        rng = table_rng(self.seed, "suppliers")
+        for supplier_id, name in enumerate(unique_names(rng, self.sizes["suppliers"], supplier_name), 1):
+            yield supplier_id, name, phone(rng)
+
+    def representatives(self):
+        rng = table_rng(self.seed, "representatives")
+        for rep_id, name in enumerate(unique_names(rng, self.sizes["representatives"], person_name), 1):
+            yield rep_id, name, phone(rng)
+
+    def zones(self):
+        rng = table_rng(self.seed, "zones")
+        names = unique_names(rng, self.sizes["zones"], lambda r: r.choice(PLACES))
+        yield from enumerate(names, 1)
+
+    def factories(self):
+        rng = table_rng(self.seed, "factories")
+        names = unique_names(rng, self.sizes["factories"], lambda r: f"{r.choice(FACTORY_KINDS)} {r.choice(PLACES)}")
+        yield from enumerate(names, 1)
+
+    def bank_name(self):
+        yield from enumerate(BANKS, 1)
+
+    def senders(self):
+        # transactions join senders to bank_name on the same id
+        yield from enumerate(BANKS, 1)
+
+    def truck_owners(self):
+        rng = table_rng(self.seed, "truck_owners")
+        for owner_id in range(1, self.sizes["truck_owners"] + 1):
+            yield owner_id, person_name(rng), phone(rng)
+
+    def trucks(self):
+        rng = table_rng(self.seed, "trucks")
+        self.truck_nums = unique_names(rng, self.truck_count, plate)
+        numbers = iter(self.truck_nums)
+        for owner_id, count in enumerate(self.owner_trucks, 1):
+            for _ in range(count):
+                yield next(numbers), owner_id
+
+    def main(self):
+        rng = table_rng(self.seed, "main")
+        total = self.sizes["main"]
+        weights = self.day_weights
+        for date_id, day in enumerate(self.days, 1):
+            share = (weights.cumulative[date_id - 1] - (weights.cumulative[date_id - 2] if date_id > 1 else 0)) / weights.total
+            rows_today = max(0, round(total * share * rng.gauss(1, 0.1)))
+            inflation = 1 + 0.25 * self.years_in(day)
+            for _ in range(rows_today):
+                supplier_id = self.supplier_weights.pick(rng) + 1
+                factory_id = self.factory_weights.pick(rng) + 1
+                zone_id = self.zone_weights.pick(rng) + 1
+                factory_price = round(self.factory_base_price[factory_id - 1] * inflation * rng.gauss(1, 0.03) * 2) / 2
+                sell_price = factory_price + round(max(5, self.zone_margin[zone_id - 1] * rng.gauss(1, 0.15)) * 2) / 2
+                weight = min(52, max(15, rng.gauss(38, 4)))
+                ohda = rng.choice((200, 300, 500, 1000, 1500)) if rng.random() < 0.3 else 0
+                rep_id = self.supplier_rep[supplier_id - 1] if rng.random() < 0.85 else rng.randrange(self.sizes["representatives"]) + 1
+                yield (None, date_id, rng.choice(self.truck_nums), supplier_id, factory_id, zone_id,
+                       money(weight), ohda, money(factory_price), money(sell_price), rep_id)
+
+    def transactions(self):
+        rng = table_rng(self.seed, "transactions")
+        count = self.sizes["transactions"]
+        days = sorted(self.day_weights.pick(rng) for _ in range(count))
+        for i, day_index in enumerate(days):
+            # Unique, random-looking 12-digit references: i * odd prime mod 10**12 never repeats.
+            reference = f"{(i * 982451653 + 104729) % 10 ** 12:012d}"
+            amount = round(rng.lognormvariate(7.6, 0.9))
+            yield (self.days[day_index].isoformat(), self.bank_weights.pick(rng) + 1, person_name(rng),
+                   phone(rng), amount, reference, rng.choice(TRANSACTION_STATUSES))
+
+    def users(self):
+        yield 1, "admin", self.password_hash(), "admin"
+        for user_id in range(2, self.sizes["users"] + 1):
+            role = "accountant" if user_id <= 3 else "employee"
+            yield user_id, f"user{user_id:03d}", self.password_hash(), role
+
+    def password_hash(self):
+        # werkzeug's pbkdf2 format, with a seed-derived salt so the dump is reproducible
+        if not hasattr(self, "_password_hash"):
+            salt = hashlib.sha256(f"{self.seed}:salt".encode()).hexdigest()[:16]
+            digest = hashlib.pbkdf2_hmac("sha256", self.password.encode(), salt.encode(), 600000).hex()
+            self._password_hash = f"pbkdf2:sha256:600000${salt}${digest}"
+        return self._password_hash
+
+    def custody(self):
+        rng = table_rng(self.seed, "custody")
+        employees = list(range(4, self.sizes["users"] + 1))
+        per_user = {user_id: [] for user_id in employees}
+        for _ in range(self.sizes["custody"]):
+            per_user[rng.choice(employees)].append(self.day_weights.pick(rng))
+        custody_id = 0
+        for user_id in employees:
+            balance = 0
+            for day_index in sorted(per_user[user_id]):
+                outgoing = round(rng.uniform(50, 3000) / 5) * 5
+                if balance < outgoing or rng.random() < 0.1:
+                    incoming, outgoing = round(rng.uniform(2000, 20000), -2), 0
+                    description = rng.choice(CUSTODY_INCOMING)
+                else:
+                    incoming, description = 0, rng.choice(CUSTODY_OUTGOING)
+                balance += incoming - outgoing
+                custody_id += 1
+                yield (custody_id, user_id, self.days[day_index].isoformat(), description,
+                       money(incoming), money(outgoing), money(balance))
+
+    def payments(self, table, party_count, party_weights, mean_amount):
+        rng = table_rng(self.seed, table)
+        count = self.sizes[table]
+        sigma = 0.8
+        mu = math.log(mean_amount) - sigma ** 2 / 2
+        days = sorted(self.day_weights.pick(rng) for _ in range(count))
+        for payment_id, day_index in enumerate(days, 1):
+            amount = max(100, round(rng.lognormvariate(mu, sigma), -2))
+            method = self.bank_weights.pick(rng) + 1
+            fees = 0 if method == CASH_BANK_ID else min(50, max(0.5, round(amount * 0.001, 2)))
+            party = party_weights.pick(rng) + 1 if party_weights else rng.randrange(party_count) + 1
+            yield (payment_id, int(self.days[day_index].strftime("%Y%m%d")), party,
+                   amount, money(fees), method, rng.choice(PAYMENT_NOTES))
+
+    def suppliers_payment(self):
+        # Roughly 90% of what suppliers are owed (weight * factory_price) gets paid.
+        mean = 0.9 * self.sizes["main"] * 38 * 900 / self.sizes["suppliers_payment"]
+        return self.payments("suppliers_payment", self.sizes["suppliers"], self.supplier_weights, mean)
+
+    def truck_owners_payment(self):
+        mean = 0.9 * self.sizes["main"] * 38 * 960 / self.sizes["truck_owners_payment"]
+        return self.payments("truck_owners_payment", self.sizes["truck_owners"], None, mean)
+
+
+# (table, columns) in load order; trucks before main, which picks from its plates.
+LOAD_ORDER = [
+    ("dim_date", "date_id, full_date, year, month, day, day_name"),
+    ("suppliers", "supplier_id, supplier_name, phone"),
+    ("representatives", "representative_id, representative_name, phone"),
+    ("zones", "zone_id, zone_name"),
+    ("factories", "factory_id, factory_name"),
+    ("bank_name", "bank_id, bank_name"),
+    ("senders", "sender_id, sender_name"),
+    ("truck_owners", "owner_id, owner_name, phone"),
+    ("trucks", "truck_num, owner_id"),
+    ("main", "naqla_id, date_id, truck_num, supplier_id, factory_id, zone_id, weight, ohda, factory_price, sell_price, representative_id"),
+    ("transactions", "date, sender, receiver, phone_number, amount, transaction_id, status"),
+    ("users", "user_id, username, password_hash, role"),
+    ("custody", "custody_id, user_id, date, description, incoming, outgoing, balance"),
+    ("suppliers_payment", "supplier_transaction_id, date_id, supplier_id, amount, transfer_fees, payment_method, notes"),
+    ("truck_owners_payment", "truck_owner_transaction_id, date_id, owner_id, amount, transfer_fees, payment_method, notes"),
+]
+
+
+def numbered(rows):
+    # main rows are yielded day by day; ids follow in that order
+    for naqla_id, row in enumerate(rows, 1):
+        yield (naqla_id,) + row[1:]
+
+
+def load(conn, generator):
+    with conn.cursor() as cur:
+        for table, columns in LOAD_ORDER:
+            started = time.perf_counter()
+            rows = getattr(generator, table)()
+            stream = CopyStream(numbered(rows) if table == "main" else rows)
+            cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN", stream, size=65536)
+            serial = SERIAL_COLUMNS.get(table)
+            if serial:
+                cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{serial}'), "
+                            f"GREATEST(1, (SELECT MAX({serial}) FROM {table})))")
+            print(f"{table}: {stream.count} rows in {time.perf_counter() - started:.1f}s")
+
+
+def run(args):
+    start, end = date.fromisoformat(args.start_date), date.fromisoformat(args.end_date)
+    if end < start:
+        sys.exit("--end-date is before --start-date")
+    generator = Generator(args.seed, args.scale, start, end, args.password)
+
+    conn = migrations.connect()
+    try:
+        if args.drop:
+            with conn.cursor() as cur:
+                cur.execute("DROP TABLE IF EXISTS " + ", ".join(TABLES) + " CASCADE")
+            conn.commit()
+        # Tables only; keys, indexes and triggers are cheaper to build after the data.
+        migrations.upgrade(conn, target=BASE_TABLES_VERSION)
+        with conn.cursor() as cur:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM main) OR EXISTS (SELECT 1 FROM users)")
+            if cur.fetchone()[0]:
+                sys.exit("The database already has data; pass --drop to replace it.")
+        load(conn, generator)
+        conn.commit()
+
+        migrations.upgrade(conn)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            cur.execute("VACUUM (ANALYZE)")
+            print(f"vacuum analyze in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
+    print(f"Done: seed {args.seed}, scale {args.scale}, {start} to {end}. "
+          f"Log in as admin / {args.password}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="1 = about a million naqla rows")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start-date", default="2023-01-01")
+    parser.add_argument("--end-date", default="2025-12-31")
+    parser.add_argument("--password", default="bench", help="password for every generated user")
+    parser.add_argument("--drop", action="store_true", help="drop the app's tables first (destroys their data)")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""Load test for the dashboard's routes.
+
+Logs in through /login, then runs N concurrent virtual users through the
+read pages, the JSON endpoints and a small write flow for a fixed time,
+and reports throughput and latency percentiles per route. Results are
+saved as JSON; pass one of them as --baseline to compare and flag
+regressions (exit status 1).
+
+Meant for a local Postgres filled with synthetic data, e.g.
+
+    python benchmarks/load_test.py --users 20 --duration 60 \\
+        --username admin --password secret --baseline benchmarks/results/last.json
+
+Only the standard library is used. Writes touch rows the test creates
+itself, plus no-op re-saves of existing data-entry rows; --read-only
+skips them.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import date, timedelta
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+# route name -> weight; write flows are added unless --read-only
+READ_ROUTES = {
+    "data_entry": 4,
+    "data_entry_previous_month": 1,
+    "data_entry_grid": 3,
+    "supplier_payment": 2,
+    "truck_owner_payment": 2,
+    "transactions": 2,
+    "add_supplier": 1,
+    "add_factory": 1,
+    "add_zone": 1,
+    "add_bank": 1,
+    "add_representative": 1,
+    "add_truck_owner": 1,
+    "autocomplete": 3,
+}
+WRITE_ROUTES = {
+    "update_records": 1,
+    "supplier_lifecycle": 1,
+}
+ARABIC_LETTERS = "ابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time every request as one round trip; a 302 after a POST is a success.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class VirtualUser:
+    def __init__(self, base_url, username, password, rng):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.rng = rng
+        self.grid_version = None
+        self.grid_rows = []
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect
+        )
+
+    def request(self, method, path, form=None, json_body=None):
+        """Returns (status, body bytes, seconds)."""
+        data, headers = None, {}
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=60) as resp:
+                body = resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            status = e.code
+        return status, body, time.perf_counter() - started
+
+    def login(self):
+        status, _, _ = self.request("POST", "/login", form={"username": self.username, "password": self.password})
+        if status != 302:
+            raise RuntimeError(f"Login failed for {self.username!r} (HTTP {status})")
+
+    # Each step returns [(route name, status, seconds), ...]
+    def step(self, route):
+        handler = getattr(self, f"do_{route}", None)
+        return handler() if handler else self.do_page(route)
+
+    def do_page(self, route):
+        paths = {
+            "data_entry": "/data-entry",
+            "supplier_payment": "/payment/supplier",
+            "truck_owner_payment": "/payment/truck-owner",
+            "add_supplier": "/dashboard/dimension-tables/add-supplier",
+            "add_factory": "/dashboard/dimension-tables/add-factory",
+            "add_zone": "/dashboard/dimension-tables/add-zone",
+            "add_bank": "/dashboard/dimension-tables/add-bank",
+            "add_representative": "/dashboard/dimension-tables/add-representative",
+            "add_truck_owner": "/dashboard/dimension-tables/add-truck-owner",
+        }
+        status, _, seconds = self.request("GET", paths[route])
+        return [(route, status, seconds)]
+
+    def do_data_entry_previous_month(self):
+        months_back = self.rng.randint(1, 12)
+        day = date.today().replace(day=1)
+        for _ in range(months_back):
+            day = (day - timedelta(days=1)).replace(day=1)
+        status, _, seconds = self.request("GET", f"/data-entry?month={day:%Y-%m}")
+        return [("data_entry_previous_month", status, seconds)]
+
+    def do_data_entry_grid(self):
+        path = "/data-entry/grid"
+        if self.grid_version is not None:
+            path += f"?since={self.grid_version}"
+        status, body, seconds = self.request("GET", path)
+        if status == 200:
+            delta = json.loads(body)
+            if delta["reset"]:
+                self.grid_rows = delta["inserted"]
+            self.grid_version = delta["version"]
+        return [("data_entry_grid", status, seconds)]
+
+    def do_transactions(self):
+        end = date.today() - timedelta(days=self.rng.randint(0, 365))
+        start = end - timedelta(days=self.rng.choice([7, 30, 90]))
+        status, _, seconds = self.request("GET", f"/dashboard/transactions?start_date={start}&end_date={end}")
+        return [("transactions", status, seconds)]
+
+    def do_autocomplete(self):
+        source = self.rng.choice(["suppliers", "factories", "zones", "representatives", "truck_owners", "trucks"])
+        q = urllib.parse.quote(self.rng.choice(ARABIC_LETTERS))
+        status, _, seconds = self.request("GET", f"/api/autocomplete/{source}?q={q}")
+        return [("autocomplete", status, seconds)]
+
+    def do_update_records(self):
+        if not self.grid_rows:
+            return self.do_data_entry_grid()
+        # Re-save an existing row unchanged: a full batch write without altering data.
+        rec = self.rng.choice(self.grid_rows)
+        columns = ["date", "truck_num", "truck_owner", "supplier", "factory", "zone",
+                   "weight", "ohda", "factory_price", "sell_price", "representative"]
+        row = {"id": rec[0], **{col: ("" if value is None else str(value)) for col, value in zip(columns, rec[1:])}}
+        status, _, seconds = self.request("POST", "/update_records", json_body={"rows": [row]})
+        return [("update_records", status, seconds)]
+
+    def do_supplier_lifecycle(self):
+        name = f"bench-{uuid.uuid4().hex[:12]}"
+        results = []
+        status, _, seconds = self.request("POST", "/dashboard/dimension-tables/add-supplier",
+                                          form={"supplier_name": name, "phone_number": "0100000000"})
+        results.append(("add_supplier_post", status, seconds))
+        renamed = name + "-x"
+        status, _, seconds = self.request("POST", "/update_supplier",
+                                          json_body={"id": name, "supplier_name": renamed, "phone": "0100000001"})
+        results.append(("update_supplier", status, seconds))
+        status, _, seconds = self.request("POST", "/delete_supplier", json_body={"supplier_name": renamed})
+        results.append(("delete_supplier", status, seconds))
+        return results
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    routes = {}
+    for route, entries in sorted(samples.items()):
+        latencies = sorted(seconds * 1000 for _, seconds in entries)
+        errors = sum(1 for status, _ in entries if status >= 400)
+        routes[route] = {
+            "count": len(entries),
+            "errors": errors,
+            "throughput_rps": round(len(entries) / elapsed, 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p90_ms": round(percentile(latencies, 0.90), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(latencies[-1], 2),
+        }
+    total = sum(r["count"] for r in routes.values())
+    return routes, {
+        "count": total,
+        "errors": sum(r["errors"] for r in routes.values()),
+        "throughput_rps": round(total / elapsed, 2),
+    }
+
+
+def compare(current, baseline, tolerance, min_count):
+    """Print per-route deltas; return the routes that regressed beyond tolerance.
+
+    Routes with fewer than min_count samples in either run are shown but
+    never flagged: their p95 is mostly noise.
+    """
+    regressions = []
+    print(f"\nCompared with baseline (tolerance {tolerance:.0%}):")
+    for route, now in current["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            print(f"  {route:28} new route")
+            continue
+        p95_change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        rps_change = (now["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] if before["throughput_rps"] else 0.0
+        flag = ""
+        if min(now["count"], before["count"]) < min_count:
+            flag = "  (too few samples)"
+        elif p95_change > tolerance or rps_change < -tolerance:
+            flag = "  << REGRESSION"
+            regressions.append(route)
+        print(f"  {route:28} p95 {before['p95_ms']:>9.1f} -> {now['p95_ms']:>9.1f} ms ({p95_change:+.0%})"
+              f"   rps {before['throughput_rps']:>8.1f} -> {now['throughput_rps']:>8.1f} ({rps_change:+.0%}){flag}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    host = urllib.parse.urlparse(args.base_url).hostname
+    if host not in LOCAL_HOSTS and not args.allow_remote:
+        sys.exit(f"Refusing to load-test {host}; pass --allow-remote if you really mean it.")
+
+    weights = dict(READ_ROUTES)
+    if not args.read_only:
+        weights.update(WRITE_ROUTES)
+    routes, route_weights = list(weights), list(weights.values())
+
+    samples = {}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.duration
+    failures = []
+
+    def user_loop(index):
+        rng = random.Random(args.seed * 1000 + index)
+        user = VirtualUser(args.base_url, args.username, args.password, rng)
+        try:
+            user.login()
+            user.do_data_entry_grid()
+            while time.perf_counter() < deadline:
+                results = user.step(rng.choices(routes, route_weights)[0])
+                if time.perf_counter() < measure_from:
+                    continue
+                with lock:
+                    for route, status, seconds in results:
+                        samples.setdefault(route, []).append((status, seconds))
+        except Exception as e:
+            failures.append(f"user {index}: {e}")
+
+    threads = [threading.Thread(target=user_loop, args=(i,), daemon=True) for i in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = max(time.perf_counter() - measure_from, 1e-9)
+
+    if failures and not samples:
+        sys.exit("No requests completed:\n  " + "\n  ".join(failures))
+
+    per_route, total = summarize(samples, elapsed)
+    result = {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "base_url": args.base_url,
+            "users": args.users,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "read_only": args.read_only,
+            "git_revision": git_revision(),
+            "user_failures": failures,
+        },
+        "total": total,
+        "routes": per_route,
+    }
+
+    print(f"{'route':28} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for route, r in per_route.items():
+        print(f"{route:28} {r['count']:>7} {r['errors']:>5} {r['throughput_rps']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}")
+    print(f"{'TOTAL':28} {total['count']:>7} {total['errors']:>5} {total['throughput_rps']:>8.1f}")
+    for failure in failures:
+        print(f"! {failure}")
+
+    output = args.output or os.path.join(args.results_dir, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"\nSaved {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.tolerance, args.min_count):
+            return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--username", default=os.getenv("BENCH_USERNAME", "admin"))
+    parser.add_argument("--password", default=os.getenv("BENCH_PASSWORD", ""))
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds before measuring starts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--read-only", action="store_true", help="skip the write endpoints")
+    parser.add_argument("--output", help="result file (default: <results-dir>/<timestamp>.json)")
+    parser.add_argument("--results-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput change, e.g. 0.2 = 20%%")
+    parser.add_argument("--min-count", type=int, default=50, help="samples a route needs before it can be flagged")
+    parser.add_argument("--allow-remote", action="store_true", help="allow a non-local --base-url")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
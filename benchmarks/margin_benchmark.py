@@ -0,0 +1,174 @@
+"""Vectorized margin report against the row-by-row loop it replaces.
+
+Builds the same report both ways for one date range and grouping and
+checks they agree. The row loop fetches tuples through a cursor, as the
+record pages do, and then sums with dicts. The vectorized version is
+services.margins, which uses COPY into pandas and works on whole columns.
+
+    python -m benchmarks.margin_benchmark --start 2023-01-01 --end 2026-01-01 --by supplier
+
+The connection comes from the same PG_* settings as the app; point it at
+a database filled by benchmarks.generate_data.
+"""
+import argparse
+import math
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from db import get_connection
+from services.margins import (
+    MARGIN_GROUPS, MARGIN_PERIODS, build_margin_report, compute_margins, load_fees, load_naqla_frame,
+)
+
+
+def fetch_rows(start, end):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT m.naqla_id, d.full_date, m.truck_num, t.owner_id, m.supplier_id, m.factory_id,
+                       m.weight, m.factory_price, m.sell_price
+                FROM dim_date d
+                JOIN main m ON m.date_id = d.date_id
+                LEFT JOIN trucks t ON t.truck_num = m.truck_num
+                WHERE d.full_date >= %s AND d.full_date < %s
+            """, (start.isoformat(), end.isoformat()))
+            rows = cur.fetchall()
+            cur.execute("""
+                SELECT 'supplier', supplier_id, date_id / 100, SUM(COALESCE(transfer_fees, 0))
+                FROM suppliers_payment WHERE date_id >= %s AND date_id < %s GROUP BY 2, 3
+                UNION ALL
+                SELECT 'truck_owner', owner_id, date_id / 100, SUM(COALESCE(transfer_fees, 0))
+                FROM truck_owners_payment WHERE date_id >= %s AND date_id < %s GROUP BY 2, 3
+            """, (int(start.strftime("%Y%m%d")), int(end.strftime("%Y%m%d"))) * 2)
+            fees = cur.fetchall()
+    return rows, fees
+
+
+def period_of(day, period):
+    if period == "day":
+        return day
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def row_loop_report(rows, fee_rows, by, period, start, end, limit, window):
+    """The report computed one row at a time; returns {key: (net, [net per period])} for the top groups."""
+    key_index = {"truck": 2, "factory": 5, "supplier": 4}[by]
+    fees = {(party, party_id, yyyymm): float(total) for party, party_id, yyyymm, total in fee_rows}
+    party_weight = defaultdict(float)
+    party_count = defaultdict(int)
+    parsed = []
+    for naqla_id, full_date, truck_num, owner_id, supplier_id, factory_id, weight, factory_price, sell_price in rows:
+        day = date.fromisoformat(full_date)
+        yyyymm = day.year * 100 + day.month
+        weight = float(weight or 0)
+        gross = (float(sell_price or 0) - float(factory_price or 0)) * weight
+        parsed.append((day, yyyymm, owner_id, supplier_id, weight, gross))
+        for party, party_id in (("supplier", supplier_id), ("truck_owner", owner_id)):
+            party_weight[party, party_id, yyyymm] += weight
+            party_count[party, party_id, yyyymm] += 1
+
+    totals = defaultdict(float)
+    per_period = defaultdict(float)
+    per_ton = defaultdict(list)
+    for row, (day, yyyymm, owner_id, supplier_id, weight, gross) in zip(rows, parsed):
+        fee = 0.0
+        for party, party_id in (("supplier", supplier_id), ("truck_owner", owner_id)):
+            total = fees.get((party, party_id, yyyymm), 0.0)
+            if total:
+                group_weight = party_weight[party, party_id, yyyymm]
+                share = weight / group_weight if group_weight > 0 else 1 / party_count[party, party_id, yyyymm]
+                fee += total * share
+        net = gross - fee
+        key = row[key_index] or ("" if by == "truck" else 0)
+        totals[key] += net
+        per_period[key, period_of(day, period)] += net
+        if weight > 0:
+            per_ton[key].append(net / weight)
+
+    periods = []
+    current = period_of(start, period)
+    while current < end:
+        periods.append(current)
+        if period == "month":
+            current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+        else:
+            current += timedelta(days=7 if period == "week" else 1)
+
+    report = {}
+    for key in sorted(totals, key=lambda k: totals[k], reverse=True)[:limit]:
+        series = [per_period.get((key, p), 0.0) for p in periods]
+        deltas = [None] + [b - a for a, b in zip(series, series[1:])]
+        moving = [sum(series[max(0, i - window + 1):i + 1]) / min(i + 1, window) for i in range(len(series))]
+        ratios = sorted(per_ton[key])
+        median = ratios[len(ratios) // 2] if ratios else None
+        report[key] = (totals[key], series, deltas, moving, median)
+    return report
+
+
+def vectorized_report(start, end, by, period, limit, window):
+    frame, unallocated = compute_margins(load_naqla_frame(start, end), load_fees(start, end))
+    return build_margin_report(frame, unallocated, by, period, start, end, limit=limit, window=window)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--start", default="2023-01-01")
+    parser.add_argument("--end", default="2026-01-01", help="exclusive")
+    parser.add_argument("--by", choices=list(MARGIN_GROUPS), default="supplier")
+    parser.add_argument("--period", choices=MARGIN_PERIODS, default="month")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--window", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs for each approach")
+    args = parser.parse_args()
+    start, end = date.fromisoformat(args.start), date.fromisoformat(args.end)
+
+    loop_fetch = loop_compute = vector_total = math.inf
+    for _ in range(args.repeat):
+        (rows, fee_rows), fetch_seconds = timed(fetch_rows, start, end)
+        loop, compute_seconds = timed(row_loop_report, rows, fee_rows, args.by, args.period,
+                                      start, end, args.limit, args.window)
+        loop_fetch, loop_compute = min(loop_fetch, fetch_seconds), min(loop_compute, compute_seconds)
+        vector, seconds = timed(vectorized_report, start, end, args.by, args.period, args.limit, args.window)
+        vector_total = min(vector_total, seconds)
+
+    mismatches = []
+    groups = vector["groups"]
+    series = vector["series"].groupby(MARGIN_GROUPS[args.by]["column"], sort=False)
+    for key, net in groups["net"].items():
+        if key not in loop:
+            mismatches.append(f"{key!r}: missing from the row loop")
+            continue
+        loop_net, loop_series, _, loop_moving, _ = loop[key]
+        group = series.get_group(key)
+        if not math.isclose(net, loop_net, rel_tol=1e-9, abs_tol=1e-6):
+            mismatches.append(f"{key!r}: net {net} != {loop_net}")
+        if not all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6) for a, b in zip(group["net"], loop_series)):
+            mismatches.append(f"{key!r}: per-period net differs")
+        if not all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6) for a, b in zip(group["net_moving_avg"], loop_moving)):
+            mismatches.append(f"{key!r}: moving average differs")
+
+    loop_total = loop_fetch + loop_compute
+    print(f"{len(rows)} naqla rows, by {args.by} per {args.period}, top {len(groups)} groups, best of {args.repeat}")
+    print(f"row loop:   {loop_total * 1000:8.0f} ms  (fetch {loop_fetch * 1000:.0f} ms, compute {loop_compute * 1000:.0f} ms)")
+    print(f"vectorized: {vector_total * 1000:8.0f} ms  ({loop_total / vector_total:.1f}x faster)")
+    for mismatch in mismatches[:20]:
+        print(mismatch)
+    if mismatches:
+        print(f"{len(mismatches)} mismatch(es)")
+        return 1
+    print("Results match.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,11 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
+import psycopg2
+from psycopg2 import extensions, pool
+from services.metrics import TimedConnection, record_checkout
 
 load_dotenv()
 
@@ -9,4 +15,210 @@ PG_PARAMS = {
     "password": os.getenv("PG_PASSWORD"),
     "host": os.getenv("PG_HOST"),
     "port": os.getenv("PG_PORT")
-}
\ No newline at end of file
+}
+
+# Pool sizing is per worker process: total connections = workers * PG_POOL_MAX.
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", 1))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", 10))
+# Connections idle for longer than this get a "SELECT 1" before being handed out.
+PG_POOL_PING_AFTER = float(os.getenv("PG_POOL_PING_AFTER", 30))
+# How long a request waits for a free connection before giving up.
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", 10))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = None
+# Pools inherited through fork(). Kept referenced so garbage collection never
+# closes them: closing would send Terminate on sockets the parent still uses.
+_inherited_pools = []
+_last_used = {}
+# Guards _seen and _stats, which every gthread worker thread updates.
+_stats_lock = threading.Lock()
+_seen = set()
+_stats = {
+    "checkouts": 0,
+    "checkins": 0,
+    "connections_opened": 0,
+    "connections_discarded": 0,
+    "health_check_failures": 0,
+    "timeouts": 0,
+    "wait_time_total": 0.0,
+}
+
+
+def init_pool(minconn=None, maxconn=None):
+    """Create the connection pool for the current process.
+
+    Safe to call more than once; an existing pool is closed first. A pool
+    inherited through fork() is never reused, the child always opens its own.
+    """
+    with _pool_lock:
+        return _create_pool(PG_POOL_MIN if minconn is None else minconn,
+                            PG_POOL_MAX if maxconn is None else maxconn)
+
+
+def _create_pool(minconn, maxconn):
+    # Caller holds _pool_lock.
+    global _pool, _pool_pid, _slots
+    if _pool is not None:
+        if _pool_pid == os.getpid():
+            _pool.closeall()
+        else:
+            _inherited_pools.append(_pool)
+    _last_used.clear()
+    _seen.clear()
+    # TimedConnection times every statement for /metrics.
+    _pool = pool.ThreadedConnectionPool(minconn, maxconn, connection_factory=TimedConnection, **PG_PARAMS)
+    _slots = threading.BoundedSemaphore(maxconn)
+    _pool_pid = os.getpid()
+    return _pool
+
+
+def close_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None:
+            if _pool_pid == os.getpid():
+                _pool.closeall()
+            else:
+                _inherited_pools.append(_pool)
+        _pool = None
+        _pool_pid = None
+        _last_used.clear()
+        _seen.clear()
+
+
+def _get_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    return _ensure_pool()
+
+
+def _ensure_pool():
+    # After a fork the parent's sockets must not be shared, so a pid change
+    # means we start over with a fresh pool in this worker. Checked again
+    # under the lock: threads racing here must all end up with one pool.
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            return _pool
+        return _create_pool(PG_POOL_MIN, PG_POOL_MAX)
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < PG_POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_conn():
+    """Borrow a healthy connection from the pool. Return it with put_conn()."""
+    p = _get_pool()
+    started = time.monotonic()
+    # ThreadedConnectionPool raises instead of blocking when exhausted, so
+    # callers queue on a semaphore sized to the pool.
+    if not _slots.acquire(timeout=PG_POOL_TIMEOUT):
+        _count("timeouts")
+        raise psycopg2.OperationalError("Timed out waiting for a pooled connection")
+    for _ in range(p.maxconn + 1):
+        try:
+            conn = p.getconn()
+        except Exception:
+            _slots.release()
+            raise
+        with _stats_lock:
+            if id(conn) not in _seen:
+                _seen.add(id(conn))
+                _stats["connections_opened"] += 1
+        if _is_healthy(conn):
+            break
+        _count("health_check_failures")
+        _discard(p, conn)
+    else:
+        _slots.release()
+        raise psycopg2.OperationalError("No healthy connection available in pool")
+    _count("checkouts")
+    _count("wait_time_total", time.monotonic() - started)
+    record_checkout()
+    return conn
+
+
+def put_conn(conn, close=False):
+    p = _get_pool()
+    try:
+        if close or conn.closed:
+            _discard(p, conn)
+            return
+        if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                _discard(p, conn)
+                return
+        _last_used[id(conn)] = time.monotonic()
+        _count("checkins")
+        p.putconn(conn)
+    finally:
+        _slots.release()
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def _discard(p, conn):
+    with _stats_lock:
+        _stats["connections_discarded"] += 1
+        _seen.discard(id(conn))
+    _last_used.pop(id(conn), None)
+    try:
+        p.putconn(conn, close=True)
+    except pool.PoolError:
+        conn.close()
+
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection for the duration of a with-block.
+
+    Uncommitted work is rolled back when the block exits, so callers must
+    commit explicitly, exactly as with a plain psycopg2 connection.
+    """
+    conn = get_conn()
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                # Keep the caller's exception; put_conn() discards the broken connection.
+                pass
+        raise
+    finally:
+        put_conn(conn)
+
+
+def pool_stats():
+    p = _pool if _pool_pid == os.getpid() else None
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update({
+        "pid": os.getpid(),
+        "min_size": p.minconn if p else PG_POOL_MIN,
+        "max_size": p.maxconn if p else PG_POOL_MAX,
+        "in_use": len(p._used) if p else 0,
+        "idle": len(p._pool) if p else 0,
+    })
+    return stats
@@ -0,0 +1,51 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Pre-forked workers, each with a few threads. Every worker owns its own
+# connection pool and caches, created after the fork. `kill -HUP <master pid>`
+# reloads gracefully: new workers start on the new code, old ones finish their
+# in-flight requests (up to graceful_timeout) and exit.
+import multiprocessing
+import os
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("WEB_THREADS", 4))
+worker_class = "gthread"
+
+timeout = int(os.getenv("WEB_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+# Recycle workers now and then so slow leaks can't build up; jitter avoids restarting all at once.
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+# Import the app in each worker rather than in the master, so HUP picks up new code.
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # Schema migrations once, in the master, before any worker exists.
+    from app import install_schema
+    from db import close_pool
+    install_schema()
+    close_pool()
+
+
+def post_fork(server, worker):
+    from app import warm_caches
+    from db import PG_POOL_MIN, PG_POOL_MAX, init_pool
+    from services.dimension_cache import dimension_cache
+
+    # Every thread may hold a connection at once, so never size the pool below the thread count.
+    init_pool(PG_POOL_MIN, max(PG_POOL_MAX, threads))
+    dimension_cache.clear()
+    warm_caches()
+    server.log.info("Worker %s: pool of up to %s connections", worker.pid, max(PG_POOL_MAX, threads))
+
+
+def worker_exit(server, worker):
+    from db import close_pool
+    close_pool()
@@ -0,0 +1,49 @@
+"""Schema migrations.
+
+    python migrate.py upgrade [--target N]   apply pending migrations
+    python migrate.py status                 list migrations and when they were applied
+    python migrate.py check                  report indexes the hot queries are missing
+"""
+import argparse
+import sys
+
+import psycopg2
+
+from services.migrations import MigrationError, check_indexes, connect, status, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema migrations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = commands.add_parser("upgrade", help="apply pending migrations")
+    upgrade_parser.add_argument("--target", type=int, help="stop after this version")
+    commands.add_parser("status", help="list migrations and when they were applied")
+    commands.add_parser("check", help="report indexes the hot queries are missing (exit 1 if any)")
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        if args.command == "upgrade":
+            applied = upgrade(conn, target=args.target)
+            print(f"{len(applied)} migration(s) applied." if applied else "Already up to date.")
+        elif args.command == "status":
+            for version, name, applied_at in status(conn):
+                print(f"{version:04d}_{name:30} {applied_at or 'pending'}")
+        else:
+            with conn.cursor() as cur:
+                problems = check_indexes(cur)
+            for problem in problems:
+                print(problem)
+            if problems:
+                return 1
+            print("All hot-query indexes are in place.")
+    except (MigrationError, psycopg2.Error) as e:
+        print(f"Migration failed: {e}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Base tables, as the services expect them.
+
+IF NOT EXISTS throughout: on a database that predates migrations this is a
+no-op and only records the baseline. Foreign keys come in a later migration
+so bulk loads can add them after the data.
+"""
+
+BASE_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS dim_date (
+    date_id SERIAL PRIMARY KEY,
+    full_date TEXT UNIQUE,
+    year INT,
+    month INT,
+    day INT,
+    day_name TEXT
+);
+CREATE TABLE IF NOT EXISTS suppliers (supplier_id SERIAL PRIMARY KEY, supplier_name TEXT UNIQUE, phone TEXT);
+CREATE TABLE IF NOT EXISTS representatives (representative_id SERIAL PRIMARY KEY, representative_name TEXT UNIQUE, phone TEXT);
+CREATE TABLE IF NOT EXISTS zones (zone_id SERIAL PRIMARY KEY, zone_name TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS factories (factory_id SERIAL PRIMARY KEY, factory_name TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS bank_name (bank_id SERIAL PRIMARY KEY, bank_name TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS truck_owners (owner_id SERIAL PRIMARY KEY, owner_name TEXT, phone TEXT);
+CREATE TABLE IF NOT EXISTS trucks (truck_num TEXT PRIMARY KEY, owner_id INT);
+CREATE TABLE IF NOT EXISTS main (
+    naqla_id SERIAL PRIMARY KEY,
+    date_id INT,
+    truck_num TEXT,
+    supplier_id INT,
+    factory_id INT,
+    zone_id INT,
+    weight NUMERIC,
+    ohda NUMERIC,
+    factory_price NUMERIC,
+    sell_price NUMERIC,
+    representative_id INT
+);
+CREATE TABLE IF NOT EXISTS senders (sender_id SERIAL PRIMARY KEY, sender_name TEXT);
+CREATE TABLE IF NOT EXISTS transactions (
+    date DATE,
+    sender INT,
+    receiver TEXT,
+    phone_number TEXT,
+    amount NUMERIC,
+    transaction_id TEXT PRIMARY KEY,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS users (user_id SERIAL PRIMARY KEY, username TEXT UNIQUE, password_hash TEXT, role TEXT);
+CREATE TABLE IF NOT EXISTS custody (
+    custody_id SERIAL PRIMARY KEY,
+    user_id INT,
+    date DATE,
+    description TEXT,
+    incoming NUMERIC,
+    outgoing NUMERIC,
+    balance NUMERIC
+);
+CREATE TABLE IF NOT EXISTS suppliers_payment (
+    supplier_transaction_id SERIAL PRIMARY KEY,
+    date_id INT,
+    supplier_id INT,
+    amount NUMERIC,
+    transfer_fees NUMERIC,
+    payment_method INT,
+    notes TEXT
+);
+CREATE TABLE IF NOT EXISTS truck_owners_payment (
+    truck_owner_transaction_id SERIAL PRIMARY KEY,
+    date_id INT,
+    owner_id INT,
+    amount NUMERIC,
+    transfer_fees NUMERIC,
+    payment_method INT,
+    notes TEXT
+);
+"""
+
+
+def upgrade(cur):
+    cur.execute(BASE_TABLES_SQL)
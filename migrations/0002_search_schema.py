@@ -0,0 +1,11 @@
+"""normalize_search() and, when pg_trgm is available, the trigram search indexes.
+
+The indexes are built CONCURRENTLY so the dimension tables stay writable.
+"""
+from services.search import ensure_search_schema
+
+TRANSACTIONAL = False
+
+
+def upgrade(cur):
+    ensure_search_schema(cur)
@@ -0,0 +1,6 @@
+"""table_versions, the main change log and the triggers that maintain them."""
+from services.table_versions import ensure_change_tracking
+
+
+def upgrade(cur):
+    ensure_change_tracking(cur)
@@ -0,0 +1,30 @@
+"""Indexes for the hot queries in services/, built without blocking writes.
+
+An index is skipped when a valid one already starts with the same columns,
+whatever its name, so databases that grew their own indexes keep them.
+"""
+from services.migrations import create_index_concurrently, index_exists_for
+
+TRANSACTIONAL = False
+
+# (index name, table, columns)
+INDEXES = [
+    ("main_date_id_idx", "main", ("date_id",)),
+    ("main_truck_num_idx", "main", ("truck_num",)),
+    ("main_supplier_id_idx", "main", ("supplier_id",)),
+    # date first for the range filter, transaction_id for the keyset order
+    ("transactions_date_idx", "transactions", ("date", "transaction_id")),
+    ("suppliers_payment_supplier_id_idx", "suppliers_payment", ("supplier_id",)),
+    ("truck_owners_payment_owner_id_idx", "truck_owners_payment", ("owner_id",)),
+    ("trucks_owner_id_idx", "trucks", ("owner_id",)),
+    # the custody statement reads one user's rows in date order
+    ("custody_user_id_date_idx", "custody", ("user_id", "date", "custody_id")),
+    ("dim_date_full_date_idx", "dim_date", ("full_date",)),
+    ("dim_date_year_month_idx", "dim_date", ("year", "month")),
+]
+
+
+def upgrade(cur):
+    for name, table, columns in INDEXES:
+        if not index_exists_for(cur, table, columns):
+            create_index_concurrently(cur, name, table, columns)
@@ -0,0 +1,41 @@
+"""UNIQUE constraints on the dimension names that insert_record's ON CONFLICT targets.
+
+Each is built as a unique index CONCURRENTLY and then attached with
+ADD CONSTRAINT ... USING INDEX, which only locks the table briefly.
+Existing duplicates stop the migration with a list of them to merge by hand;
+merging means repointing main and the payments, which is not for a migration
+to guess.
+"""
+from services.migrations import MigrationError, create_index_concurrently, index_exists_for
+
+TRANSACTIONAL = False
+
+# (table, name column)
+UNIQUE_NAMES = [
+    ("suppliers", "supplier_name"),
+    ("factories", "factory_name"),
+    ("zones", "zone_name"),
+    ("representatives", "representative_name"),
+    ("bank_name", "bank_name"),
+]
+
+
+def upgrade(cur):
+    cur.execute("SET lock_timeout = '5s'")
+    for table, column in UNIQUE_NAMES:
+        if index_exists_for(cur, table, (column,), unique=True):
+            continue
+        cur.execute(f"""
+            SELECT {column}, COUNT(*) FROM {table}
+            WHERE {column} IS NOT NULL
+            GROUP BY {column} HAVING COUNT(*) > 1
+            ORDER BY COUNT(*) DESC LIMIT 20
+        """)
+        duplicates = cur.fetchall()
+        if duplicates:
+            listed = ", ".join(f"{name!r} x{count}" for name, count in duplicates)
+            raise MigrationError(f"{table}.{column} has duplicate names: {listed}")
+        name = f"{table}_{column}_key"
+        create_index_concurrently(cur, name, table, (column,), unique=True)
+        cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}")
+    cur.execute("RESET lock_timeout")
@@ -0,0 +1,56 @@
+"""Foreign keys between main, the payments and the dimension tables.
+
+Added NOT VALID (a brief lock) and validated separately, which scans the
+table without blocking writes. A column that already has a foreign key,
+under any name, is left alone apart from validating it.
+
+Deletes are restricted: a supplier, factory, zone, representative, truck,
+truck owner, bank or user that rows still point at can't be deleted, and
+the dimension delete routes report that instead of failing. Renaming a
+truck's number cascades into main.
+"""
+TRANSACTIONAL = False
+
+# (table, column, referenced table, extra clause)
+# Payment date_id is a YYYYMMDD number, not a dim_date key, so it has none.
+FOREIGN_KEYS = [
+    ("trucks", "owner_id", "truck_owners", ""),
+    ("main", "date_id", "dim_date", ""),
+    ("main", "truck_num", "trucks", " ON UPDATE CASCADE"),
+    ("main", "supplier_id", "suppliers", ""),
+    ("main", "factory_id", "factories", ""),
+    ("main", "zone_id", "zones", ""),
+    ("main", "representative_id", "representatives", ""),
+    ("transactions", "sender", "senders", ""),
+    ("custody", "user_id", "users", ""),
+    ("suppliers_payment", "supplier_id", "suppliers", ""),
+    ("suppliers_payment", "payment_method", "bank_name", ""),
+    ("truck_owners_payment", "owner_id", "truck_owners", ""),
+    ("truck_owners_payment", "payment_method", "bank_name", ""),
+]
+
+
+def existing_foreign_key(cur, table, column):
+    """(name, validated) of a foreign key on exactly this column, or None."""
+    cur.execute("""
+        SELECT c.conname, c.convalidated
+        FROM pg_constraint c
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+        WHERE c.contype = 'f' AND c.conrelid = %s::regclass
+          AND array_length(c.conkey, 1) = 1 AND a.attname = %s
+    """, (table, column))
+    return cur.fetchone()
+
+
+def upgrade(cur):
+    cur.execute("SET lock_timeout = '5s'")
+    for table, column, target, extra in FOREIGN_KEYS:
+        existing = existing_foreign_key(cur, table, column)
+        if existing and existing[1]:
+            continue
+        name = existing[0] if existing else f"{table}_{column}_fkey"
+        if not existing:
+            cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} "
+                        f"FOREIGN KEY ({column}) REFERENCES {target}{extra} NOT VALID")
+        cur.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+    cur.execute("RESET lock_timeout")
@@ -0,0 +1,11 @@
+"""Supplier and truck-owner balance summaries, their triggers, and the initial totals.
+
+The rebuild holds a SHARE lock on main and the payment tables while it
+sums them, so writes wait for it (a few seconds per million naqla rows).
+"""
+from services.balances import ensure_balances, rebuild_balances
+
+
+def upgrade(cur):
+    ensure_balances(cur)
+    rebuild_balances(cur)
@@ -0,0 +1,11 @@
+"""Daily and monthly rollups of main per factory, zone, supplier and representative.
+
+Every date is marked and rebuilt here, one month at a time.
+"""
+from services.rollups import ensure_rollups, mark_all_dates, refresh_rollups
+
+
+def upgrade(cur):
+    ensure_rollups(cur)
+    mark_all_dates(cur)
+    refresh_rollups(cur)
@@ -0,0 +1,7 @@
+"""Monthly custody totals per user, their triggers, and the initial totals."""
+from services.custody_service import ensure_custody_ledger, rebuild_custody_ledger
+
+
+def upgrade(cur):
+    ensure_custody_ledger(cur)
+    rebuild_custody_ledger(cur)
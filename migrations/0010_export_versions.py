@@ -0,0 +1,6 @@
+"""Version stamps on transactions and senders, which key the export cache."""
+from services.table_versions import ensure_change_tracking
+
+
+def upgrade(cur):
+    ensure_change_tracking(cur)
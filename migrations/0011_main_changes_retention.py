@@ -0,0 +1,12 @@
+"""Trim main_changes to its last MAIN_CHANGES_KEEP_VERSIONS versions.
+
+Reinstalls the change-tracking trigger functions, which now prune, and
+does a first trim of the history that is already there.
+"""
+from services.table_versions import MAIN_CHANGES_KEEP_VERSIONS, ensure_change_tracking, get_table_version
+
+
+def upgrade(cur):
+    ensure_change_tracking(cur)
+    version = get_table_version(cur, "main")[0]
+    cur.execute("DELETE FROM main_changes WHERE version <= %s", (version - MAIN_CHANGES_KEEP_VERSIONS,))
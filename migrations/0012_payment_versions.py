@@ -0,0 +1,6 @@
+"""Version stamps on the payment tables, which key the ledgers' cached grand totals."""
+from services.table_versions import ensure_change_tracking
+
+
+def upgrade(cur):
+    ensure_change_tracking(cur)
@@ -1,7 +1,7 @@
 # auth_routes.py
 from flask import (
     render_template, request, redirect, url_for,
-    flash, session
+    flash, session, abort
 )
 from functools import wraps
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -19,6 +19,17 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if "user_id" not in session:
+            flash("🔒 يجب تسجيل الدخول أولاً", "warning")
+            return redirect(url_for("login"))
+        if session.get("role") != "admin":
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
+
 def register_auth_routes(app):
     @app.route("/login", methods=["GET", "POST"])
     def login():
@@ -0,0 +1,48 @@
+# autocomplete_routes.py
+from flask import request, jsonify
+
+from .auth_routes import login_required
+from db import get_connection
+from services.search import autocomplete, AUTOCOMPLETE_MAX_LIMIT
+from services.table_managers import TruckOwnerManager
+
+truck_owner_manager = TruckOwnerManager()
+
+# source name in the URL -> (table, column)
+AUTOCOMPLETE_SOURCES = {
+    "suppliers": ("suppliers", "supplier_name"),
+    "factories": ("factories", "factory_name"),
+    "zones": ("zones", "zone_name"),
+    "representatives": ("representatives", "representative_name"),
+    "banks": ("bank_name", "bank_name"),
+    "truck_owners": ("truck_owners", "owner_name"),
+}
+# Short browser cache: the same prefix is typed over and over while filling a sheet.
+AUTOCOMPLETE_MAX_AGE = 60
+
+def register_autocomplete_routes(app):
+    @app.route("/api/autocomplete/<source>")
+    @login_required
+    def autocomplete_options(source):
+        query = request.args.get("q", "").strip()
+        try:
+            limit = min(int(request.args.get("limit", 10)), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            limit = 10
+
+        if source == "trucks":
+            trucks = truck_owner_manager.search(query, limit=limit)
+            items = [{"value": t["truck_number"], "label": t["truck_owner"], "owner": t["truck_owner"]} for t in trucks]
+        elif source in AUTOCOMPLETE_SOURCES:
+            table, column = AUTOCOMPLETE_SOURCES[source]
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    items = [{"value": v} for v in autocomplete(cur, table, column, query, limit)]
+        else:
+            return jsonify({"error": f"Unknown source '{source}'"}), 404
+
+        response = jsonify(items)
+        response.cache_control.private = True
+        response.cache_control.max_age = AUTOCOMPLETE_MAX_AGE
+        response.add_etag()
+        return response.make_conditional(request)
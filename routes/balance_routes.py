@@ -0,0 +1,48 @@
+# balance_routes.py
+from datetime import date
+
+from flask import request, jsonify
+
+from .auth_routes import login_required
+from services.balances import get_balance, get_statement
+
+# party in the URL -> BALANCE_PARTIES key
+BALANCE_URL_PARTIES = {"supplier": "supplier", "truck-owner": "truck_owner"}
+STATEMENT_DEFAULT_LIMIT = 50
+STATEMENT_MAX_LIMIT = 500
+
+
+def statement_entry(entry):
+    return {**entry, "entry_date": entry["entry_date"].isoformat()}
+
+
+def register_balance_routes(app):
+    @app.route("/api/balances/<party>/<int:party_id>")
+    @login_required
+    def party_balance(party, party_id):
+        if party not in BALANCE_URL_PARTIES:
+            return jsonify({"error": f"Unknown party '{party}'"}), 404
+        balance = get_balance(BALANCE_URL_PARTIES[party], party_id)
+        if balance is None:
+            return jsonify({"error": "Not found"}), 404
+        return jsonify(balance)
+
+    @app.route("/api/balances/<party>/<int:party_id>/statement")
+    @login_required
+    def party_statement(party, party_id):
+        if party not in BALANCE_URL_PARTIES:
+            return jsonify({"error": f"Unknown party '{party}'"}), 404
+        try:
+            start = request.args.get("start")
+            end = request.args.get("end")
+            start = date.fromisoformat(start) if start else None
+            end = date.fromisoformat(end) if end else None
+            limit = min(request.args.get("limit", STATEMENT_DEFAULT_LIMIT, type=int), STATEMENT_MAX_LIMIT)
+            page = get_statement(
+                BALANCE_URL_PARTIES[party], party_id, start=start, end=end,
+                after=request.args.get("after"), before=request.args.get("before"), limit=max(limit, 1),
+            )
+        except ValueError:
+            return jsonify({"error": "Invalid date, cursor or limit"}), 400
+        page["entries"] = [statement_entry(e) for e in page["entries"]]
+        return jsonify(page)
@@ -1,10 +1,29 @@
 # custody_routes.py
+from datetime import date
 from flask import (
     render_template, redirect, url_for,
-    session, abort
+    session, abort, request, jsonify
 )
-from services.user_service import get_all_users
-from services.custody_service import get_custody_by_user_id
+from .auth_routes import login_required
+from services.custody_service import get_custody_ledger, get_custody_summaries
+
+LEDGER_PAGE_SIZE = 50
+LEDGER_MAX_LIMIT = 500
+
+def ledger_args(args, limit):
+    """get_custody_ledger() keyword arguments from the query string; ValueError if invalid."""
+    start = args.get("start")
+    end = args.get("end")
+    return {
+        "start": date.fromisoformat(start) if start else None,
+        "end": date.fromisoformat(end) if end else None,
+        "after": args.get("after") or None,
+        "before": args.get("before") or None,
+        "limit": limit,
+    }
+
+def ledger_row(row):
+    return {**row, "date": row["date"].isoformat()}
 
 def register_custody_routes(app):
     @app.route("/custodies")
@@ -13,7 +32,7 @@ def register_custody_routes(app):
             return redirect(url_for("login"))
         role = session.get("role")
         if role in ["admin", "accountant"]:
-            users = get_all_users(exclude_roles=["accountant", "admin"])
+            users = get_custody_summaries(exclude_roles=["accountant", "admin"])
             return render_template("custodies_list.html", users=users)
         return redirect(url_for("custody_detail", user_id=session["user_id"]))
 
@@ -25,5 +44,30 @@ def register_custody_routes(app):
         current_user_id = session["user_id"]
         if role not in ["admin", "accountant"] and current_user_id != user_id:
             abort(403)
-        custody_data = get_custody_by_user_id(user_id)
-        return render_template("custody_detail.html", custody_data=custody_data)
\ No newline at end of file
+        try:
+            filters = ledger_args(request.args, LEDGER_PAGE_SIZE)
+            ledger = get_custody_ledger(user_id, **filters)
+        except ValueError:
+            # Bad date or tampered cursor: show the first page, unfiltered.
+            filters = ledger_args({}, LEDGER_PAGE_SIZE)
+            ledger = get_custody_ledger(user_id, **filters)
+        return render_template(
+            "custody_detail.html",
+            user_id=user_id,
+            ledger=ledger,
+            start=filters["start"].isoformat() if filters["start"] else "",
+            end=filters["end"].isoformat() if filters["end"] else "",
+        )
+
+    @app.route("/api/custody/<int:user_id>/ledger")
+    @login_required
+    def custody_ledger(user_id):
+        if session.get("role") not in ["admin", "accountant"] and session["user_id"] != user_id:
+            return jsonify({"error": "Forbidden"}), 403
+        try:
+            limit = min(request.args.get("limit", LEDGER_PAGE_SIZE, type=int), LEDGER_MAX_LIMIT)
+            ledger = get_custody_ledger(user_id, **ledger_args(request.args, max(limit, 1)))
+        except ValueError:
+            return jsonify({"error": "Invalid date, cursor or limit"}), 400
+        ledger["rows"] = [ledger_row(r) for r in ledger["rows"]]
+        return jsonify(ledger)
@@ -1,7 +1,8 @@
 # dimension_routes.py
+import hashlib
 from flask import (
     render_template, request, redirect, url_for,
-    flash, jsonify
+    flash, jsonify, session, make_response
 )
 from .auth_routes import login_required
 from services.table_managers import (
@@ -19,6 +20,45 @@ factory_manager = FactoryManager()
 representative_manager = RepresentativeManager()
 bank_manager = BankManager()
 
+# ========================
+# Conditional GET helpers
+# ========================
+def page_validators(manager):
+    """(etag, last_modified) for a listing page, or None if it must not be cached."""
+    # A pending flash message has to be rendered, never answered with a 304.
+    if session.get("_flashes"):
+        return None
+    stamp = manager.version()
+    if stamp is None:
+        return None
+    versions, modified = stamp
+    key = f"{request.full_path}|{session.get('user_id')}|{versions}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:24], modified
+
+def with_validators(response, validators):
+    response = make_response(response)
+    if validators:
+        etag, modified = validators
+        response.set_etag(etag)
+        if modified:
+            response.last_modified = modified
+        # The browser may keep the page but must ask before reusing it.
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
+
+def not_modified(validators):
+    """A 304 when the browser's copy is current, checked before any listing query."""
+    if not validators:
+        return None
+    etag, modified = validators
+    if request.if_none_match:
+        current = etag in request.if_none_match
+    else:
+        since = request.if_modified_since
+        current = bool(since and modified and modified.replace(microsecond=0) <= since)
+    return with_validators(("", 304), validators) if current else None
+
 def register_dimension_routes(app):
     @app.route("/dashboard/dimension-tables")
     @login_required
@@ -45,16 +85,21 @@ def register_dimension_routes(app):
                     else:
                         flash(f"❌ حدث خطأ: {response.get('error', 'غير معروف')}", "error")
                     return redirect(url_for("add_truck_owner", page=page))
+            validators = page_validators(truck_owner_manager)
+            cached = not_modified(validators)
+            if cached:
+                return cached
             if query:
-                truck_owners = truck_owner_manager.search(query)
-                total_pages = 1
+                truck_owners = truck_owner_manager.search(query, limit=limit + 1, offset=offset)
+                total_pages = page + 1 if len(truck_owners) > limit else page
+                truck_owners = truck_owners[:limit]
             else:
                 truck_owners, total_count = truck_owner_manager.fetch_all(limit=limit, offset=offset)
                 total_pages = (total_count + limit - 1) // limit
-            return render_template("add_truck_owner.html",
-                                   truck_owners=truck_owners,
-                                   page=page,
-                                   total_pages=total_pages)
+            return with_validators(render_template("add_truck_owner.html",
+                                                   truck_owners=truck_owners,
+                                                   page=page,
+                                                   total_pages=total_pages), validators)
         except Exception as e:
             flash("❌ حدث خطأ أثناء معالجة الطلب", "error")
             return redirect(url_for("add_truck_owner"))
@@ -102,16 +147,21 @@ def register_dimension_routes(app):
                     else:
                         flash("❌ حدث خطأ أثناء إضافة المورد", "error")
                     return redirect(url_for("add_supplier", page=page))
+            validators = page_validators(supplier_manager)
+            cached = not_modified(validators)
+            if cached:
+                return cached
             if query:
-                suppliers = supplier_manager.search(query)
-                total_pages = 1
+                suppliers = supplier_manager.search(query, limit=limit + 1, offset=offset)
+                total_pages = page + 1 if len(suppliers) > limit else page
+                suppliers = suppliers[:limit]
             else:
                 suppliers, total_count = supplier_manager.fetch_all(limit=limit, offset=offset)
                 total_pages = (total_count + limit - 1) // limit
-            return render_template("add_supplier.html",
-                                   suppliers=suppliers,
-                                   page=page,
-                                   total_pages=total_pages)
+            return with_validators(render_template("add_supplier.html",
+                                                   suppliers=suppliers,
+                                                   page=page,
+                                                   total_pages=total_pages), validators)
         except Exception as e:
             flash("❌ حدث خطأ أثناء معالجة الطلب", "error")
             return redirect(url_for("add_supplier"))
@@ -159,8 +209,12 @@ def register_dimension_routes(app):
             else:
                 flash("❌ حدث خطأ أثناء إضافة المصنع", "error")
             return redirect(url_for('add_factory', page=page))
+        validators = page_validators(factory_manager)
+        cached = not_modified(validators)
+        if cached:
+            return cached
         factories, total_pages = factory_manager.fetch_all(limit=limit, offset=offset)
-        return render_template("add_factory.html", factories=factories, page=page, total_pages=total_pages)
+        return with_validators(render_template("add_factory.html", factories=factories, page=page, total_pages=total_pages), validators)
     @app.route('/update_factory', methods=['POST'])
     @login_required
     def update_factory_route():
@@ -201,14 +255,19 @@ def register_dimension_routes(app):
                     else:
                         flash("❌ حدث خطأ أثناء الإضافة", "error")
                 return redirect(url_for("add_zone", page=page))
+            validators = page_validators(zone_manager)
+            cached = not_modified(validators)
+            if cached:
+                return cached
             if query:
-                zones = zone_manager.search(query)
-                total_pages = 1
+                zones = zone_manager.search(query, limit=limit + 1, offset=offset)
+                total_pages = page + 1 if len(zones) > limit else page
+                zones = zones[:limit]
             else:
                 zones, total_count = zone_manager.fetch_all(limit=limit, offset=offset)
                 total_pages = (total_count + limit - 1) // limit
 
-            return render_template("add_zone.html", zones=zones, page=page, total_pages=total_pages)
+            return with_validators(render_template("add_zone.html", zones=zones, page=page, total_pages=total_pages), validators)
         except Exception as e:
             flash("❌ حدث خطأ أثناء معالجة الطلب", "error")
             return redirect(url_for("add_zone"))
@@ -257,18 +316,22 @@ def register_dimension_routes(app):
                     else:
                         flash("❌ حدث خطأ أثناء إضافة المندوب", "error")
                 return redirect(url_for('add_representative', page=page))
+            validators = page_validators(representative_manager)
+            cached = not_modified(validators)
+            if cached:
+                return cached
             if query:
-                representatives = representative_manager.search(query)
-                total_count = len(representatives)
-                total_pages = 1
+                representatives = representative_manager.search(query, limit=limit + 1, offset=offset)
+                total_pages = page + 1 if len(representatives) > limit else page
+                representatives = representatives[:limit]
             else:
                 representatives, total_count = representative_manager.fetch_all(limit=limit, offset=offset)
                 total_pages = (total_count + limit - 1) // limit
-            return render_template("add_representative.html",
-                                representatives=representatives,
-                                page=page,
-                                total_pages=total_pages,
-                                )
+            return with_validators(render_template("add_representative.html",
+                                                representatives=representatives,
+                                                page=page,
+                                                total_pages=total_pages,
+                                                ), validators)
         except Exception as e:
             print(f"Error in add_representative route: {e}")
             flash("❌ حدث خطأ أثناء معالجة الطلب", "error")
@@ -326,8 +389,12 @@ def register_dimension_routes(app):
                 flash(f"❌ حدث خطأ أثناء إضافة البنك: {result}", "error")
             return redirect(url_for('add_bank', page=page))
         
+        validators = page_validators(bank_manager)
+        cached = not_modified(validators)
+        if cached:
+            return cached
         banks, total_pages = bank_manager.fetch_all(limit=limit, offset=offset)
-        return render_template("add_bank.html", banks=banks, page=page, total_pages=total_pages)
+        return with_validators(render_template("add_bank.html", banks=banks, page=page, total_pages=total_pages), validators)
 
     @app.route('/update_bank', methods=['POST'])
     @login_required
@@ -1,17 +1,29 @@
 # main_routes.py
+from datetime import date
 from flask import (
     render_template, request, redirect, url_for,
     flash, session, jsonify
 )
-from .auth_routes import login_required
-from services.main_data_manager import save_data_entry, update_naqla_record, get_current_month_records, delete_naqla_record
-from services.table_managers import TruckOwnerManager, SupplierManager, ZoneManager, FactoryManager, RepresentativeManager
+from .auth_routes import login_required, admin_required
+from db import pool_stats
+from services.dimension_cache import dimension_cache
+from services.export_cache import export_cache
+from services.slow_queries import slow_query_store, SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN
+from services.main_data_manager import save_data_entry, update_data_entry, update_naqla_record, get_records_between, get_records_delta, get_main_version, month_bounds, delete_naqla_record
 
-truck_owner_manager = TruckOwnerManager()
-supplier_manager = SupplierManager()
-zone_manager = ZoneManager()
-factory_manager = FactoryManager()
-representative_manager = RepresentativeManager()
+def requested_month(args):
+    """(first day, first day of next month) for ?month=YYYY-MM, else this month."""
+    try:
+        year, month = (int(part) for part in args["month"].split("-"))
+    except (KeyError, ValueError):
+        return month_bounds()
+    if not (1 <= month <= 12 and 1 < year < 9999):
+        return month_bounds()
+    return month_bounds(year, month)
+
+def grid_row(record):
+    naqla_id, full_date, *values = record
+    return [naqla_id, full_date.isoformat(), *values]
 
 def register_main_routes(app):
     @app.route("/")
@@ -28,6 +40,27 @@ def register_main_routes(app):
     def settings():
         return render_template("settings.html")
 
+    @app.route("/settings/cache-stats")
+    @login_required
+    def cache_stats():
+        return jsonify({
+            "dimension_cache": dimension_cache.stats(),
+            "export_cache": export_cache.stats(),
+            "db_pool": pool_stats(),
+        })
+
+    @app.route("/settings/slow-queries")
+    @admin_required
+    def slow_queries():
+        selected = slow_query_store.get(request.args.get("id"))
+        return render_template(
+            "slow_queries.html",
+            entries=slow_query_store.recent(),
+            selected=selected,
+            threshold_ms=SLOW_QUERY_MS,
+            explain_enabled=SLOW_QUERY_EXPLAIN
+        )
+
     @app.route("/data-entry", methods=["GET", "POST"])
     def data_entry():
         if request.method == "POST":
@@ -40,7 +73,6 @@ def register_main_routes(app):
                     flash(f"❌ فشل الحذف: {result['error']}", "error")
                 return redirect(url_for("data_entry"))
             
-            naqla_ids = request.form.getlist("naqla_id[]")
             all_dates = request.form.getlist("date[]")
             all_truck_nums = request.form.getlist("truck_num[]")
             all_truck_owners = request.form.getlist("truck_owner[]")
@@ -68,37 +100,58 @@ def register_main_routes(app):
                     "sell_price": all_sell_prices[i] if i < len(all_sell_prices) else None,
                     "representative": all_representatives[i] if i < len(all_representatives) else None,
                 }
-                
-                naqla_id = naqla_ids[i] if i < len(naqla_ids) else None
-                if naqla_id:
-                    update_naqla_record(naqla_id, record_data)
-                elif record_data["date"] and record_data["truck_num"]:
+                if record_data["date"] and record_data["truck_num"]:
                     new_records_to_save.append(record_data)
 
             if new_records_to_save:
-                if save_data_entry(new_records_to_save):
+                result = save_data_entry(new_records_to_save)
+                skipped = [row for row in result['rows'] if row['status'] == 'skipped']
+                if skipped:
+                    flash(f"⚠️ لم يتم حفظ {len(skipped)} صف: أكمل المورد والمصنع والمنطقة والمندوب، واختر مالكًا للشاحنة الجديدة", "warning")
+                if result['success'] and result['inserted']:
                     flash("✅ تم حفظ البيانات بنجاح!", "success")
-                else:
+                elif not result['success']:
                     flash("❌ حدث خطأ أثناء حفظ البيانات", "error")
             return redirect(url_for("data_entry"))
 
-        trucks = truck_owner_manager.fetch_trucks_with_owners()
-        suppliers, _ = supplier_manager.fetch_all(limit=100, offset=0)
-        factories, _ = factory_manager.fetch_all(limit=10, offset=1)
-        zones, _ = zone_manager.fetch_all(limit=100, offset=0)
-        representatives, _ = representative_manager.fetch_all(limit=100, offset=0)
-        month_records = get_current_month_records()
+        # Trucks and the other dimensions are loaded on demand from /api/autocomplete/<source>.
+        # ?month=YYYY-MM تصفح الشهور السابقة
+        first, following = requested_month(request.args)
+        # Read the version first: a write that lands in between is simply resent by the next delta.
+        grid_version = get_main_version()
+        month_records = get_records_between(first, following)
+        previous = month_bounds(first.year - (first.month == 1), (first.month - 2) % 12 + 1)[0]
 
         return render_template(
             "data_entry.html",
-            trucks=trucks,
-            suppliers=suppliers,
-            factories=factories,
-            zones=zones,
-            representatives=representatives,
-            month_records=month_records
+            month_records=month_records,
+            month_start=first,
+            grid_version=grid_version,
+            previous_month=previous.strftime("%Y-%m"),
+            next_month=following.strftime("%Y-%m") if following <= date.today() else None
         )
 
+    @app.route("/data-entry/grid")
+    @login_required
+    def data_entry_grid():
+        """Rows of the month grid changed since ?since=<version>, as JSON."""
+        first, following = requested_month(request.args)
+        since = request.args.get("since", type=int)
+        # The body depends on since as well as the version; no since and 0 both mean a full reset.
+        etag = f"grid-{first:%Y-%m}-{since or 0}-{get_main_version()}"
+        # The grid hasn't moved since the client's copy: skip the queries.
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            delta = get_records_delta(first, following, since)
+            for key in ("inserted", "updated"):
+                delta[key] = [grid_row(row) for row in delta[key]]
+            response = jsonify(delta)
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
     @app.route('/update_record', methods=['POST'])
     @login_required
     def update_record_route():
@@ -107,4 +160,14 @@ def register_main_routes(app):
         if not naqla_id:
             return jsonify({'success': False, 'error': 'No ID provided'})
         response = update_naqla_record(naqla_id, data)
-        return jsonify(response)
\ No newline at end of file
+        return jsonify(response)
+
+    @app.route('/update_records', methods=['POST'])
+    @login_required
+    def update_records_route():
+        # {"rows": [{"id": ..., "date": ..., ...}]} — only the rows that changed
+        data = request.get_json(silent=True) or {}
+        rows = data.get('rows')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return jsonify({'success': False, 'error': 'Expected {"rows": [...]}'}), 400
+        return jsonify(update_data_entry(rows))
\ No newline at end of file
@@ -0,0 +1,37 @@
+# margin_routes.py
+from flask import Response, request, jsonify
+
+from .auth_routes import login_required
+from services.main_data_manager import month_bounds
+from services.margins import get_margin_report, margin_report_csv, margin_report_json
+from services.rollups import month_range
+
+MARGIN_DEFAULT_LIMIT = 50
+MARGIN_MAX_LIMIT = 500
+MARGIN_MAX_WINDOW = 36
+
+
+def register_margin_routes(app):
+    @app.route("/api/analytics/margins")
+    @login_required
+    def margin_report():
+        by = request.args.get("by", "factory")
+        period = request.args.get("period", "month")
+        try:
+            first, last = month_range(request.args.get("start"), request.args.get("end"))
+            limit = min(request.args.get("limit", MARGIN_DEFAULT_LIMIT, type=int), MARGIN_MAX_LIMIT)
+            window = min(request.args.get("window", 3, type=int), MARGIN_MAX_WINDOW)
+            report = get_margin_report(
+                by, first, month_bounds(last.year, last.month)[1], period=period,
+                sort=request.args.get("sort", "net"), limit=max(limit, 1), window=max(window, 1),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if request.args.get("format") == "csv":
+            filename = f"margins_{by}_{first:%Y-%m}_{last:%Y-%m}.csv"
+            return Response(
+                margin_report_csv(report, by, period).encode("utf-8"),
+                mimetype="text/csv",
+                headers={"Content-Disposition": f"attachment; filename={filename}"},
+            )
+        return jsonify(margin_report_json(report, by, period))
@@ -0,0 +1,38 @@
+# metrics_routes.py
+import hmac
+import os
+from flask import request, session, Response
+
+from services.metrics import start_request, finish_request, render_metrics
+
+# Scrapers can't log in; give them this as "Authorization: Bearer <token>".
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+def metrics_allowed():
+    if "user_id" in session:
+        return True
+    if not METRICS_TOKEN:
+        return False
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    return hmac.compare_digest(supplied, METRICS_TOKEN)
+
+def register_metrics_routes(app):
+    @app.before_request
+    def start_timing():
+        start_request()
+
+    @app.after_request
+    def stop_timing(response):
+        finish_request(request.endpoint, response.status_code)
+        return response
+
+    @app.teardown_request
+    def stop_timing_on_error(error):
+        # after_request is skipped when a view raises; record those as 500s.
+        finish_request(request.endpoint, 500)
+
+    @app.route("/metrics")
+    def metrics():
+        if not metrics_allowed():
+            return Response("Forbidden\n", status=403, mimetype="text/plain")
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
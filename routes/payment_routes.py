@@ -1,18 +1,44 @@
 from flask import render_template, request, redirect, url_for, flash, jsonify
+from werkzeug.datastructures import MultiDict
 import json
+from datetime import date
 from services.payment_services import (
-    get_supplier_payments, add_supplier_payment,
-    get_truck_owner_payments, add_truck_owner_payment,
+    add_supplier_payment, add_truck_owner_payment,
     update_supplier_payment, delete_supplier_payment,
-    update_truck_owner_payment, delete_truck_owner_payment
+    update_truck_owner_payment, delete_truck_owner_payment,
+    get_banks, get_payments_page
 )
-from services.table_managers import SupplierManager, TruckOwnerManager
-from services.main_data_manager import get_id_by_name
-import psycopg2
-from db import PG_PARAMS
-# إنشاء مدراء الجداول
-supplier_manager = SupplierManager()
-truck_owner_manager = TruckOwnerManager()
+
+PAYMENTS_PER_PAGE = 25
+
+
+def payment_ledger_args(args):
+    """Filters and page position for a payment ledger from the query string.
+
+    Dates must be YYYY-MM-DD (ValueError otherwise); a payment_method,
+    amount or cursor that isn't a number is ignored.
+    """
+    start = args.get("start")
+    end = args.get("end")
+    filters = {
+        "search": args.get("query", "").strip() or None,
+        "start": date.fromisoformat(start) if start else None,
+        "end": date.fromisoformat(end) if end else None,
+        "payment_method": args.get("payment_method", type=int),
+        "min_amount": args.get("min_amount", type=float),
+        "max_amount": args.get("max_amount", type=float),
+    }
+    return filters, args.get("after", type=int), args.get("before", type=int)
+
+
+def payment_ledger_page(kind, args):
+    """(filters, page) for a ledger page; a bad date shows the first page, unfiltered."""
+    try:
+        filters, after, before = payment_ledger_args(args)
+    except ValueError:
+        flash("تاريخ غير صالح، تم عرض كل المدفوعات.", "warning")
+        filters, after, before = payment_ledger_args(MultiDict())
+    return filters, get_payments_page(kind, filters, after=after, before=before, limit=PAYMENTS_PER_PAGE)
 
 
 def register_payment_routes(app):
@@ -44,21 +70,14 @@ def register_payment_routes(app):
                 return redirect(url_for("supplier_payment"))
 
             try:
-                conn = psycopg2.connect(**PG_PARAMS)
-                cur = conn.cursor()
-                supplier_id = get_id_by_name(cur, "suppliers", "supplier_id", "supplier_name", supplier_name)
-
                 add_supplier_payment(
                     date_id,
-                    supplier_id,
+                    supplier_name,
                     amount,
                     transfer_fees,
                     payment_method,
                     notes
                 )
-                conn.commit()
-                cur.close()
-                conn.close()
 
                 flash("تمت إضافة دفعة للمورد بنجاح.", "success")
             except Exception as e:
@@ -66,25 +85,19 @@ def register_payment_routes(app):
 
             return redirect(url_for("supplier_payment"))
 
-        # جلب المدفوعات
-        payments = get_supplier_payments(request.args.get("query"))
-        # جلب قائمة الموردين
-        suppliers, _ = supplier_manager.fetch_all(limit=1000, offset=0)
-
+        # جلب المدفوعات: صفحة واحدة مع الفلاتر والإجماليات
+        filters, ledger = payment_ledger_page("supplier", request.args)
+        # الموردين يتم تحميلهم عند الكتابة من /api/autocomplete/suppliers
         # 👇 جلب قائمة البنوك
-        conn = psycopg2.connect(**PG_PARAMS)
-        cur = conn.cursor()
-        cur.execute("SELECT bank_id, bank_name FROM bank_name ORDER BY bank_name")
-        banks = [{"bank_id": row[0], "bank_name": row[1]} for row in cur.fetchall()]
-        cur.close()
-        conn.close()
+        banks = get_banks()
 
         return render_template(
             "supplier_payment.html",
-            payments=payments,
-            suppliers=suppliers,
+            payments=ledger["payments"],
+            ledger=ledger,
+            filters=filters,
+            page_args={k: v for k, v in request.args.items() if k not in ("after", "before")},
             banks=banks,
-            suppliers_json=json.dumps(suppliers),  # ✅ dicts جاهزة
             banks_json=json.dumps(banks)           # ✅ dicts جاهزة
         )
 
@@ -112,48 +125,34 @@ def register_payment_routes(app):
                 return redirect(url_for("truck_owner_payment"))
 
             try:
-                conn = psycopg2.connect(**PG_PARAMS)
-                cur = conn.cursor()
-
-                owner_id = get_id_by_name(cur, "truck_owners", "owner_id", "owner_name", owner_name)
-
                 add_truck_owner_payment(
                     date_id,
-                    owner_id,
+                    owner_name,
                     amount,
                     transfer_fees,
                     payment_method,
                     notes
                 )
 
-                conn.commit()
-                cur.close()
-                conn.close()
-
                 flash("تمت إضافة دفعة لمالك الشاحنة بنجاح.", "success")
             except Exception as e:
                 flash(f"حدث خطأ أثناء إضافة الدفعة: {str(e)}", "danger")
 
             return redirect(url_for("truck_owner_payment"))
 
-        # جلب المدفوعات
-        payments = get_truck_owner_payments(request.args.get("query"))
-        # جلب قائمة الملاك
-        owners, _ = truck_owner_manager.fetch_all(limit=1000, offset=0)
+        # جلب المدفوعات: صفحة واحدة مع الفلاتر والإجماليات
+        filters, ledger = payment_ledger_page("truck_owner", request.args)
+        # الملاك يتم تحميلهم عند الكتابة من /api/autocomplete/truck_owners
         # 👇 جلب قائمة البنوك
-        conn = psycopg2.connect(**PG_PARAMS)
-        cur = conn.cursor()
-        cur.execute("SELECT bank_id, bank_name FROM bank_name ORDER BY bank_name")
-        banks = [{"bank_id": row[0], "bank_name": row[1]} for row in cur.fetchall()]
-        cur.close()
-        conn.close()
+        banks = get_banks()
 
         return render_template(
             "truck_owner_payment.html",
-            payments=payments,
-            owners=owners,
+            payments=ledger["payments"],
+            ledger=ledger,
+            filters=filters,
+            page_args={k: v for k, v in request.args.items() if k not in ("after", "before")},
             banks=banks,
-            owners_json=json.dumps(owners),
             banks_json=json.dumps(banks)
         )
 
@@ -176,6 +175,8 @@ def register_payment_routes(app):
             )
             print("Supplier payment updated successfully.")
             return jsonify({"success": True})
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         except Exception as e:
             print("Error updating supplier payment:", str(e))
             return jsonify({"success": False, "error": str(e)}), 500
@@ -210,6 +211,8 @@ def register_payment_routes(app):
                 data.get("owner_name")
             )
             return jsonify({"success": True})
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
 
@@ -0,0 +1,75 @@
+# rollup_routes.py
+from datetime import timedelta
+
+from flask import render_template, request, jsonify
+
+from .auth_routes import login_required
+from services.main_data_manager import month_bounds
+from services.rollups import ROLLUP_DIMENSIONS, ROLLUP_METRICS, get_rollup_daily, get_rollup_report, month_range
+
+ROLLUP_DEFAULT_LIMIT = 50
+ROLLUP_MAX_LIMIT = 1000
+
+
+def rollup_page_args(args):
+    """(dimension, first month, last month, sort, limit) from the query string; ValueError if invalid."""
+    dimension = args.get("dimension", "factory")
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}'")
+    sort = args.get("sort", "revenue")
+    if sort not in ROLLUP_METRICS:
+        raise ValueError(f"Unknown metric '{sort}'")
+    first, last = month_range(args.get("start"), args.get("end"))
+    limit = min(args.get("limit", ROLLUP_DEFAULT_LIMIT, type=int), ROLLUP_MAX_LIMIT)
+    return dimension, first, last, sort, max(limit, 1)
+
+
+def rollup_json(report):
+    return {
+        **report,
+        "months": [{**m, "month": m["month"].strftime("%Y-%m")} for m in report["months"]],
+    }
+
+
+def register_rollup_routes(app):
+    @app.route("/analytics")
+    @login_required
+    def analytics():
+        try:
+            dimension, first, last, sort, limit = rollup_page_args(request.args)
+        except ValueError:
+            dimension, sort, limit = "factory", "revenue", ROLLUP_DEFAULT_LIMIT
+            first, last = month_range(None, None)
+        report = get_rollup_report(dimension, first, last, sort=sort, limit=limit)
+        return render_template(
+            "analytics.html",
+            report=report,
+            dimension=dimension,
+            dimensions=list(ROLLUP_DIMENSIONS),
+            metrics=ROLLUP_METRICS,
+            sort=sort,
+            start=first.strftime("%Y-%m"),
+            end=last.strftime("%Y-%m"),
+        )
+
+    @app.route("/api/rollups")
+    @login_required
+    def rollup_report():
+        try:
+            dimension, first, last, sort, limit = rollup_page_args(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(rollup_json(get_rollup_report(dimension, first, last, sort=sort, limit=limit)))
+
+    @app.route("/api/rollups/<dimension>/<int:member_id>/daily")
+    @login_required
+    def rollup_daily(dimension, member_id):
+        if dimension not in ROLLUP_DIMENSIONS:
+            return jsonify({"error": f"Unknown dimension '{dimension}'"}), 404
+        try:
+            first, last = month_range(request.args.get("start"), request.args.get("end"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        following = month_bounds(last.year, last.month)[1]
+        days = get_rollup_daily(dimension, member_id, first, following - timedelta(days=1))
+        return jsonify([{**d, "day": d["day"].isoformat()} for d in days])
@@ -5,12 +5,22 @@ from .dimension_routes import register_dimension_routes
 from .transaction_routes import register_transaction_routes
 from .custody_routes import register_custody_routes
 from .payment_routes import register_payment_routes
+from .autocomplete_routes import register_autocomplete_routes
+from .metrics_routes import register_metrics_routes
+from .balance_routes import register_balance_routes
+from .rollup_routes import register_rollup_routes
+from .margin_routes import register_margin_routes
 
 
 def register_routes(app):
+    register_metrics_routes(app)
     register_auth_routes(app)
     register_main_routes(app)
     register_dimension_routes(app)
     register_transaction_routes(app)
     register_custody_routes(app)
     register_payment_routes(app)
+    register_autocomplete_routes(app)
+    register_balance_routes(app)
+    register_rollup_routes(app)
+    register_margin_routes(app)
@@ -1,42 +1,63 @@
 # transaction_routes.py
-from flask import render_template, request, send_file
+from flask import Response, render_template, request, stream_with_context
+from urllib.parse import quote
 
 from .auth_routes import login_required
-from services.transaction_service import export_transactions_to_excel, fetch_transactions_from_db
+from services.transaction_service import export_transactions as build_transactions_export, fetch_transactions_page
 
 def register_transaction_routes(app):
     @app.route("/dashboard/transactions", methods=['GET', 'POST'])
     @login_required
     def transactions():
         transactions_data = []
-        start = end = ""
-        page = int(request.args.get("page", 1))
+        next_cursor = prev_cursor = None
         per_page = 10
-        offset = (page - 1) * per_page
+        page = int(request.args.get("page", 1))
         if request.method == 'POST':
             start = request.form.get("start_date")
             end = request.form.get("end_date")
-            transactions_data = fetch_transactions_from_db(start, end, limit=per_page, offset=offset)
-        elif request.method == 'GET':
+            cursor, direction, page = None, "next", 1
+        else:
             start = request.args.get("start_date", "")
             end = request.args.get("end_date", "")
-            if start and end:
-                transactions_data = fetch_transactions_from_db(start, end, limit=per_page, offset=offset)
+            cursor = request.args.get("cursor") or None
+            direction = request.args.get("dir", "next")
+        if start and end:
+            try:
+                transactions_data, next_cursor, prev_cursor = fetch_transactions_page(
+                    start, end, cursor=cursor, direction=direction, limit=per_page
+                )
+            except ValueError:
+                # Tampered or stale cursor: fall back to the first page.
+                transactions_data, next_cursor, prev_cursor = fetch_transactions_page(start, end, limit=per_page)
+                page = 1
         return render_template(
             "transactions.html",
             transactions=transactions_data,
             start=start,
             end=end,
-            page=page
+            page=page,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
 
-    # ⬇️ Export Excel
+    # ⬇️ Export Excel / CSV (streamed, served from the export cache when unchanged)
     @app.route("/dashboard/transactions/export", methods=['POST'])
     @login_required
     def export_transactions():
         start = request.form.get("start_date")
         end = request.form.get("end_date")
-        file_path = export_transactions_to_excel(start, end)
-        if file_path:
-            return send_file(file_path, as_attachment=True)
-        return "Export failed or no data found"
\ No newline at end of file
+        fmt = "csv" if request.form.get("format") == "csv" else "xlsx"
+        try:
+            export = build_transactions_export(start, end, fmt)
+        except Exception as e:
+            print(f"Export error: {e}")
+            export = None
+        if not export:
+            return "Export failed or no data found"
+        chunks, mimetype, filename = export
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+        )
\ No newline at end of file
@@ -0,0 +1,444 @@
+"""Running balances of what we owe each supplier and truck owner.
+
+A supplier is owed weight * factory_price for each of its naqla rows, a
+truck owner weight * sell_price for each naqla carried by one of its
+trucks; payments from suppliers_payment / truck_owners_payment count
+against that. party_balances holds the totals per party and
+party_balances_monthly the same split by month, both kept current by
+triggers on main, the payment tables and trucks. Reading a balance is then
+one primary-key lookup however long the history gets, and a statement page
+only needs the monthly rows plus one month of entries for its opening
+balance.
+
+Triggers rather than calls from the services, so every writer is covered:
+the data-entry batch update, truck renames cascading into main, owner
+changes on a truck, and manual fixes in psql.
+"""
+from datetime import date, timedelta
+
+from psycopg2.extras import RealDictCursor
+
+from db import get_connection
+from services.cursors import decode_key, encode_key
+
+BALANCES_SQL = """
+CREATE TABLE IF NOT EXISTS party_balances (
+    party TEXT NOT NULL,
+    party_id INT NOT NULL,
+    owed NUMERIC NOT NULL DEFAULT 0,
+    paid NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (party, party_id)
+);
+
+CREATE TABLE IF NOT EXISTS party_balances_monthly (
+    party TEXT NOT NULL,
+    party_id INT NOT NULL,
+    month DATE NOT NULL,
+    owed NUMERIC NOT NULL DEFAULT 0,
+    paid NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (party, party_id, month)
+);
+
+DO $$ BEGIN
+    CREATE TYPE balance_delta AS (party text, party_id int, month date, owed numeric, paid numeric);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- Payment date_id is a YYYYMMDD number; anything that isn't a real date gives NULL.
+CREATE OR REPLACE FUNCTION payment_date(date_id int) RETURNS date
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE WHEN date_id / 10000 >= 1 AND date_id / 100 % 100 BETWEEN 1 AND 12 AND date_id % 100 >= 1 THEN
+        CASE WHEN date_id % 100 <= EXTRACT(DAY FROM make_date(date_id / 10000, date_id / 100 % 100, 1) + INTERVAL '1 month - 1 day')
+            THEN make_date(date_id / 10000, date_id / 100 % 100, date_id % 100)
+        END
+    END
+$$;
+
+-- Add deltas to both summaries. Rows are locked in key order so two writers
+-- touching the same parties can't deadlock.
+CREATE OR REPLACE FUNCTION post_balance_deltas(deltas balance_delta[]) RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO party_balances_monthly AS b (party, party_id, month, owed, paid)
+    SELECT party, party_id, month, SUM(owed), SUM(paid)
+    FROM unnest(deltas)
+    WHERE party_id IS NOT NULL AND month IS NOT NULL
+    GROUP BY party, party_id, month
+    ORDER BY party, party_id, month
+    ON CONFLICT (party, party_id, month) DO UPDATE
+        SET owed = b.owed + EXCLUDED.owed, paid = b.paid + EXCLUDED.paid;
+
+    INSERT INTO party_balances AS b (party, party_id, owed, paid)
+    SELECT party, party_id, SUM(owed), SUM(paid)
+    FROM unnest(deltas)
+    WHERE party_id IS NOT NULL AND month IS NOT NULL
+    GROUP BY party, party_id
+    ORDER BY party, party_id
+    ON CONFLICT (party, party_id) DO UPDATE
+        SET owed = b.owed + EXCLUDED.owed, paid = b.paid + EXCLUDED.paid, updated_at = now();
+$$;
+
+CREATE OR REPLACE FUNCTION main_balance_deltas() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM post_balance_deltas(ARRAY(
+            SELECT ROW(p.party, p.party_id, date_trunc('month', d.full_date::date)::date, p.amount, 0)::balance_delta
+            FROM new_rows n
+            JOIN dim_date d ON d.date_id = n.date_id
+            LEFT JOIN trucks t ON t.truck_num = n.truck_num
+            CROSS JOIN LATERAL (VALUES
+                ('supplier', n.supplier_id, COALESCE(n.weight, 0) * COALESCE(n.factory_price, 0)),
+                ('truck_owner', t.owner_id, COALESCE(n.weight, 0) * COALESCE(n.sell_price, 0))
+            ) AS p(party, party_id, amount)
+        ));
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        -- A truck rename cascades into main after trucks already has the new
+        -- number; the old one is gone, so take the owner from the new row.
+        PERFORM post_balance_deltas(ARRAY(
+            SELECT ROW(p.party, p.party_id, date_trunc('month', d.full_date::date)::date, -p.amount, 0)::balance_delta
+            FROM old_rows o
+            JOIN dim_date d ON d.date_id = o.date_id
+            LEFT JOIN trucks t ON t.truck_num = o.truck_num
+            LEFT JOIN new_rows n ON n.naqla_id = o.naqla_id AND t.truck_num IS NULL
+            LEFT JOIN trucks nt ON nt.truck_num = n.truck_num
+            CROSS JOIN LATERAL (VALUES
+                ('supplier', o.supplier_id, COALESCE(o.weight, 0) * COALESCE(o.factory_price, 0)),
+                ('truck_owner', COALESCE(t.owner_id, nt.owner_id), COALESCE(o.weight, 0) * COALESCE(o.sell_price, 0))
+            ) AS p(party, party_id, amount)
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM post_balance_deltas(ARRAY(
+            SELECT ROW(p.party, p.party_id, date_trunc('month', d.full_date::date)::date, -p.amount, 0)::balance_delta
+            FROM old_rows o
+            JOIN dim_date d ON d.date_id = o.date_id
+            LEFT JOIN trucks t ON t.truck_num = o.truck_num
+            CROSS JOIN LATERAL (VALUES
+                ('supplier', o.supplier_id, COALESCE(o.weight, 0) * COALESCE(o.factory_price, 0)),
+                ('truck_owner', t.owner_id, COALESCE(o.weight, 0) * COALESCE(o.sell_price, 0))
+            ) AS p(party, party_id, amount)
+        ));
+    END IF;
+    RETURN NULL;
+END $$;
+
+-- TG_ARGV: party, party id column
+CREATE OR REPLACE FUNCTION payment_balance_deltas() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM post_balance_deltas(ARRAY(
+            SELECT ROW(TG_ARGV[0], (to_jsonb(n) ->> TG_ARGV[1])::int,
+                       date_trunc('month', payment_date(n.date_id))::date, 0, COALESCE(n.amount, 0))::balance_delta
+            FROM new_rows n
+        ));
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM post_balance_deltas(ARRAY(
+            SELECT ROW(TG_ARGV[0], (to_jsonb(o) ->> TG_ARGV[1])::int,
+                       date_trunc('month', payment_date(o.date_id))::date, 0, -COALESCE(o.amount, 0))::balance_delta
+            FROM old_rows o
+        ));
+    END IF;
+    RETURN NULL;
+END $$;
+
+-- A truck changing hands moves its naqla rows to the new owner. The rows
+-- may still carry the old number if the same UPDATE renamed the truck.
+CREATE OR REPLACE FUNCTION trucks_balance_owner() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM post_balance_deltas(ARRAY(
+        SELECT ROW('truck_owner', o.owner_id, date_trunc('month', d.full_date::date)::date,
+                   o.sign * COALESCE(m.weight, 0) * COALESCE(m.sell_price, 0), 0)::balance_delta
+        FROM main m
+        JOIN dim_date d ON d.date_id = m.date_id
+        CROSS JOIN (VALUES (OLD.owner_id, -1), (NEW.owner_id, 1)) AS o(owner_id, sign)
+        WHERE m.truck_num IN (OLD.truck_num, NEW.truck_num)
+    ));
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS main_balance_insert ON main;
+CREATE TRIGGER main_balance_insert AFTER INSERT ON main
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION main_balance_deltas();
+DROP TRIGGER IF EXISTS main_balance_update ON main;
+CREATE TRIGGER main_balance_update AFTER UPDATE ON main
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION main_balance_deltas();
+DROP TRIGGER IF EXISTS main_balance_delete ON main;
+CREATE TRIGGER main_balance_delete AFTER DELETE ON main
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION main_balance_deltas();
+
+DROP TRIGGER IF EXISTS trucks_balance_owner ON trucks;
+CREATE TRIGGER trucks_balance_owner AFTER UPDATE ON trucks
+    FOR EACH ROW WHEN (OLD.owner_id IS DISTINCT FROM NEW.owner_id)
+    EXECUTE FUNCTION trucks_balance_owner();
+"""
+
+REBUILD_BALANCES_SQL = """
+TRUNCATE party_balances, party_balances_monthly;
+
+INSERT INTO party_balances_monthly (party, party_id, month, owed, paid)
+SELECT party, party_id, month, SUM(owed), SUM(paid)
+FROM (
+    SELECT 'supplier' AS party, m.supplier_id AS party_id, date_trunc('month', d.full_date::date)::date AS month,
+           COALESCE(m.weight, 0) * COALESCE(m.factory_price, 0) AS owed, 0 AS paid
+    FROM main m JOIN dim_date d ON d.date_id = m.date_id
+    UNION ALL
+    SELECT 'truck_owner', t.owner_id, date_trunc('month', d.full_date::date)::date,
+           COALESCE(m.weight, 0) * COALESCE(m.sell_price, 0), 0
+    FROM main m JOIN dim_date d ON d.date_id = m.date_id JOIN trucks t ON t.truck_num = m.truck_num
+    UNION ALL
+    SELECT 'supplier', supplier_id, date_trunc('month', payment_date(date_id))::date, 0, COALESCE(amount, 0)
+    FROM suppliers_payment
+    UNION ALL
+    SELECT 'truck_owner', owner_id, date_trunc('month', payment_date(date_id))::date, 0, COALESCE(amount, 0)
+    FROM truck_owners_payment
+) entries
+WHERE party_id IS NOT NULL AND month IS NOT NULL
+GROUP BY party, party_id, month;
+
+INSERT INTO party_balances (party, party_id, owed, paid)
+SELECT party, party_id, SUM(owed), SUM(paid)
+FROM party_balances_monthly
+GROUP BY party, party_id;
+"""
+
+# party -> how its entries are read; every name here is fixed in code, never user input
+BALANCE_PARTIES = {
+    "supplier": {
+        "party_table": "suppliers",
+        "party_id": "supplier_id",
+        "party_name": "supplier_name",
+        "price": "m.factory_price",
+        "naqla_join": "",
+        "naqla_party": "m.supplier_id",
+        "payments": "suppliers_payment",
+        "payment_id": "supplier_transaction_id",
+        "payment_party": "supplier_id",
+    },
+    "truck_owner": {
+        "party_table": "truck_owners",
+        "party_id": "owner_id",
+        "party_name": "owner_name",
+        "price": "m.sell_price",
+        "naqla_join": "JOIN trucks t ON t.truck_num = m.truck_num",
+        "naqla_party": "t.owner_id",
+        "payments": "truck_owners_payment",
+        "payment_id": "truck_owner_transaction_id",
+        "payment_party": "owner_id",
+    },
+}
+
+
+def ensure_balances(cur):
+    """Install the balance tables, their triggers and the helper functions."""
+    cur.execute(BALANCES_SQL)
+    for party, spec in BALANCE_PARTIES.items():
+        table = spec["payments"]
+        for event, referencing in (
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ):
+            name = f"{table}_balance_{event.lower()}"
+            cur.execute(f"""
+                DROP TRIGGER IF EXISTS {name} ON {table};
+                CREATE TRIGGER {name} AFTER {event} ON {table}
+                    REFERENCING {referencing}
+                    FOR EACH STATEMENT EXECUTE FUNCTION payment_balance_deltas('{party}', '{spec["payment_party"]}');
+            """)
+
+
+def rebuild_balances(cur):
+    """Recompute both summaries from main and the payments (after a bulk load or TRUNCATE)."""
+    cur.execute("LOCK TABLE main, suppliers_payment, truck_owners_payment, trucks IN SHARE MODE")
+    cur.execute(REBUILD_BALANCES_SQL)
+
+
+def _entries_sql(spec):
+    """Statement entries of one party dated lo <= date < hi: naqla rows owed, payments made.
+
+    Ordered by (entry_date, seq, entry_id): naqla rows (seq 0) before
+    payments (seq 1) on the same day. The date bounds sit in each branch so
+    only that window of the party's history is read; see _window_params().
+    """
+    return f"""
+        SELECT d.full_date::date AS entry_date, 0 AS seq, m.naqla_id AS entry_id, 'naqla' AS entry_type,
+               m.truck_num, m.weight, {spec['price']} AS price, f.factory_name AS details, NULL::text AS notes,
+               COALESCE(m.weight, 0) * COALESCE({spec['price']}, 0) AS owed, 0::numeric AS paid
+        FROM main m
+        JOIN dim_date d ON d.date_id = m.date_id
+        {spec['naqla_join']}
+        LEFT JOIN factories f ON f.factory_id = m.factory_id
+        WHERE {spec['naqla_party']} = %(party_id)s
+          AND d.full_date >= %(lo_day)s AND d.full_date < %(hi_day)s
+        UNION ALL
+        SELECT payment_date(p.date_id), 1, p.{spec['payment_id']}, 'payment',
+               NULL, NULL, NULL, b.bank_name, p.notes,
+               0::numeric, COALESCE(p.amount, 0)
+        FROM {spec['payments']} p
+        LEFT JOIN bank_name b ON b.bank_id = p.payment_method
+        WHERE p.{spec['payment_party']} = %(party_id)s
+          AND p.date_id >= %(lo_id)s AND p.date_id < %(hi_id)s
+    """
+
+
+def _window_params(lo, hi):
+    # dim_date.full_date is 'YYYY-MM-DD' text and payment date_id a YYYYMMDD number; both sort as dates.
+    return {"lo_day": lo.isoformat(), "hi_day": hi.isoformat(),
+            "lo_id": int(lo.strftime("%Y%m%d")), "hi_id": int(hi.strftime("%Y%m%d"))}
+
+
+def _next_month(day, months=1):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def encode_entry_cursor(entry):
+    return encode_key([entry["entry_date"].isoformat(), entry["seq"], entry["entry_id"]])
+
+
+def decode_entry_cursor(token):
+    entry_date, seq, entry_id = decode_key(token, (str, int, int))
+    return date.fromisoformat(entry_date), seq, entry_id
+
+
+def get_balance(party, party_id):
+    """{'party_id', 'name', 'owed', 'paid', 'balance'} for one party, or None if it doesn't exist.
+
+    balance is what we still owe: owed - paid.
+    """
+    spec = BALANCE_PARTIES[party]
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT p.{spec['party_id']} AS party_id, p.{spec['party_name']} AS name,
+                       COALESCE(b.owed, 0) AS owed, COALESCE(b.paid, 0) AS paid,
+                       COALESCE(b.owed - b.paid, 0) AS balance, b.updated_at
+                FROM {spec['party_table']} p
+                LEFT JOIN party_balances b ON b.party = %s AND b.party_id = p.{spec['party_id']}
+                WHERE p.{spec['party_id']} = %s
+            """, (party, party_id))
+            return cur.fetchone()
+
+
+def _balance_before(cur, party, spec, party_id, key):
+    """Balance from every entry ordered before key (entry_date, seq, entry_id).
+
+    The months before key's month come from party_balances_monthly; only
+    key's own month is read entry by entry.
+    """
+    month_start = key[0].replace(day=1)
+    cur.execute(f"""
+        SELECT
+            (SELECT COALESCE(SUM(owed - paid), 0) FROM party_balances_monthly
+             WHERE party = %(party)s AND party_id = %(party_id)s AND month < %(month_start)s)
+          + (SELECT COALESCE(SUM(e.owed - e.paid), 0) FROM ({_entries_sql(spec)}) e
+             WHERE (e.entry_date, e.seq, e.entry_id) < (%(entry_date)s, %(seq)s, %(entry_id)s))
+            AS opening
+    """, {"party": party, "party_id": party_id, "month_start": month_start,
+          "entry_date": key[0], "seq": key[1], "entry_id": key[2],
+          **_window_params(month_start, key[0] + timedelta(days=1))})
+    return cur.fetchone()["opening"]
+
+
+def _statement_months(cur, party, party_id, first, last, backwards):
+    """Months between first and last (inclusive) holding entries of the party, in page order."""
+    cur.execute(f"""
+        SELECT month FROM party_balances_monthly
+        WHERE party = %s AND party_id = %s AND month BETWEEN %s AND %s
+        ORDER BY month {'DESC' if backwards else 'ASC'}
+    """, (party, party_id, first, last))
+    return [row["month"] for row in cur.fetchall()]
+
+
+def get_statement(party, party_id, start=None, end=None, after=None, before=None, limit=50):
+    """One page of a party's account statement, oldest first, with running balances.
+
+    start/end (dates) narrow the statement; after/before are cursors from a
+    previous page's next_after/prev_before. Entries are read a window of
+    months at a time, starting at the cursor's month and doubling the
+    window until the page is full, so a page reads the months it covers
+    rather than the party's whole history. The opening balance comes from
+    the monthly summary plus the entries earlier in the page's first month.
+    A malformed cursor raises ValueError for the caller to handle.
+    """
+    spec = BALANCE_PARTIES[party]
+    conditions = ["e.entry_date IS NOT NULL"]
+    params = {"party_id": party_id}
+    first, last = date.min, date.max.replace(day=1)
+    if start:
+        conditions.append("e.entry_date >= %(start)s")
+        params["start"] = start
+        first = start.replace(day=1)
+    if end:
+        conditions.append("e.entry_date <= %(end)s")
+        params["end"] = end
+        last = end.replace(day=1)
+    backwards = before is not None
+    cursor = decode_entry_cursor(before if backwards else after) if (before or after) else None
+    if cursor:
+        conditions.append("(e.entry_date, e.seq, e.entry_id) " + ("<" if backwards else ">")
+                          + " (%(c_date)s, %(c_seq)s, %(c_id)s)")
+        params.update(c_date=cursor[0], c_seq=cursor[1], c_id=cursor[2])
+        if backwards:
+            last = min(last, cursor[0].replace(day=1))
+        else:
+            first = max(first, cursor[0].replace(day=1))
+    order = "DESC" if backwards else "ASC"
+
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            months = _statement_months(cur, party, party_id, first, last, backwards)
+            entries = []
+            position, span = 0, 1
+            while position < len(months) and len(entries) <= limit:
+                window = months[position:position + span]
+                cur.execute(f"""
+                    SELECT e.* FROM ({_entries_sql(spec)}) e
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY e.entry_date {order}, e.seq {order}, e.entry_id {order}
+                    LIMIT %(limit)s
+                """, {**params, **_window_params(min(window), _next_month(max(window))),
+                      "limit": limit + 1 - len(entries)})
+                entries.extend(cur.fetchall())
+                position += span
+                span *= 2
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+            if backwards:
+                entries.reverse()
+
+            if entries:
+                first_entry = entries[0]
+                opening = _balance_before(cur, party, spec, party_id,
+                                          (first_entry["entry_date"], first_entry["seq"], first_entry["entry_id"]))
+            elif start:
+                opening = _balance_before(cur, party, spec, party_id, (start, -1, 0))
+            else:
+                opening = 0
+    running = opening
+    for entry in entries:
+        running += entry["owed"] - entry["paid"]
+        entry["balance"] = running
+
+    if backwards:
+        older, newer = has_more, bool(entries)
+    else:
+        older, newer = cursor is not None and bool(entries), has_more
+    return {
+        "entries": entries,
+        "opening_balance": opening,
+        "closing_balance": running,
+        "page_totals": {
+            "owed": sum(e["owed"] for e in entries),
+            "paid": sum(e["paid"] for e in entries),
+        },
+        "next_after": encode_entry_cursor(entries[-1]) if newer else None,
+        "prev_before": encode_entry_cursor(entries[0]) if older else None,
+    }
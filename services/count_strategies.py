@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+
+from services.table_versions import VERSIONED_TABLES, get_table_version
+
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", 300))
+# Below this many rows the planner estimate isn't worth the inaccuracy.
+ESTIMATE_MIN_ROWS = int(os.getenv("COUNT_ESTIMATE_MIN_ROWS", 10000))
+
+# Shared by every manager instance in the process: table -> (version, count, expiry).
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+def exact_count(cur, table):
+    # table always comes from a manager definition, never from user input.
+    cur.execute(f"SELECT COUNT(*) FROM {table}")
+    return cur.fetchone()[0]
+
+
+class CountStrategy:
+    """How BaseTable.fetch_all computes the total row count for pagination."""
+
+    # When True the page query must add "COUNT(*) OVER()" as its last column.
+    in_query = False
+
+    def total(self, cur, table, rows):
+        raise NotImplementedError
+
+
+class ExactCount(CountStrategy):
+    def total(self, cur, table, rows):
+        return exact_count(cur, table)
+
+
+class CachedCount(CountStrategy):
+    """Exact count, remembered until the table's version changes or COUNT_CACHE_TTL.
+
+    The version comes from table_versions, so a write through any worker
+    makes every worker's entry stale. Tables without a version row are
+    counted every time.
+    """
+
+    def total(self, cur, table, rows):
+        if table not in VERSIONED_TABLES:
+            return exact_count(cur, table)
+        # Read the version before counting: a write committing in between
+        # then leaves the entry under the older version, never the reverse.
+        version = get_table_version(cur, table)[0]
+        with _count_lock:
+            entry = _count_cache.get(table)
+        if entry and entry[0] == version and entry[2] > time.monotonic():
+            return entry[1]
+        count = exact_count(cur, table)
+        with _count_lock:
+            _count_cache[table] = (version, count, time.monotonic() + COUNT_CACHE_TTL)
+        return count
+
+
+class WindowCount(CountStrategy):
+    """Total rides along on the page query, so a page is one round trip."""
+
+    in_query = True
+
+    def total(self, cur, table, rows):
+        if rows:
+            return rows[0][-1]
+        # Past the last page there is no row to carry the total.
+        return exact_count(cur, table)
+
+
+class EstimatedCount(CountStrategy):
+    """Planner estimate from pg_class.reltuples, for large tables."""
+
+    def total(self, cur, table, rows):
+        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", (table,))
+        row = cur.fetchone()
+        estimate = row[0] if row else -1
+        # -1 means never vacuumed/analyzed; small tables are cheap to count exactly.
+        if estimate < ESTIMATE_MIN_ROWS:
+            return exact_count(cur, table)
+        return estimate
+
+
+COUNT_STRATEGIES = {
+    "exact": ExactCount(),
+    "cached": CachedCount(),
+    "window": WindowCount(),
+    "estimated": EstimatedCount(),
+}
+
+
+def get_count_strategy(name):
+    try:
+        return COUNT_STRATEGIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown count strategy '{name}'. Choose from {', '.join(COUNT_STRATEGIES)}.")
@@ -0,0 +1,22 @@
+"""Opaque keyset page tokens shared by the paginated ledgers.
+
+A token is the page edge's sort key as a JSON list, base64url-encoded
+without padding. decode_key checks the list's length and element types,
+so a tampered token raises ValueError rather than failing later.
+"""
+import base64
+import json
+
+
+def encode_key(key):
+    """Page token for a sort key given as a list of JSON values."""
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_key(token, types):
+    """The list encoded in token; each element must be exactly the matching type in types."""
+    padded = token + "=" * (-len(token) % 4)
+    key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not (isinstance(key, list) and [type(k) for k in key] == list(types)):
+        raise ValueError("Malformed cursor")
+    return key
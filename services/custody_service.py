@@ -1,12 +1,231 @@
-import psycopg2
+from datetime import date
+
 from psycopg2 import extras
-from db import PG_PARAMS
-
-def get_custody_by_user_id(user_id):
-    conn = psycopg2.connect(**PG_PARAMS)
-    cur = conn.cursor(cursor_factory=extras.RealDictCursor)
-    cur.execute("SELECT * FROM custody WHERE user_id = %s ORDER BY date", (user_id,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
\ No newline at end of file
+from db import get_connection
+from services.cursors import decode_key, encode_key
+
+# custody_monthly holds each user's incoming/outgoing per month, kept by
+# triggers on custody. A ledger page's opening balance is then the months
+# before it plus the rows earlier in its own month, however long the
+# history is.
+CUSTODY_LEDGER_SQL = """
+CREATE TABLE IF NOT EXISTS custody_monthly (
+    user_id INT NOT NULL,
+    month DATE NOT NULL,
+    incoming NUMERIC NOT NULL DEFAULT 0,
+    outgoing NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month)
+);
+
+DO $$ BEGIN
+    CREATE TYPE custody_delta AS (user_id int, month date, incoming numeric, outgoing numeric);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- Rows are upserted in key order so concurrent writers can't deadlock.
+CREATE OR REPLACE FUNCTION post_custody_deltas(deltas custody_delta[]) RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO custody_monthly AS c (user_id, month, incoming, outgoing)
+    SELECT user_id, month, SUM(incoming), SUM(outgoing)
+    FROM unnest(deltas)
+    WHERE user_id IS NOT NULL AND month IS NOT NULL
+    GROUP BY user_id, month
+    ORDER BY user_id, month
+    ON CONFLICT (user_id, month) DO UPDATE
+        SET incoming = c.incoming + EXCLUDED.incoming, outgoing = c.outgoing + EXCLUDED.outgoing;
+$$;
+
+CREATE OR REPLACE FUNCTION custody_monthly_deltas() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM post_custody_deltas(ARRAY(
+            SELECT ROW(user_id, date_trunc('month', date)::date,
+                       COALESCE(incoming, 0), COALESCE(outgoing, 0))::custody_delta
+            FROM new_rows
+        ));
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM post_custody_deltas(ARRAY(
+            SELECT ROW(user_id, date_trunc('month', date)::date,
+                       -COALESCE(incoming, 0), -COALESCE(outgoing, 0))::custody_delta
+            FROM old_rows
+        ));
+    END IF;
+    RETURN NULL;
+END $$;
+"""
+
+REBUILD_CUSTODY_LEDGER_SQL = """
+TRUNCATE custody_monthly;
+INSERT INTO custody_monthly (user_id, month, incoming, outgoing)
+SELECT user_id, date_trunc('month', date)::date, SUM(COALESCE(incoming, 0)), SUM(COALESCE(outgoing, 0))
+FROM custody
+WHERE user_id IS NOT NULL AND date IS NOT NULL
+GROUP BY 1, 2;
+"""
+
+# One page of a user's custody rows with the balance after each one. The
+# page is picked by the keyset conditions, then put back in date order and
+# the running balance is the opening balance plus a window sum over it.
+LEDGER_PAGE_SQL = """
+WITH page AS (
+    SELECT custody_id, date, description,
+           COALESCE(incoming, 0) AS incoming, COALESCE(outgoing, 0) AS outgoing
+    FROM custody
+    WHERE {conditions}
+    ORDER BY date {order}, custody_id {order}
+    LIMIT %(limit)s
+),
+first AS (
+    SELECT date, custody_id FROM page ORDER BY date, custody_id LIMIT 1
+),
+opening AS (
+    SELECT (SELECT COALESCE(SUM(incoming - outgoing), 0) FROM custody_monthly
+            WHERE user_id = %(user_id)s AND month < date_trunc('month', first.date))
+         + (SELECT COALESCE(SUM(COALESCE(c.incoming, 0) - COALESCE(c.outgoing, 0)), 0) FROM custody c
+            WHERE c.user_id = %(user_id)s AND c.date >= date_trunc('month', first.date)
+              AND (c.date, c.custody_id) < (first.date, first.custody_id)) AS amount
+    FROM first
+)
+SELECT page.custody_id, page.date, page.description, page.incoming, page.outgoing,
+       opening.amount + SUM(page.incoming - page.outgoing)
+           OVER (ORDER BY page.date, page.custody_id) AS balance
+FROM page CROSS JOIN opening
+ORDER BY page.date, page.custody_id
+"""
+
+def ensure_custody_ledger(cur):
+    """Install the monthly custody summary and the triggers that keep it."""
+    cur.execute(CUSTODY_LEDGER_SQL)
+    for event, referencing in (
+        ("INSERT", "NEW TABLE AS new_rows"),
+        ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("DELETE", "OLD TABLE AS old_rows"),
+    ):
+        name = f"custody_monthly_{event.lower()}"
+        cur.execute(f"""
+            DROP TRIGGER IF EXISTS {name} ON custody;
+            CREATE TRIGGER {name} AFTER {event} ON custody
+                REFERENCING {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION custody_monthly_deltas();
+        """)
+
+def rebuild_custody_ledger(cur):
+    """Recompute custody_monthly from custody (after a bulk load or TRUNCATE)."""
+    cur.execute("LOCK TABLE custody IN SHARE MODE")
+    cur.execute(REBUILD_CUSTODY_LEDGER_SQL)
+
+def encode_ledger_cursor(row):
+    return encode_key([row["date"].isoformat(), row["custody_id"]])
+
+def decode_ledger_cursor(token):
+    row_date, custody_id = decode_key(token, (str, int))
+    return date.fromisoformat(row_date), custody_id
+
+def _balance_before(cur, user_id, row_date):
+    """Balance from every row dated before row_date."""
+    cur.execute("""
+        SELECT
+            (SELECT COALESCE(SUM(incoming - outgoing), 0) FROM custody_monthly
+             WHERE user_id = %(user_id)s AND month < date_trunc('month', %(date)s::date))
+          + (SELECT COALESCE(SUM(COALESCE(incoming, 0) - COALESCE(outgoing, 0)), 0) FROM custody
+             WHERE user_id = %(user_id)s AND date >= date_trunc('month', %(date)s::date) AND date < %(date)s)
+            AS opening
+    """, {"user_id": user_id, "date": row_date})
+    return cur.fetchone()["opening"]
+
+def get_custody_ledger(user_id, start=None, end=None, after=None, before=None, limit=50):
+    """One page of a user's custody rows, oldest first, with the balance after each row.
+
+    start/end (dates) narrow the ledger; after/before are cursors from a
+    previous page's next_after/prev_before. Rows without a date are left
+    out. A malformed cursor raises ValueError for the caller to handle.
+    """
+    conditions = ["user_id = %(user_id)s", "date IS NOT NULL"]
+    params = {"user_id": user_id, "limit": limit + 1}
+    if start:
+        conditions.append("date >= %(start)s")
+        params["start"] = start
+    if end:
+        conditions.append("date <= %(end)s")
+        params["end"] = end
+    backwards = before is not None
+    cursor = decode_ledger_cursor(before if backwards else after) if (before or after) else None
+    if cursor:
+        conditions.append("(date, custody_id) " + ("<" if backwards else ">") + " (%(c_date)s, %(c_id)s)")
+        params.update(c_date=cursor[0], c_id=cursor[1])
+
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+        cur.execute(LEDGER_PAGE_SQL.format(conditions=" AND ".join(conditions),
+                                           order="DESC" if backwards else "ASC"), params)
+        rows = cur.fetchall()
+        has_more = len(rows) > limit
+        if has_more:
+            # The extra row is the oldest when paging back, the newest otherwise.
+            rows = rows[1:] if backwards else rows[:limit]
+        if rows:
+            opening = rows[0]["balance"] - rows[0]["incoming"] + rows[0]["outgoing"]
+        elif start:
+            opening = _balance_before(cur, user_id, start)
+        else:
+            opening = 0
+        cur.close()
+
+    if backwards:
+        older, newer = has_more, bool(rows)
+    else:
+        older, newer = cursor is not None and bool(rows), has_more
+    return {
+        "rows": rows,
+        "opening_balance": opening,
+        "closing_balance": rows[-1]["balance"] if rows else opening,
+        "page_totals": {
+            "incoming": sum(r["incoming"] for r in rows),
+            "outgoing": sum(r["outgoing"] for r in rows),
+        },
+        "next_after": encode_ledger_cursor(rows[-1]) if newer else None,
+        "prev_before": encode_ledger_cursor(rows[0]) if older else None,
+    }
+
+def get_custody_summaries(exclude_roles=None):
+    """Every user (minus exclude_roles) with their custody balance, last movement and 30-day volume.
+
+    One query: the balance comes from custody_monthly, the last movement
+    and the 30-day totals from index range scans on custody per user.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+        cur.execute("""
+            SELECT u.user_id, u.username, u.role,
+                   COALESCE(t.incoming - t.outgoing, 0) AS balance,
+                   last.date AS last_movement,
+                   recent.movements AS movements_30d,
+                   recent.incoming AS incoming_30d,
+                   recent.outgoing AS outgoing_30d
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id, SUM(incoming) AS incoming, SUM(outgoing) AS outgoing
+                FROM custody_monthly
+                GROUP BY user_id
+            ) t ON t.user_id = u.user_id
+            LEFT JOIN LATERAL (
+                SELECT c.date FROM custody c
+                WHERE c.user_id = u.user_id AND c.date IS NOT NULL
+                ORDER BY c.date DESC
+                LIMIT 1
+            ) last ON true
+            CROSS JOIN LATERAL (
+                SELECT COUNT(*) AS movements,
+                       COALESCE(SUM(c.incoming), 0) AS incoming,
+                       COALESCE(SUM(c.outgoing), 0) AS outgoing
+                FROM custody c
+                WHERE c.user_id = u.user_id AND c.date > CURRENT_DATE - 30
+            ) recent
+            WHERE NOT (u.role = ANY(%s))
+            ORDER BY u.username
+        """, (list(exclude_roles or []),))
+        users = cur.fetchall()
+        cur.close()
+    return users
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.table_versions import VERSIONED_TABLES, get_table_version, get_tables_version
+
+DIM_CACHE_SIZE = int(os.getenv("DIM_CACHE_SIZE", 2000))
+# Entries are checked against the table's version; the TTL only bounds their age.
+DIM_CACHE_TTL = float(os.getenv("DIM_CACHE_TTL", 300))
+
+# Tables whose name -> id mapping is cached, with their (id column, name column).
+CACHED_DIMENSIONS = {
+    "dim_date": ("date_id", "full_date"),
+    "suppliers": ("supplier_id", "supplier_name"),
+    "factories": ("factory_id", "factory_name"),
+    "zones": ("zone_id", "zone_name"),
+    "representatives": ("representative_id", "representative_name"),
+    "truck_owners": ("owner_id", "owner_name"),
+    "bank_name": ("bank_id", "bank_name"),
+}
+
+
+class LRUCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None):
+        """The value stored for key under version; expired or other-version entries miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] != version or entry[2] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            self._data[key] = (value, version, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class DimensionCache:
+    """Per-process name -> id cache, one LRU per dimension table.
+
+    Each id is stored with the table's table_versions version read before
+    the lookup, and a reader passing a different version misses. A rename
+    or delete through any worker bumps the version, so no worker keeps
+    resolving the old name. dim_date has no version row; dates are never
+    renamed, so its entries are stored and read with version None.
+
+    Only ids read back from the database are stored; ids created inside a
+    still-open transaction are left out so a rollback can't leave a dangling
+    id behind.
+    """
+
+    def __init__(self, maxsize=DIM_CACHE_SIZE, ttl=DIM_CACHE_TTL):
+        self._caches = {table: LRUCache(maxsize, ttl) for table in CACHED_DIMENSIONS}
+
+    def get(self, table, name, version=None):
+        cache = self._caches.get(table)
+        return cache.get(str(name), version) if cache and name else None
+
+    def put(self, table, name, value, version=None):
+        cache = self._caches.get(table)
+        if cache and name:
+            cache.put(str(name), value, version)
+
+    def clear(self):
+        for cache in self._caches.values():
+            cache.clear()
+
+    def warm(self, cur):
+        """Preload up to maxsize entries per table, newest ids first.
+
+        Rows are stored newest to oldest so that for duplicated names (truck
+        owners) the lowest id wins, matching get_ids_by_names.
+        """
+        tables = [table for table in CACHED_DIMENSIONS if table in VERSIONED_TABLES]
+        versions = dict(zip(tables, get_tables_version(cur, tables)[0]))
+        for table, (id_col, name_col) in CACHED_DIMENSIONS.items():
+            cache = self._caches[table]
+            cur.execute(
+                f"SELECT {name_col}, {id_col} FROM {table} ORDER BY {id_col} DESC LIMIT %s",
+                (cache.maxsize,)
+            )
+            for name, value in cur.fetchall():
+                cache.put(str(name), value, versions.get(table))
+
+    def stats(self):
+        return {table: cache.stats() for table, cache in self._caches.items()}
+
+
+def dimension_version(cur, table):
+    """Version to read and store table's cached ids under; None for dim_date."""
+    return get_table_version(cur, table)[0] if table in VERSIONED_TABLES else None
+
+
+dimension_cache = DimensionCache()
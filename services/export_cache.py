@@ -0,0 +1,120 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "exports")
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+
+class ExportCache:
+    """Size-bounded cache of rendered export files, keyed by content.
+
+    Keys are derived from the export parameters plus a fingerprint of the
+    underlying rows, so a changed range simply misses. Files live in
+    EXPORT_CACHE_DIR, which is shared by all workers; a file's mtime is its
+    last use and the oldest files are evicted once the directory exceeds
+    max_bytes.
+    """
+
+    def __init__(self, directory=EXPORT_CACHE_DIR, max_bytes=EXPORT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:40]
+
+    def path_for(self, key, extension):
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def lookup(self, key, extension):
+        """Return the cached file path, or None on a miss."""
+        path = self.path_for(key, extension)
+        try:
+            size = os.path.getsize(path)
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += size
+        return path
+
+    def open_writer(self, extension):
+        """Open a temp file inside the cache dir; pass it to commit() or discard()."""
+        os.makedirs(self.directory, exist_ok=True)
+        return tempfile.NamedTemporaryFile(
+            dir=self.directory, prefix=".tmp-", suffix=f".{extension}", delete=False
+        )
+
+    def commit(self, fileobj, key, extension):
+        fileobj.flush()
+        fileobj.close()
+        path = self.path_for(key, extension)
+        os.replace(fileobj.name, path)
+        self.evict()
+        return path
+
+    def discard(self, fileobj):
+        fileobj.close()
+        try:
+            os.remove(fileobj.name)
+        except OSError:
+            pass
+
+    def _entries(self):
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if name.startswith(".tmp-"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                # Open readers keep their file descriptor, so this is safe mid-download.
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "files": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "evictions": self.evictions,
+        }
+
+
+export_cache = ExportCache()
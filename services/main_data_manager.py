@@ -1,167 +1,469 @@
-import psycopg2
-from datetime import datetime
-from db import PG_PARAMS
+from datetime import date
+from psycopg2 import extras
+from db import get_connection
+from services.dimension_cache import dimension_cache, dimension_version
+from services.table_versions import get_main_changes, get_table_version, get_tables_version, main_changes_cover
 
 def get_or_create_date_id(cur, full_date):
-    cur.execute("SELECT date_id FROM dim_date WHERE full_date = %s", (full_date,))
+    return get_or_create_date_ids(cur, [full_date])[full_date]
+
+def find_id_by_name(cur, table, id_col, name_col, name):
+    """Id of an existing row named `name`, or None; never inserts."""
+    version = dimension_version(cur, table)
+    cached = dimension_cache.get(table, name, version)
+    if cached is not None:
+        return cached
+    cur.execute(f"SELECT MIN({id_col}) FROM {table} WHERE {name_col} = %s", (name,))
     row = cur.fetchone()
-    if row:
+    if row[0] is not None:
+        dimension_cache.put(table, name, row[0], version)
         return row[0]
-    cur.execute("""
-        INSERT INTO dim_date (full_date, year, month, day, day_name)
-        VALUES (
-            %s,
-            EXTRACT(YEAR FROM %s::date),
-            EXTRACT(MONTH FROM %s::date),
-            EXTRACT(DAY FROM %s::date),
-            TO_CHAR(%s::date, 'Day')
-        )
-        RETURNING date_id
-    """, (full_date, full_date, full_date, full_date, full_date))
-    return cur.fetchone()[0]
+    return None
 
 def get_id_by_name(cur, table, id_col, name_col, name):
-    cur.execute(f"SELECT {id_col} FROM {table} WHERE {name_col} = %s", (name,))
-    row = cur.fetchone()
-    if row:
-        return row[0]
-    cur.execute(f"INSERT INTO {table} ({name_col}) VALUES (%s) RETURNING {id_col}", (name,))
-    return cur.fetchone()[0]
+    found = find_id_by_name(cur, table, id_col, name_col, name)
+    if found is not None:
+        return found
+    return _insert_names(cur, table, id_col, name_col, [name])[name]
+
+# Dimension tables with a UNIQUE name (migration 0005); truck owner names repeat.
+UNIQUE_NAME_TABLES = {"suppliers", "factories", "zones", "representatives", "bank_name"}
+
+def _insert_names(cur, table, id_col, name_col, names):
+    """Insert names not found by an earlier lookup; returns {name: id} for all of them.
+
+    Another transaction may add the same names in between. With a unique
+    name ON CONFLICT skips those, and they are read back once it has
+    committed. truck_owners has nothing to conflict on, so its writers take
+    a transaction lock and look again before inserting.
+    """
+    ids = {}
+    if table in UNIQUE_NAME_TABLES:
+        rows = extras.execute_values(
+            cur,
+            f"INSERT INTO {table} ({name_col}) VALUES %s ON CONFLICT ({name_col}) DO NOTHING "
+            f"RETURNING {name_col}, {id_col}",
+            [(n,) for n in names], page_size=len(names), fetch=True
+        )
+        ids.update(dict(rows))
+    else:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table,))
+    rest = [n for n in names if n not in ids]
+    if rest:
+        cur.execute(
+            f"SELECT {name_col}, MIN({id_col}) FROM {table} WHERE {name_col} = ANY(%s) GROUP BY {name_col}",
+            (rest,)
+        )
+        ids.update(dict(cur.fetchall()))
+    missing = [n for n in names if n not in ids]
+    if missing:
+        rows = extras.execute_values(
+            cur,
+            f"INSERT INTO {table} ({name_col}) VALUES %s RETURNING {name_col}, {id_col}",
+            [(n,) for n in missing], page_size=len(missing), fetch=True
+        )
+        ids.update(dict(rows))
+    return ids
+
+# record key -> (table, id column, name column) for the dimensions a naqla row references
+NAQLA_DIMENSIONS = {
+    "supplier": ("suppliers", "supplier_id", "supplier_name"),
+    "factory": ("factories", "factory_id", "factory_name"),
+    "zone": ("zones", "zone_id", "zone_name"),
+    "representative": ("representatives", "representative_id", "representative_name"),
+    "truck_owner": ("truck_owners", "owner_id", "owner_name"),
+}
+
+def _cached_ids(table, names, version):
+    ids = {}
+    for name in names:
+        value = dimension_cache.get(table, name, version)
+        if value is not None:
+            ids[name] = value
+    return ids
+
+def get_or_create_date_ids(cur, full_dates):
+    """Resolve many dates at once: one lookup, then one insert for the missing ones."""
+    full_dates = sorted({d for d in full_dates if d})
+    ids = _cached_ids("dim_date", full_dates, None)
+    unknown = [d for d in full_dates if d not in ids]
+    if not unknown:
+        return ids
+    cur.execute("SELECT full_date, date_id FROM dim_date WHERE full_date IN %s", (tuple(unknown),))
+    for full_date, date_id in cur.fetchall():
+        ids[str(full_date)] = date_id
+        dimension_cache.put("dim_date", full_date, date_id)
+    missing = [d for d in unknown if d not in ids]
+    if missing:
+        # A concurrent save may add the same dates: skip those and read them back.
+        rows = extras.execute_values(cur, """
+            INSERT INTO dim_date (full_date, year, month, day, day_name)
+            VALUES %s
+            ON CONFLICT (full_date) DO NOTHING
+            RETURNING full_date, date_id
+        """, [(d, d, d, d, d) for d in missing],
+            template="(%s, EXTRACT(YEAR FROM %s::date), EXTRACT(MONTH FROM %s::date), "
+                     "EXTRACT(DAY FROM %s::date), TO_CHAR(%s::date, 'Day'))",
+            page_size=len(missing), fetch=True)
+        ids.update({str(r[0]): r[1] for r in rows})
+        raced = [d for d in missing if d not in ids]
+        if raced:
+            cur.execute("SELECT full_date, date_id FROM dim_date WHERE full_date = ANY(%s)", (raced,))
+            ids.update({str(r[0]): r[1] for r in cur.fetchall()})
+    return ids
+
+def get_ids_by_names(cur, table, id_col, name_col, names, version=None):
+    """Bulk version of get_id_by_name: returns {name: id}, creating missing names.
+
+    version is the table's table_versions version, read before the lookup;
+    it is read here when the caller hasn't.
+    """
+    names = sorted({n for n in names if n})
+    if not names:
+        return {}
+    if version is None:
+        version = dimension_version(cur, table)
+    ids = _cached_ids(table, names, version)
+    unknown = [n for n in names if n not in ids]
+    if not unknown:
+        return ids
+    cur.execute(
+        f"SELECT {name_col}, MIN({id_col}) FROM {table} WHERE {name_col} IN %s GROUP BY {name_col}",
+        (tuple(unknown),)
+    )
+    for name, value in cur.fetchall():
+        ids[name] = value
+        dimension_cache.put(table, name, value, version)
+    missing = [n for n in unknown if n not in ids]
+    if missing:
+        ids.update(_insert_names(cur, table, id_col, name_col, missing))
+    return ids
+
+# Dimensions every naqla row must name: the month grid and its deltas INNER
+# JOIN them, so a row saved without one would never show up to be fixed.
+REQUIRED_DIMENSIONS = ("supplier", "factory", "zone", "representative")
+
+def missing_fields(record):
+    """Error for a record lacking a field it can't be saved without, or None."""
+    if not record.get("date") or not record.get("truck_num"):
+        return 'date and truck_num are required'
+    missing = [key for key in REQUIRED_DIMENSIONS if not str(record.get(key) or "").strip()]
+    if missing:
+        return f"{', '.join(missing)} {'is' if len(missing) == 1 else 'are'} required"
+    return None
+
+def resolve_naqla_dimensions(cur, records):
+    """Resolve every dimension referenced by records with one query per dimension.
+
+    Returns {"date": {full_date: date_id}, "supplier": {name: id}, ...}.
+    """
+    resolved = {"date": get_or_create_date_ids(cur, (r.get("date") for r in records))}
+    tables = [table for table, _, _ in NAQLA_DIMENSIONS.values()]
+    versions = dict(zip(tables, get_tables_version(cur, tables)[0]))
+    for key, (table, id_col, name_col) in NAQLA_DIMENSIONS.items():
+        resolved[key] = get_ids_by_names(cur, table, id_col, name_col, (r.get(key) for r in records),
+                                         versions[table])
+    return resolved
+
+def unowned_new_trucks(cur, records):
+    """Truck numbers in records that are not in trucks yet and come without an owner.
+
+    Such rows can't be saved: naqla rows are listed through trucks ->
+    truck_owners, so one on an ownerless truck would drop out of the month
+    grid and the statements.
+    """
+    has_owner = {}
+    for r in records:
+        if r.get("truck_num"):
+            has_owner[r["truck_num"]] = has_owner.get(r["truck_num"], False) or bool(r.get("truck_owner"))
+    unowned = [num for num, owned in has_owner.items() if not owned]
+    if not unowned:
+        return set()
+    cur.execute("SELECT truck_num FROM trucks WHERE truck_num = ANY(%s)", (unowned,))
+    return set(unowned) - {r[0] for r in cur.fetchall()}
+
+def ensure_trucks(cur, records, owner_ids):
+    """Create trucks that do not exist yet, owned by the row's truck owner."""
+    owners = {}
+    for r in records:
+        owner_id = owner_ids.get(r.get("truck_owner"))
+        if r.get("truck_num") and owner_id is not None:
+            owners.setdefault(r["truck_num"], owner_id)
+    if not owners:
+        return
+    # Existing trucks, including ones a concurrent save just added, keep their owner.
+    extras.execute_values(cur, """
+        INSERT INTO trucks (truck_num, owner_id) VALUES %s
+        ON CONFLICT (truck_num) DO NOTHING
+    """, sorted(owners.items()), page_size=len(owners))
 
 def save_data_entry(records):
+    """Insert many naqla rows in a single transaction.
+
+    Dimensions are resolved once for the whole batch and all rows go to
+    main in one multi-row INSERT. Returns {'success', 'inserted', 'rows'}
+    where rows holds one result per input record, in input order.
+    """
+    results = []
+    valid = []
+    for index, record in enumerate(records):
+        # Check for required fields for each record
+        error = missing_fields(record)
+        if error:
+            results.append({'index': index, 'status': 'skipped', 'error': error})
+        else:
+            results.append({'index': index, 'status': 'pending'})
+            valid.append((index, record))
+
+    if not valid:
+        return {'success': True, 'inserted': 0, 'rows': results}
+
     try:
-        conn = psycopg2.connect(**PG_PARAMS)
-        cur = conn.cursor()
+        with get_connection() as conn:
+            cur = conn.cursor()
+            unowned = unowned_new_trucks(cur, (record for _, record in valid))
+            for index, record in valid:
+                if record["truck_num"] in unowned:
+                    results[index] = {'index': index, 'status': 'skipped', 'error': 'a new truck needs an owner'}
+            valid = [(index, record) for index, record in valid if record["truck_num"] not in unowned]
+            if not valid:
+                return {'success': True, 'inserted': 0, 'rows': results}
 
-        for record in records:
-            # Check for required fields for each record
-            if not record["date"] or not record["truck_num"]:
-                continue
-
-            date_id = get_or_create_date_id(cur, record["date"])
-            supplier_id = get_id_by_name(cur, "suppliers", "supplier_id", "supplier_name", record["supplier"])
-            factory_id = get_id_by_name(cur, "factories", "factory_id", "factory_name", record["factory"])
-            zone_id = get_id_by_name(cur, "zones", "zone_id", "zone_name", record["zone"])
-            representative_id = get_id_by_name(cur, "representatives", "representative_id", "representative_name", record["representative"])
-            owner_id = get_id_by_name(cur, "truck_owners", "owner_id", "owner_name", record["truck_owner"]) if record["truck_owner"] else None
-
-            cur.execute("SELECT truck_num FROM trucks WHERE truck_num = %s", (record["truck_num"],))
-            if not cur.fetchone():
-                cur.execute("INSERT INTO trucks (truck_num, owner_id) VALUES (%s, %s)", (record["truck_num"], owner_id))
-            print("Record to insert:", record)
-            cur.execute("""
+            batch = [record for _, record in valid]
+            ids = resolve_naqla_dimensions(cur, batch)
+            ensure_trucks(cur, batch, ids["truck_owner"])
+
+            values = [(
+                ids["date"][record["date"]], record["truck_num"],
+                ids["supplier"][record["supplier"]],
+                ids["factory"][record["factory"]],
+                ids["zone"][record["zone"]],
+                record.get("weight") or None, record.get("ohda") or None,
+                record.get("factory_price") or None, record.get("sell_price") or None,
+                ids["representative"][record["representative"]]
+            ) for record in batch]
+            inserted = extras.execute_values(cur, """
                 INSERT INTO main (date_id, truck_num, supplier_id, factory_id, zone_id, weight, ohda, factory_price, sell_price, representative_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                date_id, record["truck_num"], supplier_id, factory_id, zone_id,
-                record["weight"] or None, record["ohda"] or None,
-                record["factory_price"] or None, record["sell_price"] or None,
-                representative_id
-            ))
-
-        conn.commit()
-        cur.close()
-        conn.close()
-        return True
+                VALUES %s
+                RETURNING naqla_id
+            """, values, page_size=len(values), fetch=True)
+
+            conn.commit()
+            cur.close()
+
+        for (index, _), row in zip(valid, inserted):
+            results[index] = {'index': index, 'status': 'inserted', 'naqla_id': row[0]}
+        return {'success': True, 'inserted': len(inserted), 'rows': results}
 
     except Exception as e:
         print(f"Error saving data: {e}")
-        if conn:
-            conn.rollback()
-        return False
+        for index, _ in valid:
+            results[index] = {'index': index, 'status': 'failed', 'error': str(e)}
+        return {'success': False, 'error': str(e), 'inserted': 0, 'rows': results}
 
-def get_current_month_records():
-    try:
-        conn = psycopg2.connect(**PG_PARAMS)
-        cur = conn.cursor()
+NAQLA_RECORD_COLUMNS = """
+    m.naqla_id,
+    d.full_date::date AS full_date,
+    m.truck_num,
+    t_o.owner_name AS truck_owner,
+    s.supplier_name,
+    f.factory_name,
+    z.zone_name,
+    m.weight,
+    m.ohda,
+    m.factory_price,
+    m.sell_price,
+    r.representative_name
+"""
 
-        cur.execute("""
-            SELECT 
-                m.naqla_id,
-                d.full_date,
-                m.truck_num,
-                t_o.owner_name AS truck_owner,
-                s.supplier_name,
-                f.factory_name,
-                z.zone_name,
-                m.weight,
-                m.ohda,
-                m.factory_price,
-                m.sell_price,
-                r.representative_name
-            FROM main m
-            JOIN dim_date d ON m.date_id = d.date_id
-            JOIN trucks t ON m.truck_num = t.truck_num
-            JOIN truck_owners t_o ON t.owner_id = t_o.owner_id
-            JOIN suppliers s ON m.supplier_id = s.supplier_id
-            JOIN factories f ON m.factory_id = f.factory_id
-            JOIN zones z ON m.zone_id = z.zone_id
-            JOIN representatives r ON m.representative_id = r.representative_id
-            WHERE d.month = EXTRACT(MONTH FROM CURRENT_DATE)
-              AND d.year = EXTRACT(YEAR FROM CURRENT_DATE)
-            ORDER BY d.full_date DESC
-        """)
-
-        records = cur.fetchall()
-        records = [(r[0], datetime.strptime(r[1], "%Y-%m-%d"), *r[2:]) for r in records]
-        cur.close()
-        conn.close()
+def month_bounds(year=None, month=None):
+    """First day of the month and first day of the next one, as dates."""
+    today = date.today()
+    first = date(today.year if year is None else year, today.month if month is None else month, 1)
+    following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    return first, following
+
+def _query_records_between(cur, start, end, naqla_ids=None):
+    params = [start.isoformat(), end.isoformat()]
+    only = ""
+    if naqla_ids is not None:
+        only = "AND m.naqla_id = ANY(%s)"
+        params.append(list(naqla_ids))
+    cur.execute(f"""
+        SELECT {NAQLA_RECORD_COLUMNS}
+        FROM main m
+        JOIN dim_date d ON m.date_id = d.date_id
+        JOIN trucks t ON m.truck_num = t.truck_num
+        JOIN truck_owners t_o ON t.owner_id = t_o.owner_id
+        JOIN suppliers s ON m.supplier_id = s.supplier_id
+        JOIN factories f ON m.factory_id = f.factory_id
+        JOIN zones z ON m.zone_id = z.zone_id
+        JOIN representatives r ON m.representative_id = r.representative_id
+        WHERE m.date_id IN (
+            SELECT date_id FROM dim_date
+            WHERE full_date >= %s AND full_date < %s
+        )
+        {only}
+        ORDER BY d.full_date DESC, m.naqla_id DESC
+    """, params)
+    return cur.fetchall()
+
+def get_records_between(start, end):
+    """Naqla rows dated in [start, end), newest first, with full_date as a date.
+
+    The window is resolved against dim_date's full_date and the matching
+    date_ids drive the lookup on main.date_id, so neither side wraps an
+    indexed column in a function.
+    """
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            records = _query_records_between(cur, start, end)
+            cur.close()
         return records
 
     except Exception as e:
         print("خطأ في جلب البيانات:", e)
         return []
 
-def update_naqla_record(naqla_id, data):
-    try:
-        conn = psycopg2.connect(**PG_PARAMS)
+def get_main_version():
+    with get_connection() as conn:
         cur = conn.cursor()
-        
-        date_id = get_or_create_date_id(cur, data['date'])
-        supplier_id = get_id_by_name(cur, 'suppliers', 'supplier_id', 'supplier_name', data['supplier'])
-        factory_id = get_id_by_name(cur, 'factories', 'factory_id', 'factory_name', data['factory'])
-        zone_id = get_id_by_name(cur, 'zones', 'zone_id', 'zone_name', data['zone'])
-        representative_id = get_id_by_name(cur, 'representatives', 'representative_id', 'representative_name', data['representative'])
-        
-        cur.execute("""
-            UPDATE main
-            SET date_id=%s, truck_num=%s, supplier_id=%s, factory_id=%s, zone_id=%s,
-                weight=%s, ohda=%s, factory_price=%s, sell_price=%s, representative_id=%s
-            WHERE naqla_id = %s
-        """, (
-            date_id,
-            data['truck_num'],
-            supplier_id,
-            factory_id,
-            zone_id,
-            data['weight'],
-            data['ohda'],
-            data['factory_price'],
-            data['sell_price'],
-            representative_id,
-            naqla_id
-        ))
-        conn.commit()
+        version = get_table_version(cur, "main")[0]
         cur.close()
-        conn.close()
-        return {'success': True}
+    return version
+
+def get_records_delta(start, end, since=None):
+    """What changed in the [start, end) grid since version `since`.
+
+    Returns {'version', 'reset', 'inserted', 'updated', 'deleted'}. With no
+    since, or one older than the change log still covers (or 0), every row
+    comes back in 'inserted' and reset is True. A row that was deleted or
+    moved out of the window is listed in 'deleted' by id. Rows may be
+    repeated in a later delta; applying them twice is harmless.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        version = get_table_version(cur, "main")[0]
+        if since is None or not main_changes_cover(since, version):
+            delta = {'version': version, 'reset': True, 'inserted': _query_records_between(cur, start, end),
+                     'updated': [], 'deleted': []}
+        else:
+            changes = get_main_changes(cur, since, version)
+            rows = _query_records_between(cur, start, end, changes) if changes else []
+            present = {row[0] for row in rows}
+            delta = {
+                'version': version,
+                'reset': False,
+                'inserted': [row for row in rows if changes[row[0]] == 'I'],
+                'updated': [row for row in rows if changes[row[0]] != 'I'],
+                'deleted': sorted(naqla_id for naqla_id in changes if naqla_id not in present),
+            }
+        cur.close()
+    return delta
+
+def update_data_entry(rows):
+    """Apply many edited naqla rows in a single transaction.
+
+    Each row is a record dict plus its 'naqla_id'. Dimensions are resolved
+    once for the whole batch and every row is written by one UPDATE ... FROM
+    (VALUES ...). Returns {'success', 'updated', 'rows'} with one result per
+    input row, in input order: updated, skipped, not_found or failed.
+    """
+    results = []
+    valid = {}
+    for index, row in enumerate(rows):
+        try:
+            naqla_id = int(row.get("naqla_id") or row.get("id"))
+        except (TypeError, ValueError):
+            results.append({'index': index, 'status': 'skipped', 'error': 'naqla_id is required'})
+            continue
+        error = missing_fields(row)
+        if error:
+            results.append({'index': index, 'naqla_id': naqla_id, 'status': 'skipped', 'error': error})
+            continue
+        if naqla_id in valid:
+            # The last edit of a row wins; an UPDATE can't apply two.
+            earlier = valid[naqla_id][0]
+            results[earlier] = {'index': earlier, 'naqla_id': naqla_id, 'status': 'skipped', 'error': 'superseded by a later edit'}
+        results.append({'index': index, 'naqla_id': naqla_id, 'status': 'pending'})
+        valid[naqla_id] = (index, row)
+
+    if not valid:
+        return {'success': True, 'updated': 0, 'rows': results}
+
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            unowned = unowned_new_trucks(cur, (row for _, row in valid.values()))
+            for naqla_id, (index, row) in list(valid.items()):
+                if row["truck_num"] in unowned:
+                    results[index] = {'index': index, 'naqla_id': naqla_id, 'status': 'skipped', 'error': 'a new truck needs an owner'}
+                    del valid[naqla_id]
+            if not valid:
+                return {'success': True, 'updated': 0, 'rows': results}
+
+            batch = [row for _, row in valid.values()]
+            ids = resolve_naqla_dimensions(cur, batch)
+            ensure_trucks(cur, batch, ids["truck_owner"])
+
+            values = [(
+                naqla_id, ids["date"][row["date"]], row["truck_num"],
+                ids["supplier"][row["supplier"]],
+                ids["factory"][row["factory"]],
+                ids["zone"][row["zone"]],
+                row.get("weight") or None, row.get("ohda") or None,
+                row.get("factory_price") or None, row.get("sell_price") or None,
+                ids["representative"][row["representative"]]
+            ) for naqla_id, (_, row) in valid.items()]
+            updated = extras.execute_values(cur, """
+                UPDATE main m
+                SET date_id = v.date_id, truck_num = v.truck_num, supplier_id = v.supplier_id,
+                    factory_id = v.factory_id, zone_id = v.zone_id, weight = v.weight, ohda = v.ohda,
+                    factory_price = v.factory_price, sell_price = v.sell_price,
+                    representative_id = v.representative_id
+                FROM (VALUES %s) AS v (naqla_id, date_id, truck_num, supplier_id, factory_id, zone_id,
+                                       weight, ohda, factory_price, sell_price, representative_id)
+                WHERE m.naqla_id = v.naqla_id
+                RETURNING m.naqla_id
+            """, values,
+                template="(%s::int, %s::int, %s, %s::int, %s::int, %s::int, "
+                         "%s::numeric, %s::numeric, %s::numeric, %s::numeric, %s::int)",
+                page_size=len(values), fetch=True)
+
+            conn.commit()
+            cur.close()
+
+        updated = {row[0] for row in updated}
+        for naqla_id, (index, _) in valid.items():
+            if naqla_id in updated:
+                results[index] = {'index': index, 'naqla_id': naqla_id, 'status': 'updated'}
+            else:
+                results[index] = {'index': index, 'naqla_id': naqla_id, 'status': 'not_found', 'error': 'no such record'}
+        return {'success': True, 'updated': len(updated), 'rows': results}
+
     except Exception as e:
-        print(f"Error updating record: {e}")
-        conn.rollback()
-        return {'success': False, 'error': str(e)}
+        print(f"Error updating records: {e}")
+        for naqla_id, (index, _) in valid.items():
+            results[index] = {'index': index, 'naqla_id': naqla_id, 'status': 'failed', 'error': str(e)}
+        return {'success': False, 'error': str(e), 'updated': 0, 'rows': results}
+
+def update_naqla_record(naqla_id, data):
+    result = update_data_entry([{**data, 'naqla_id': naqla_id}])
+    row = result['rows'][0]
+    if row['status'] == 'updated':
+        return {'success': True}
+    return {'success': False, 'error': row.get('error', result.get('error'))}
 
 def delete_naqla_record(naqla_id):
     try:
-        conn = psycopg2.connect(**PG_PARAMS)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM main WHERE naqla_id = %s", (naqla_id,))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM main WHERE naqla_id = %s", (naqla_id,))
+            conn.commit()
+            cur.close()
         return {'success': True}
 
     except Exception as e:
         print(f"Error deleting record: {e}")
-        if conn:
-            conn.rollback()
         return {'success': False, 'error': str(e)}
@@ -0,0 +1,277 @@
+"""Margin and profitability per truck, factory or supplier.
+
+A naqla's gross margin is (sell_price - factory_price) * weight. Transfer
+fees are paid per supplier / truck owner, not per naqla, so each month's
+fees to a party are spread over that party's naqla rows of the month by
+weight; fees in a month where the party carried nothing stay in the
+totals as unallocated. Net margin is gross minus the allocated fees.
+
+The rows are pulled with one COPY into a pandas frame and everything
+after that (fee allocation, grouping, percentiles, period deltas, moving
+averages) runs on whole columns. Amounts are floats here, which is fine
+for reporting; the ledgers keep using NUMERIC.
+"""
+import io
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from db import get_connection
+
+# by -> naqla column it groups on, and where names come from (None: the key is the name)
+MARGIN_GROUPS = {
+    "truck": {"column": "truck_num", "table": None, "id": None, "name": None},
+    "factory": {"column": "factory_id", "table": "factories", "id": "factory_id", "name": "factory_name"},
+    "supplier": {"column": "supplier_id", "table": "suppliers", "id": "supplier_id", "name": "supplier_name"},
+}
+MARGIN_PERIODS = ["day", "week", "month"]
+MARGIN_METRICS = ["naqlas", "weight", "gross", "fees", "net"]
+MARGIN_PERCENTILES = [10, 50, 90]
+
+NAQLA_COLUMNS = ["naqla_id", "day", "truck_num", "owner_id", "supplier_id", "factory_id",
+                 "weight", "factory_price", "sell_price"]
+# Ids as float64 (NaN when missing): the C parser handles those directly, nullable Int64 is several times slower.
+NAQLA_DTYPES = {"naqla_id": "int64", "truck_num": "object", "owner_id": "float64", "supplier_id": "float64",
+                "factory_id": "float64", "weight": "float64", "factory_price": "float64", "sell_price": "float64"}
+CSV_COLUMNS = ["key", "name", "period", "naqlas", "weight", "gross", "fees", "net",
+               "net_delta", "net_change_pct", "net_moving_avg"]
+
+
+def load_naqla_frame(start, end):
+    """Naqla rows with start <= date < end as a DataFrame, one column per NAQLA_COLUMNS."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            query = cur.mogrify("""
+                SELECT m.naqla_id, d.full_date, m.truck_num, t.owner_id, m.supplier_id, m.factory_id,
+                       m.weight, m.factory_price, m.sell_price
+                FROM dim_date d
+                JOIN main m ON m.date_id = d.date_id
+                LEFT JOIN trucks t ON t.truck_num = m.truck_num
+                WHERE d.full_date >= %s AND d.full_date < %s
+            """, (start.isoformat(), end.isoformat())).decode()
+            buffer = io.BytesIO()
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+    frame = pd.read_csv(buffer, names=NAQLA_COLUMNS, dtype=NAQLA_DTYPES, parse_dates=["day"], date_format="%Y-%m-%d")
+    # An empty range leaves "day" as object; .dt needs datetime64 either way.
+    frame["day"] = pd.to_datetime(frame["day"], format="%Y-%m-%d")
+    frame["month"] = frame["day"].dt.to_period("M").dt.start_time
+    return frame
+
+
+def load_fees(start, end):
+    """Transfer fees per (party, party_id, month) for payments dated start <= date < end."""
+    params = (int(start.strftime("%Y%m%d")), int(end.strftime("%Y%m%d")))
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT 'supplier', supplier_id, date_id / 100, SUM(COALESCE(transfer_fees, 0))
+                FROM suppliers_payment
+                WHERE date_id >= %s AND date_id < %s
+                GROUP BY supplier_id, date_id / 100
+                UNION ALL
+                SELECT 'truck_owner', owner_id, date_id / 100, SUM(COALESCE(transfer_fees, 0))
+                FROM truck_owners_payment
+                WHERE date_id >= %s AND date_id < %s
+                GROUP BY owner_id, date_id / 100
+            """, params + params)
+            rows = cur.fetchall()
+    fees = pd.DataFrame(rows, columns=["party", "party_id", "yyyymm", "fees"])
+    fees["fees"] = fees["fees"].astype("float64")
+    fees["month"] = pd.to_datetime(fees["yyyymm"].astype("int64") * 100 + 1, format="%Y%m%d", errors="coerce")
+    return fees.dropna(subset=["party_id", "month"]).astype({"party_id": "int64"})
+
+
+def _allocate_fees(frame, fees, party_column):
+    """Each row's share of its party's fees for the month, split by weight (evenly if no weight)."""
+    keys = [party_column, "month"]
+    groups = frame.groupby(keys, dropna=False)["weight"]
+    total_weight = groups.transform("sum").to_numpy()
+    count = groups.transform("size").to_numpy()
+    weight = frame["weight"].fillna(0).to_numpy()
+    share = np.where(total_weight > 0, weight / np.where(total_weight > 0, total_weight, 1), 1 / count)
+    per_party = fees.groupby(["party_id", "month"], as_index=False)["fees"].sum()
+    rows = frame[keys].rename(columns={party_column: "party_id"})
+    per_party = per_party.astype({"party_id": "float64"})
+    party_fees = rows.merge(per_party, on=["party_id", "month"], how="left")["fees"].fillna(0).to_numpy()
+    return party_fees * share
+
+
+def compute_margins(frame, fees):
+    """Add gross, fees and net columns to a naqla frame; returns (frame, unallocated fees)."""
+    weight = frame["weight"].fillna(0).to_numpy()
+    spread = frame["sell_price"].fillna(0).to_numpy() - frame["factory_price"].fillna(0).to_numpy()
+    frame["gross"] = spread * weight
+    frame["fees"] = 0.0
+    for party, column in (("supplier", "supplier_id"), ("truck_owner", "owner_id")):
+        frame["fees"] += _allocate_fees(frame, fees[fees["party"] == party], column)
+    frame["net"] = frame["gross"] - frame["fees"]
+    unallocated = float(fees["fees"].sum() - frame["fees"].sum())
+    return frame, unallocated
+
+
+def _period_column(frame, period):
+    if period == "day":
+        return frame["day"]
+    if period == "week":
+        return frame["day"] - pd.to_timedelta(frame["day"].dt.weekday, unit="D")
+    return frame["month"]
+
+
+def _period_grid(start, end, period):
+    if period == "day":
+        return pd.date_range(start, end, freq="D", inclusive="left")
+    if period == "week":
+        first = pd.Timestamp(start) - pd.Timedelta(days=start.weekday())
+        return pd.date_range(first, end, freq="7D", inclusive="left")
+    return pd.date_range(start, end, freq="MS", inclusive="left")
+
+
+def _names(by, keys):
+    spec = MARGIN_GROUPS[by]
+    if spec["table"] is None:
+        return {}
+    ids = [int(k) for k in keys if k]
+    if not ids:
+        return {}
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {spec['id']}, {spec['name']} FROM {spec['table']} WHERE {spec['id']} = ANY(%s)", (ids,))
+            return dict(cur.fetchall())
+
+
+def _moving_average(values, window):
+    """Mean of each row's last `window` columns (fewer at the start), from running sums."""
+    sums = np.cumsum(values, axis=1)
+    shifted = np.zeros_like(sums)
+    shifted[:, window:] = sums[:, :-window]
+    count = np.minimum(np.arange(1, values.shape[1] + 1), window)
+    return (sums - shifted) / count
+
+
+def build_margin_report(frame, unallocated, by, period, start, end, sort="net", limit=50, window=3):
+    """Totals, percentiles and a per-period series for the top `limit` groups by `sort`.
+
+    Every period in [start, end) is in each series, zero where the group
+    carried nothing, so deltas and the `window`-period moving average of
+    net margin compare neighbouring periods. Rows without a truck, factory
+    or supplier are grouped under a None key.
+    """
+    column = MARGIN_GROUPS[by]["column"]
+    keys = frame[column].fillna("") if by == "truck" else frame[column].fillna(0).astype("int64")
+    frame = frame.assign(**{column: keys, "period": _period_column(frame, period)})
+    aggregations = {"naqlas": ("naqla_id", "size"), "weight": ("weight", "sum"),
+                    "gross": ("gross", "sum"), "fees": ("fees", "sum"), "net": ("net", "sum")}
+
+    groups = frame.groupby(column).agg(**aggregations)
+    groups = groups.sort_values([sort, "naqlas"], ascending=False).head(limit)
+    selected = frame[frame[column].isin(groups.index)]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_ton = np.where(selected["weight"] > 0, selected["net"] / selected["weight"], np.nan)
+    percentiles = (selected.assign(net_per_ton=per_ton)
+                   .groupby(column)["net_per_ton"]
+                   .quantile([p / 100 for p in MARGIN_PERCENTILES])
+                   .unstack())
+
+    periods = _period_grid(start, end, period)
+    grid = pd.MultiIndex.from_product([groups.index, periods], names=[column, "period"])
+    series = selected.groupby([column, "period"]).agg(**aggregations).reindex(grid, fill_value=0)
+    # groups x periods, in grid order
+    net = series["net"].to_numpy(dtype="float64").reshape(len(groups), len(periods))
+    delta = np.full_like(net, np.nan)
+    delta[:, 1:] = net[:, 1:] - net[:, :-1]
+    previous = np.full_like(net, np.nan)
+    previous[:, 1:] = net[:, :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(previous != 0, delta / np.abs(previous) * 100, np.nan)
+    series["net_delta"] = delta.ravel()
+    series["net_change_pct"] = change.ravel()
+    series["net_moving_avg"] = _moving_average(net, window).ravel() if len(periods) else []
+
+    totals = {metric: frame[metric].sum() if metric != "naqlas" else len(frame) for metric in MARGIN_METRICS}
+    totals["unallocated_fees"] = unallocated
+    return {
+        "groups": groups,
+        "percentiles": percentiles,
+        "series": series.reset_index(),
+        "names": _names(by, groups.index),
+        "totals": totals,
+    }
+
+
+def _plain(value, digits=2):
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, (float, np.floating)):
+        return round(float(value), digits)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return value
+
+
+def _key(value):
+    """Group key as JSON wants it; the placeholder for rows without one becomes None."""
+    if isinstance(value, str):
+        return value or None
+    return int(value) or None
+
+
+def _period_label(value, period):
+    return value.strftime("%Y-%m") if period == "month" else value.date().isoformat()
+
+
+def margin_report_json(report, by, period):
+    column = MARGIN_GROUPS[by]["column"]
+    series = {}
+    for row in report["series"].itertuples(index=False):
+        entry = row._asdict()
+        key = _key(entry.pop(column))
+        entry["period"] = _period_label(entry["period"], period)
+        series.setdefault(key, []).append({k: _plain(v) for k, v in entry.items()})
+    groups = []
+    for index, row in zip(report["groups"].index, report["groups"].to_dict("records")):
+        key = _key(index)
+        percentiles = report["percentiles"].loc[index]
+        groups.append({
+            "key": key,
+            "name": report["names"].get(key, key),
+            **{metric: _plain(row[metric]) for metric in MARGIN_METRICS},
+            "net_per_ton": {f"p{p}": _plain(percentiles[p / 100]) for p in MARGIN_PERCENTILES},
+            "series": series.get(key, []),
+        })
+    return {
+        "by": by,
+        "period": period,
+        "totals": {k: _plain(v) for k, v in report["totals"].items()},
+        "groups": groups,
+    }
+
+
+def margin_report_csv(report, by, period):
+    """The per-period series as CSV text (with BOM so Excel shows Arabic names)."""
+    column = MARGIN_GROUPS[by]["column"]
+    series = report["series"].rename(columns={column: "key"})
+    names = report["names"]
+    # Built as object so ids stay ints and missing keys print blank, not as floats;
+    # Series.map would infer float64 again for ids mixed with None.
+    keys = [_key(k) for k in series["key"]]
+    series["key"] = pd.Series(keys, index=series.index, dtype=object)
+    series["name"] = pd.Series([names.get(k, k) for k in keys], index=series.index, dtype=object)
+    series["period"] = pd.Series([_period_label(p, period) for p in series["period"]], index=series.index, dtype=object)
+    return "\ufeff" + series[CSV_COLUMNS].round(2).to_csv(index=False)
+
+
+def get_margin_report(by, start, end, period="month", sort="net", limit=50, window=3):
+    """Margin report for naqla rows with start <= date < end; see build_margin_report()."""
+    if by not in MARGIN_GROUPS:
+        raise ValueError(f"Unknown grouping '{by}'")
+    if period not in MARGIN_PERIODS:
+        raise ValueError(f"Unknown period '{period}'")
+    if sort not in MARGIN_METRICS:
+        raise ValueError(f"Unknown metric '{sort}'")
+    if not isinstance(start, date) or start >= end:
+        raise ValueError("start must be before end")
+    frame, unallocated = compute_margins(load_naqla_frame(start, end), load_fees(start, end))
+    return build_margin_report(frame, unallocated, by, period, start, end, sort=sort, limit=limit, window=window)
@@ -0,0 +1,199 @@
+"""In-process request and SQL timing, rendered in the Prometheus text format.
+
+Every worker keeps its own numbers, so with several gunicorn workers each
+scrape sees one worker (the pid is a label on every sample).
+"""
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from psycopg2 import extensions
+
+from services.slow_queries import maybe_record
+
+# Observations kept per series for the quantiles; count and sum cover everything.
+METRICS_RESERVOIR = int(os.getenv("METRICS_RESERVOIR", 1024))
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Frames from these modules are plumbing, not the code that issued the query.
+_PLUMBING_MODULES = ("db", "services.metrics", "contextlib", "psycopg2")
+
+
+class Summary:
+    """count, sum and recent-window quantiles for one label set."""
+
+    def __init__(self, size=METRICS_RESERVOIR):
+        self.count = 0
+        self.total = 0.0
+        self._recent = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            self._recent.append(value)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total = self.count, self.total
+        quantiles = {}
+        for q in QUANTILES:
+            quantiles[q] = recent[min(len(recent) - 1, math.ceil(q * len(recent)) - 1)] if recent else 0.0
+        return count, total, quantiles
+
+
+class SummaryFamily:
+    """A named metric with one Summary per label value."""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        child = self._children.get(label_value)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(label_value, Summary())
+        child.observe(value)
+
+    def render(self, pid):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} summary"]
+        for label_value, child in sorted(self._children.items()):
+            count, total, quantiles = child.snapshot()
+            labels = f'{self.label}="{_escape(label_value)}",pid="{pid}"'
+            for q, value in quantiles.items():
+                lines.append(f'{self.name}{{{labels},quantile="{q}"}} {value:.6f}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_DURATION = SummaryFamily(
+    "dashboard_request_duration_seconds", "Time spent handling a request, by endpoint.", "endpoint")
+QUERY_DURATION = SummaryFamily(
+    "dashboard_db_query_duration_seconds", "Time spent in one SQL statement, by issuing function.", "query")
+REQUEST_ROUND_TRIPS = SummaryFamily(
+    "dashboard_db_round_trips_per_request", "SQL statements executed while handling a request.", "endpoint")
+REQUEST_CONNECTIONS = SummaryFamily(
+    "dashboard_db_connections_per_request", "Pool connections checked out while handling a request.", "endpoint")
+FAMILIES = (REQUEST_DURATION, QUERY_DURATION, REQUEST_ROUND_TRIPS, REQUEST_CONNECTIONS)
+
+_responses = {}
+_responses_lock = threading.Lock()
+# The request (if any) being handled on this thread.
+_current = threading.local()
+
+
+def query_name(depth=2):
+    """Label for the code that issued a statement: Class.method or module.function."""
+    frame = sys._getframe(depth)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_PLUMBING_MODULES):
+            code = frame.f_code
+            owner = frame.f_locals.get("self") if code.co_argcount and code.co_varnames[0] == "self" else None
+            prefix = type(owner).__name__ if owner is not None else module.rsplit(".", 1)[-1]
+            return f"{prefix}.{code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def record_query(name, seconds):
+    QUERY_DURATION.observe(name, seconds)
+    scope = getattr(_current, "scope", None)
+    if scope is not None:
+        scope["statements"] += 1
+
+
+def record_checkout():
+    scope = getattr(_current, "scope", None)
+    if scope is not None:
+        scope["connections"] += 1
+
+
+def start_request():
+    _current.scope = {"started": time.perf_counter(), "statements": 0, "connections": 0}
+
+
+def finish_request(endpoint, status):
+    scope = getattr(_current, "scope", None)
+    if scope is None:
+        return
+    _current.scope = None
+    endpoint = endpoint or "unmatched"
+    REQUEST_DURATION.observe(endpoint, time.perf_counter() - scope["started"])
+    REQUEST_ROUND_TRIPS.observe(endpoint, scope["statements"])
+    REQUEST_CONNECTIONS.observe(endpoint, scope["connections"])
+    with _responses_lock:
+        key = (endpoint, status)
+        _responses[key] = _responses.get(key, 0) + 1
+
+
+def render_metrics():
+    pid = os.getpid()
+    lines = [
+        "# HELP dashboard_responses_total Responses sent, by endpoint and status code.",
+        "# TYPE dashboard_responses_total counter",
+    ]
+    with _responses_lock:
+        responses = sorted(_responses.items())
+    for (endpoint, status), count in responses:
+        lines.append(f'dashboard_responses_total{{endpoint="{_escape(endpoint)}",status="{status}",pid="{pid}"}} {count}')
+    for family in FAMILIES:
+        lines.extend(family.render(pid))
+    return "\n".join(lines) + "\n"
+
+
+class TimingCursorMixin:
+    """Times execute()/executemany(), files them under the calling function
+    and hands slow ones to the slow-query log."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._timed(query, vars, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._timed(query, None, time.perf_counter() - started)
+
+    def _timed(self, query, vars, seconds):
+        name = query_name(3)
+        record_query(name, seconds)
+        maybe_record(self, query, vars, seconds, name)
+
+
+_timed_classes = {}
+
+
+def timed_cursor_class(base):
+    cls = _timed_classes.get(base)
+    if cls is None:
+        cls = _timed_classes.setdefault(base, type(f"Timed{base.__name__}", (TimingCursorMixin, base), {}))
+    return cls
+
+
+class TimedConnection(extensions.connection):
+    """Connection whose cursors, of whatever cursor_factory, are all timed."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = timed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
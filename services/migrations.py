@@ -0,0 +1,229 @@
+"""Versioned schema migrations.
+
+Each file in migrations/ is NNNN_name.py with an upgrade(cur) function and
+a docstring describing it. Applied versions are recorded in
+schema_migrations, so upgrade() only runs what is new, in order.
+
+A migration runs in one transaction unless it sets TRANSACTIONAL = False.
+Those run in autocommit so they can use CREATE INDEX CONCURRENTLY, which
+builds an index without blocking writes to the table; they must be safe to
+re-run, since a failure halfway leaves the earlier statements applied.
+"""
+import importlib
+import os
+import re
+import time
+
+import psycopg2
+
+from db import PG_PARAMS
+
+MIGRATIONS_PACKAGE = "migrations"
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), MIGRATIONS_PACKAGE)
+_FILE_NAME = re.compile(r"^(\d{4})_(\w+)\.py$")
+# Any constant works; it only has to be the same for every process running upgrades.
+UPGRADE_LOCK_KEY = 720_200_001
+
+TRACKING_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    duration_ms INT
+)
+"""
+
+# (table, columns, unique, query that needs it). check_indexes() reports the
+# ones no valid index covers: a plain index only has to start with the
+# columns, ON CONFLICT needs a unique index on exactly them.
+HOT_QUERY_INDEXES = [
+    ("main", ("date_id",), False, "data-entry month grid and date-range reports"),
+    ("main", ("truck_num",), False, "truck renames (ON UPDATE CASCADE) and per-truck lookups"),
+    ("main", ("supplier_id",), False, "supplier statements and supplier deletes (foreign key check)"),
+    ("main_changes", ("version",), False, "data-entry grid delta"),
+    ("transactions", ("date",), False, "transactions dashboard date range and keyset pages"),
+    ("suppliers_payment", ("supplier_id",), False, "supplier payment totals and ledger"),
+    ("truck_owners_payment", ("owner_id",), False, "truck owner payment totals and ledger"),
+    ("trucks", ("owner_id",), False, "truck owner ledger and owner deletes"),
+    ("custody", ("user_id", "date", "custody_id"), False, "custody ledger pages (keyset on date, custody_id)"),
+    ("dim_date", ("full_date",), False, "date lookups when saving naqla rows, month bounds"),
+    ("dim_date", ("year", "month"), False, "monthly reports"),
+    ("suppliers", ("supplier_name",), True, "ON CONFLICT (supplier_name) in BaseTable.insert_record"),
+    ("factories", ("factory_name",), True, "ON CONFLICT (factory_name) in BaseTable.insert_record"),
+    ("zones", ("zone_name",), True, "ON CONFLICT (zone_name) in BaseTable.insert_record"),
+    ("representatives", ("representative_name",), True, "ON CONFLICT (representative_name) in BaseTable.insert_record"),
+    ("bank_name", ("bank_name",), True, "ON CONFLICT (bank_name) in BaseTable.insert_record"),
+]
+
+
+class MigrationError(Exception):
+    pass
+
+
+def connect():
+    # A dedicated connection, not the pool: migrations switch autocommit on and off.
+    return psycopg2.connect(**PG_PARAMS)
+
+
+def available_migrations():
+    """[(version, name, module)] sorted by version."""
+    found = []
+    for file_name in os.listdir(MIGRATIONS_DIR):
+        match = _FILE_NAME.match(file_name)
+        if match:
+            module = importlib.import_module(f"{MIGRATIONS_PACKAGE}.{file_name[:-3]}")
+            found.append((int(match.group(1)), match.group(2), module))
+    found.sort(key=lambda m: m[0])
+    versions = [version for version, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return found
+
+
+def applied_versions(cur):
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return {}
+    cur.execute("SELECT version, applied_at FROM schema_migrations")
+    return dict(cur.fetchall())
+
+
+def status(conn):
+    """[(version, name, applied_at or None)] for every migration file."""
+    with conn.cursor() as cur:
+        applied = applied_versions(cur)
+    conn.rollback()
+    return [(version, name, applied.get(version)) for version, name, _ in available_migrations()]
+
+
+def upgrade(conn, target=None, log=print):
+    """Apply pending migrations up to target (default: all). Returns the versions applied."""
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(TRACKING_SQL)
+        # Two deploys starting at once must not run the same migration twice.
+        cur.execute("SELECT pg_advisory_lock(%s)", (UPGRADE_LOCK_KEY,))
+        try:
+            applied = applied_versions(cur)
+            done = []
+            for version, name, module in available_migrations():
+                if version in applied or (target is not None and version > target):
+                    continue
+                log(f"Applying {version:04d}_{name}...")
+                started = time.perf_counter()
+                _run(conn, module)
+                duration_ms = round((time.perf_counter() - started) * 1000)
+                cur.execute("INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+                            (version, name, duration_ms))
+                log(f"Applied {version:04d}_{name} in {duration_ms} ms")
+                done.append(version)
+            return done
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (UPGRADE_LOCK_KEY,))
+            conn.autocommit = False
+
+
+def _run(conn, module):
+    if getattr(module, "TRANSACTIONAL", True):
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cur:
+                module.upgrade(cur)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+    else:
+        with conn.cursor() as cur:
+            module.upgrade(cur)
+
+
+def create_index_concurrently(cur, name, table, columns, unique=False, method=None):
+    """CREATE [UNIQUE] INDEX CONCURRENTLY, replacing an invalid leftover of a failed build.
+
+    columns are column names or expressions (with an operator class if
+    needed), used as written; method is the access method, e.g. "gin".
+    Needs an autocommit connection. IF NOT EXISTS alone would keep an
+    invalid index, which Postgres never uses.
+    """
+    cur.execute("""
+        SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+    """, (name,))
+    row = cur.fetchone()
+    if row and row[0]:
+        return False
+    if row:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    using = f" USING {method}" if method else ""
+    cur.execute(f"CREATE {kind} CONCURRENTLY {name} ON {table}{using} ({', '.join(columns)})")
+    return True
+
+
+def covers(candidates, columns, unique=False):
+    """True if one of index_columns()' entries for a table serves these columns."""
+    columns = tuple(columns)
+    for _, found, valid, is_unique in candidates:
+        if not valid:
+            continue
+        if unique and is_unique and found == columns:
+            return True
+        if not unique and found[:len(columns)] == columns:
+            return True
+    return False
+
+
+def index_exists_for(cur, table, columns, unique=False):
+    return covers(index_columns(cur).get(table, []), columns, unique)
+
+
+def index_columns(cur):
+    """{table: [(index name, column names, is valid, is unique)]} for the public schema.
+
+    Partial and expression indexes are left out: their column names alone
+    would claim they serve queries on the plain columns.
+    """
+    cur.execute("""
+        SELECT t.relname, c.relname, i.indisvalid, i.indisunique,
+               array(SELECT a.attname
+                     FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, n)
+                     JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                     ORDER BY k.n)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_namespace ns ON ns.oid = t.relnamespace
+        WHERE ns.nspname = 'public' AND i.indpred IS NULL AND NOT 0 = ANY(i.indkey::int2[])
+    """)
+    indexes = {}
+    for table, name, valid, unique, columns in cur.fetchall():
+        indexes.setdefault(table, []).append((name, tuple(columns), valid, unique))
+    return indexes
+
+
+def check_indexes(cur):
+    """Problems with the indexes the hot queries rely on, as a list of strings (empty if none)."""
+    indexes = index_columns(cur)
+    problems = []
+    cur.execute("SELECT relname FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace")
+    tables = {row[0] for row in cur.fetchall()}
+    for table, columns, unique, used_by in HOT_QUERY_INDEXES:
+        if table not in tables:
+            problems.append(f"{table} does not exist")
+        elif not covers(indexes.get(table, []), columns, unique):
+            kind = "unique index" if unique else "index"
+            problems.append(f"missing {kind} on {table} ({', '.join(columns)}), used by {used_by}")
+    cur.execute("""
+        SELECT t.relname, c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        WHERE t.relnamespace = 'public'::regnamespace AND NOT i.indisvalid
+        ORDER BY 1, 2
+    """)
+    for table, name in cur.fetchall():
+        problems.append(f"invalid index {name} on {table} (failed concurrent build; re-run upgrade)")
+    return problems
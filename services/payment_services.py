@@ -1,74 +1,42 @@
-import psycopg2
+import os
 from psycopg2.extras import RealDictCursor
-from db import PG_PARAMS
-from services.main_data_manager import get_id_by_name
+from db import get_connection
+from services.dimension_cache import LRUCache
+from services.main_data_manager import find_id_by_name, get_id_by_name
+from services.table_versions import get_tables_version
 
-def get_supplier_payments(search=None):
-    query = """
-        SELECT sp.supplier_transaction_id,
-            sp.date_id,
-            s.supplier_name,
-            sp.amount,
-            sp.transfer_fees,
-            b.bank_name AS payment_method,
-            sp.notes
-        FROM suppliers_payment sp
-        JOIN suppliers s ON sp.supplier_id = s.supplier_id
-        LEFT JOIN bank_name b ON sp.payment_method = b.bank_id
-    """
-    params = []
-    if search:
-        query += " WHERE s.supplier_name ILIKE %s"
-        params.append(f"%{search}%")
+# Grand totals per (ledger, filters), checked against the ledger's table
+# versions, so paging through a filter aggregates it once.
+PAYMENT_TOTALS_CACHE_SIZE = int(os.getenv("PAYMENT_TOTALS_CACHE_SIZE", 256))
+_totals_cache = LRUCache(PAYMENT_TOTALS_CACHE_SIZE, float(os.getenv("PAYMENT_TOTALS_CACHE_TTL", 300)))
 
-    query += " ORDER BY sp.supplier_transaction_id DESC"
-    with psycopg2.connect(**PG_PARAMS) as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, params)
-            return cur.fetchall()
+def get_banks():
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT bank_id, bank_name FROM bank_name ORDER BY bank_name")
+            return [{"bank_id": row[0], "bank_name": row[1]} for row in cur.fetchall()]
 
-def add_supplier_payment(date_id, supplier_id, amount, transfer_fees, payment_method, notes):
+def add_supplier_payment(date_id, supplier_name, amount, transfer_fees, payment_method, notes):
+    """Record a payment to supplier_name, creating the supplier if it is new (one transaction)."""
     query = """
         INSERT INTO suppliers_payment (date_id, supplier_id, amount, transfer_fees, payment_method, notes)
         VALUES (%s, %s, %s, %s, %s, %s)
     """
-    with psycopg2.connect(**PG_PARAMS) as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
+            supplier_id = get_id_by_name(cur, "suppliers", "supplier_id", "supplier_name", supplier_name)
             cur.execute(query, (date_id, supplier_id, amount, transfer_fees, payment_method, notes))
             conn.commit()
 
-def get_truck_owner_payments(search=None):
-    query = """
-        SELECT tp.truck_owner_transaction_id,
-            tp.date_id,
-            t.owner_name,
-            tp.amount,
-            tp.transfer_fees,
-            b.bank_name AS payment_method,
-            tp.notes
-        FROM truck_owners_payment tp
-        JOIN truck_owners t ON tp.owner_id = t.owner_id
-        LEFT JOIN bank_name b ON tp.payment_method = b.bank_id
-    """
-    params = []
-    if search:
-        query += " WHERE t.owner_name ILIKE %s"
-        params.append(f"%{search}%")
-
-    query += " ORDER BY tp.truck_owner_transaction_id DESC"
-    with psycopg2.connect(**PG_PARAMS) as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, params)
-            return cur.fetchall()
-
-
-def add_truck_owner_payment(date_id, owner_id, amount, transfer_fees, payment_method, notes):
+def add_truck_owner_payment(date_id, owner_name, amount, transfer_fees, payment_method, notes):
+    """Record a payment to owner_name, creating the truck owner if it is new (one transaction)."""
     query = """
         INSERT INTO truck_owners_payment (date_id, owner_id, amount, transfer_fees, payment_method, notes)
         VALUES (%s, %s, %s, %s, %s, %s)
     """
-    with psycopg2.connect(**PG_PARAMS) as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
+            owner_id = get_id_by_name(cur, "truck_owners", "owner_id", "owner_name", owner_name)
             cur.execute(query, (date_id, owner_id, amount, transfer_fees, payment_method, notes))
             conn.commit()
 
@@ -80,9 +48,9 @@ def update_supplier_payment(
     new_notes,
     new_supplier_name
 ):
-    with psycopg2.connect(**PG_PARAMS) as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
-            supplier_id = get_id_by_name(cur, "suppliers", "supplier_id", "supplier_name", new_supplier_name)
+            supplier_id = find_id_by_name(cur, "suppliers", "supplier_id", "supplier_name", new_supplier_name)
             if not supplier_id:
                 raise ValueError(f"Supplier with name '{new_supplier_name}' not found.")
 
@@ -107,7 +75,7 @@ def update_supplier_payment(
 
 def delete_supplier_payment(supplier_transaction_id):
     query = "DELETE FROM suppliers_payment WHERE supplier_transaction_id = %s"
-    with psycopg2.connect(**PG_PARAMS) as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query, (supplier_transaction_id,))
             conn.commit()
@@ -121,9 +89,9 @@ def update_truck_owner_payment(
     new_notes, 
     new_owner_name
 ):
-    with psycopg2.connect(**PG_PARAMS) as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
-            owner_id = get_id_by_name(cur, "truck_owners", "owner_id", "owner_name", new_owner_name)
+            owner_id = find_id_by_name(cur, "truck_owners", "owner_id", "owner_name", new_owner_name)
             if not owner_id:
                 raise ValueError(f"Truck owner with name '{new_owner_name}' not found.")
 
@@ -148,7 +116,138 @@ def update_truck_owner_payment(
 
 def delete_truck_owner_payment(truck_owner_transaction_id):
     query = "DELETE FROM truck_owners_payment WHERE truck_owner_transaction_id = %s"
-    with psycopg2.connect(**PG_PARAMS) as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query, (truck_owner_transaction_id,))
-            conn.commit()
\ No newline at end of file
+            conn.commit()
+
+# ledger -> how to read it; every name here is fixed in code, never user input
+PAYMENT_LEDGERS = {
+    "supplier": {
+        "table": "suppliers_payment p",
+        "id": "p.supplier_transaction_id",
+        "id_alias": "supplier_transaction_id",
+        "party_join": "JOIN suppliers s ON p.supplier_id = s.supplier_id",
+        "party_name": "s.supplier_name",
+        "version_tables": ("suppliers_payment", "suppliers"),
+    },
+    "truck_owner": {
+        "table": "truck_owners_payment p",
+        "id": "p.truck_owner_transaction_id",
+        "id_alias": "truck_owner_transaction_id",
+        "party_join": "JOIN truck_owners t ON p.owner_id = t.owner_id",
+        "party_name": "t.owner_name",
+        "version_tables": ("truck_owners_payment", "truck_owners"),
+    },
+}
+
+def _payment_filter_sql(ledger, filters):
+    conditions, params = [], []
+    if filters.get("search"):
+        conditions.append(f"{ledger['party_name']} ILIKE %s")
+        params.append(f"%{filters['search']}%")
+    if filters.get("start"):
+        conditions.append("p.date_id >= %s")
+        params.append(int(filters["start"].strftime("%Y%m%d")))
+    if filters.get("end"):
+        conditions.append("p.date_id <= %s")
+        params.append(int(filters["end"].strftime("%Y%m%d")))
+    if filters.get("payment_method"):
+        conditions.append("p.payment_method = %s")
+        params.append(int(filters["payment_method"]))
+    if filters.get("min_amount") not in (None, ""):
+        conditions.append("p.amount >= %s")
+        params.append(filters["min_amount"])
+    if filters.get("max_amount") not in (None, ""):
+        conditions.append("p.amount <= %s")
+        params.append(filters["max_amount"])
+    return conditions, params
+
+def _grand_totals(cur, kind, ledger, where, params):
+    """Count and sums of the whole filtered ledger, cached until one of its tables changes."""
+    # Read the versions before aggregating: a write committing in between
+    # then leaves the totals under the older versions, never the reverse.
+    versions = get_tables_version(cur, ledger["version_tables"])[0]
+    key = (kind, where, tuple(params))
+    totals = _totals_cache.get(key, versions)
+    if totals is None:
+        cur.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(p.amount), 0), COALESCE(SUM(p.transfer_fees), 0)
+            FROM {ledger['table']}
+            {ledger['party_join']}
+            WHERE {where}
+        """, params)
+        totals = dict(zip(("count", "amount", "transfer_fees"), cur.fetchone()))
+        _totals_cache.put(key, totals, versions)
+    return dict(totals)
+
+def get_payments_page(kind, filters=None, after=None, before=None, limit=25):
+    """One page of a payment ledger, newest first, keyset-paged on the transaction id.
+
+    filters may hold search, start/end (dates), payment_method (bank id) and
+    min_amount/max_amount. Pass after=<id> for the next (older) page or
+    before=<id> for the previous one. Grand totals for the whole filtered
+    ledger are aggregated once per filter and reused for its other pages
+    until a payment or party changes.
+    """
+    ledger = PAYMENT_LEDGERS[kind]
+    conditions, params = _payment_filter_sql(ledger, filters or {})
+    where = " AND ".join(conditions) or "TRUE"
+
+    page_conditions = list(conditions)
+    page_params = list(params)
+    if before is not None:
+        page_conditions.append(f"{ledger['id']} > %s")
+        page_params.append(before)
+        order = "ASC"
+    else:
+        if after is not None:
+            page_conditions.append(f"{ledger['id']} < %s")
+            page_params.append(after)
+        order = "DESC"
+    page_where = " AND ".join(page_conditions) or "TRUE"
+
+    query = f"""
+        SELECT {ledger['id']} AS {ledger['id_alias']},
+            p.date_id,
+            {ledger['party_name']},
+            p.amount,
+            p.transfer_fees,
+            b.bank_name AS payment_method,
+            p.notes
+        FROM {ledger['table']}
+        {ledger['party_join']}
+        LEFT JOIN bank_name b ON p.payment_method = b.bank_id
+        WHERE {page_where}
+        ORDER BY {ledger['id']} {order}
+        LIMIT %s
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            grand_totals = _grand_totals(cur, kind, ledger, where, params)
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query, page_params + [limit + 1])
+            payments = cur.fetchall()
+
+    id_alias = ledger["id_alias"]
+    has_more = len(payments) > limit
+    payments = payments[:limit]
+    if before is not None:
+        payments.reverse()
+        older = bool(payments)
+        newer = has_more
+    else:
+        older = has_more
+        newer = after is not None and bool(payments)
+
+    return {
+        "payments": payments,
+        "next_after": payments[-1][id_alias] if older else None,
+        "prev_before": payments[0][id_alias] if newer else None,
+        "page_totals": {
+            "count": len(payments),
+            "amount": sum((p["amount"] or 0) for p in payments),
+            "transfer_fees": sum((p["transfer_fees"] or 0) for p in payments),
+        },
+        "grand_totals": grand_totals,
+    }
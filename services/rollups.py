@@ -0,0 +1,259 @@
+"""Monthly and daily totals of main per factory, zone, supplier and representative.
+
+rollup_daily holds one row per (dimension, date_id, member) and
+rollup_monthly the same per month, each with the naqla count, weight,
+revenue (weight * sell_price), cost (weight * factory_price) and ohda.
+Reports read these instead of main, so a year of factory totals is a few
+hundred rows however many naqla rows are behind them.
+
+Writes to main only mark the days they touch in rollup_dirty_dates (a
+statement-level trigger, so the batch grid update and renames cascading
+into main are covered). Before a report is read, refresh_rollups()
+recomputes those days from main and re-sums their months from
+rollup_daily. What a refresh costs depends on how much was written since
+the last one, not on the size of main.
+"""
+from datetime import date
+
+from psycopg2.extras import RealDictCursor
+
+from db import get_connection
+
+# Any constant works; only one refresh at a time may rebuild a day.
+REFRESH_LOCK_KEY = 720_200_022
+
+# dimension -> where its members live; every name here is fixed in code, never user input
+ROLLUP_DIMENSIONS = {
+    "factory": {"column": "factory_id", "table": "factories", "name": "factory_name"},
+    "zone": {"column": "zone_id", "table": "zones", "name": "zone_name"},
+    "supplier": {"column": "supplier_id", "table": "suppliers", "name": "supplier_name"},
+    "representative": {"column": "representative_id", "table": "representatives", "name": "representative_name"},
+}
+
+ROLLUP_METRICS = ["naqla_count", "weight", "revenue", "cost", "margin", "ohda"]
+
+ROLLUPS_SQL = """
+CREATE TABLE IF NOT EXISTS rollup_daily (
+    dimension TEXT NOT NULL,
+    date_id INT NOT NULL,
+    member_id INT,
+    naqla_count INT NOT NULL,
+    weight NUMERIC NOT NULL,
+    revenue NUMERIC NOT NULL,
+    cost NUMERIC NOT NULL,
+    ohda NUMERIC NOT NULL
+);
+-- date_id alone for the refresh, which replaces every dimension of a day at once.
+CREATE INDEX IF NOT EXISTS rollup_daily_date_idx ON rollup_daily (date_id);
+CREATE INDEX IF NOT EXISTS rollup_daily_member_idx ON rollup_daily (dimension, member_id, date_id);
+
+CREATE TABLE IF NOT EXISTS rollup_monthly (
+    dimension TEXT NOT NULL,
+    month DATE NOT NULL,
+    member_id INT,
+    naqla_count INT NOT NULL,
+    weight NUMERIC NOT NULL,
+    revenue NUMERIC NOT NULL,
+    cost NUMERIC NOT NULL,
+    ohda NUMERIC NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rollup_monthly_month_idx ON rollup_monthly (month, dimension);
+
+CREATE TABLE IF NOT EXISTS rollup_dirty_dates (
+    date_id INT PRIMARY KEY,
+    marked_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- DO UPDATE rather than DO NOTHING: it locks an existing mark, so a refresh
+-- deleting it waits for this transaction and then sees its rows in main.
+CREATE OR REPLACE FUNCTION mark_rollup_dates() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO rollup_dirty_dates (date_id)
+        SELECT DISTINCT date_id FROM new_rows WHERE date_id IS NOT NULL
+        ORDER BY 1
+        ON CONFLICT (date_id) DO UPDATE SET marked_at = now();
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO rollup_dirty_dates (date_id)
+        SELECT DISTINCT date_id FROM old_rows WHERE date_id IS NOT NULL
+        ORDER BY 1
+        ON CONFLICT (date_id) DO UPDATE SET marked_at = now();
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS main_rollup_insert ON main;
+CREATE TRIGGER main_rollup_insert AFTER INSERT ON main
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_dates();
+DROP TRIGGER IF EXISTS main_rollup_update ON main;
+CREATE TRIGGER main_rollup_update AFTER UPDATE ON main
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_dates();
+DROP TRIGGER IF EXISTS main_rollup_delete ON main;
+CREATE TRIGGER main_rollup_delete AFTER DELETE ON main
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_dates();
+"""
+
+# The marked days of one month, every dimension from a single pass over
+# their naqla rows, then that month's totals re-summed from rollup_daily.
+REFRESH_SQL = """
+DELETE FROM rollup_daily WHERE date_id = ANY(%(date_ids)s);
+
+INSERT INTO rollup_daily (dimension, date_id, member_id, naqla_count, weight, revenue, cost, ohda)
+SELECT g.dimension, m.date_id, g.member_id, COUNT(*),
+       SUM(COALESCE(m.weight, 0)),
+       SUM(COALESCE(m.weight, 0) * COALESCE(m.sell_price, 0)),
+       SUM(COALESCE(m.weight, 0) * COALESCE(m.factory_price, 0)),
+       SUM(COALESCE(m.ohda, 0))
+FROM main m
+CROSS JOIN LATERAL (VALUES
+    ('factory', m.factory_id),
+    ('zone', m.zone_id),
+    ('supplier', m.supplier_id),
+    ('representative', m.representative_id)
+) AS g(dimension, member_id)
+WHERE m.date_id = ANY(%(date_ids)s)
+GROUP BY g.dimension, m.date_id, g.member_id;
+
+DELETE FROM rollup_monthly WHERE month = %(month)s;
+
+INSERT INTO rollup_monthly (dimension, month, member_id, naqla_count, weight, revenue, cost, ohda)
+SELECT r.dimension, %(month)s, r.member_id,
+       SUM(r.naqla_count), SUM(r.weight), SUM(r.revenue), SUM(r.cost), SUM(r.ohda)
+FROM dim_date d
+JOIN rollup_daily r ON r.date_id = d.date_id
+WHERE d.year = %(year)s AND d.month = %(month_number)s
+GROUP BY r.dimension, r.member_id;
+"""
+
+
+def ensure_rollups(cur):
+    """Install the rollup tables and the triggers that mark touched months."""
+    cur.execute(ROLLUPS_SQL)
+
+
+def mark_all_dates(cur):
+    """Mark every date in dim_date, for a full rebuild on the next refresh."""
+    cur.execute("""
+        INSERT INTO rollup_dirty_dates (date_id)
+        SELECT date_id FROM dim_date
+        ON CONFLICT (date_id) DO UPDATE SET marked_at = now()
+    """)
+
+
+def refresh_rollups(cur):
+    """Recompute the days marked since the last refresh and the months they fall in.
+
+    Returns the months refreshed, oldest first. Runs in the caller's
+    transaction, which must commit for the work to stick. A second refresh
+    waits for the first rather than redoing the same days.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (REFRESH_LOCK_KEY,))
+    cur.execute("""
+        WITH dirty AS (DELETE FROM rollup_dirty_dates RETURNING date_id)
+        SELECT d.year, d.month, array_agg(d.date_id)
+        FROM dirty JOIN dim_date d ON d.date_id = dirty.date_id
+        WHERE d.year IS NOT NULL AND d.month IS NOT NULL
+        GROUP BY d.year, d.month
+        ORDER BY d.year, d.month
+    """)
+    months = []
+    for year, month_number, date_ids in cur.fetchall():
+        month = date(year, month_number, 1)
+        cur.execute(REFRESH_SQL, {"date_ids": date_ids, "month": month, "year": year, "month_number": month_number})
+        months.append(month)
+    return months
+
+
+def _metric_columns(prefix=""):
+    return f"""
+        SUM({prefix}naqla_count) AS naqla_count, SUM({prefix}weight) AS weight,
+        SUM({prefix}revenue) AS revenue, SUM({prefix}cost) AS cost,
+        SUM({prefix}revenue) - SUM({prefix}cost) AS margin, SUM({prefix}ohda) AS ohda
+    """
+
+
+def get_rollup_report(dimension, start, end, sort="revenue", limit=50):
+    """Totals per member of a dimension for the months start..end (first-of-month dates, inclusive).
+
+    Returns {'members': [top `limit` members by `sort`, each with its
+    totals], 'months': [totals per month over all members], 'totals':
+    totals for the whole range}. Pending days are refreshed first.
+    """
+    spec = ROLLUP_DIMENSIONS[dimension]
+    if sort not in ROLLUP_METRICS:
+        raise ValueError(f"Unknown metric '{sort}'")
+    params = {"dimension": dimension, "start": start, "end": end, "limit": limit}
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            refresh_rollups(cur)
+        conn.commit()
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT r.member_id, p.{spec['name']} AS name, r.naqla_count, r.weight,
+                       r.revenue, r.cost, r.margin, r.ohda
+                FROM (
+                    SELECT member_id, {_metric_columns()}
+                    FROM rollup_monthly
+                    WHERE dimension = %(dimension)s AND month BETWEEN %(start)s AND %(end)s
+                    GROUP BY member_id
+                    ORDER BY {sort} DESC, member_id
+                    LIMIT %(limit)s
+                ) r
+                LEFT JOIN {spec['table']} p ON p.{spec['column']} = r.member_id
+                ORDER BY r.{sort} DESC, r.member_id
+            """, params)
+            members = cur.fetchall()
+            cur.execute(f"""
+                SELECT month, {_metric_columns()}
+                FROM rollup_monthly
+                WHERE dimension = %(dimension)s AND month BETWEEN %(start)s AND %(end)s
+                GROUP BY month
+                ORDER BY month
+            """, params)
+            months = cur.fetchall()
+    totals = {metric: sum(m[metric] for m in months) for metric in ROLLUP_METRICS}
+    return {"members": members, "months": months, "totals": totals}
+
+
+def get_rollup_daily(dimension, member_id, start, end):
+    """Daily totals of one member (None for rows without one) between start and end dates, inclusive."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            refresh_rollups(cur)
+        conn.commit()
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT d.full_date::date AS day, {_metric_columns('r.')}
+                FROM dim_date d
+                JOIN rollup_daily r ON r.date_id = d.date_id
+                WHERE d.full_date >= %(start)s AND d.full_date <= %(end)s
+                  AND r.dimension = %(dimension)s AND r.member_id IS NOT DISTINCT FROM %(member_id)s
+                GROUP BY d.full_date
+                ORDER BY d.full_date
+            """, {"dimension": dimension, "member_id": member_id,
+                  "start": start.isoformat(), "end": end.isoformat()})
+            return cur.fetchall()
+
+
+def month_range(start, end):
+    """First-of-month dates for 'YYYY-MM' strings; either may be empty (default: the last 12 months)."""
+    today = date.today()
+    if end:
+        year, month = (int(part) for part in end.split("-"))
+        last = date(year, month, 1)
+    else:
+        last = today.replace(day=1)
+    if start:
+        year, month = (int(part) for part in start.split("-"))
+        first = date(year, month, 1)
+    else:
+        months = last.year * 12 + last.month - 1 - 11
+        first = date(months // 12, months % 12 + 1, 1)
+    if first > last:
+        raise ValueError("start is after end")
+    return first, last
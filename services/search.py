@@ -0,0 +1,106 @@
+import re
+
+from services.migrations import create_index_concurrently
+
+# Arabic letter variants folded to one form, and Arabic-Indic / Persian digits to ASCII.
+# normalize_search_text() and the normalize_search() SQL function are both built
+# from these tables so that the Python side and the indexes always agree.
+CHAR_FOLDS = {
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي",
+    "ة": "ه",
+    "ؤ": "و",
+}
+CHAR_FOLDS.update({chr(0x0660 + i): str(i) for i in range(10)})
+CHAR_FOLDS.update({chr(0x06F0 + i): str(i) for i in range(10)})
+# Harakat (fatha, damma, kasra, tanween, shadda, sukun), superscript alef and tatweel.
+DIACRITICS = "".join(chr(c) for c in range(0x064B, 0x0653)) + "ٰـ"
+
+_FOLD_TABLE = str.maketrans({**CHAR_FOLDS, **{c: None for c in DIACRITICS}})
+_SPACES = re.compile(r"\s+")
+
+SEARCH_DEFAULT_LIMIT = 20
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+NORMALIZE_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION normalize_search(value text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT lower(regexp_replace(translate(coalesce(value, ''),
+        '{"".join(CHAR_FOLDS) + DIACRITICS}',
+        '{"".join(CHAR_FOLDS.values())}'), '\\s+', ' ', 'g'))
+$$
+"""
+
+# (table, column) pairs searched by the managers; each gets a trigram index.
+SEARCHED_COLUMNS = [
+    ("suppliers", "supplier_name"), ("suppliers", "phone"),
+    ("representatives", "representative_name"), ("representatives", "phone"),
+    ("zones", "zone_name"),
+    ("factories", "factory_name"),
+    ("bank_name", "bank_name"),
+    ("trucks", "truck_num"),
+    ("truck_owners", "owner_name"), ("truck_owners", "phone"),
+]
+
+
+def normalize_search_text(value):
+    """Python twin of the normalize_search() SQL function."""
+    if value is None:
+        return ""
+    return _SPACES.sub(" ", str(value).translate(_FOLD_TABLE)).strip().lower()
+
+
+def like_pattern(normalized, prefix=False):
+    escaped = normalized.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%" if prefix else f"%{escaped}%"
+
+
+def search_params(query):
+    """Normalized query plus the exact/prefix/substring patterns used for ranking."""
+    normalized = normalize_search_text(query)
+    return {
+        "exact": normalized,
+        "prefix": like_pattern(normalized, prefix=True),
+        "contains": like_pattern(normalized),
+    }
+
+
+def rank_sql(column):
+    """ORDER BY fragment: exact match, then prefix match, then shorter values."""
+    return (
+        f"CASE WHEN normalize_search({column}) = %(exact)s THEN 0 "
+        f"WHEN normalize_search({column}) LIKE %(prefix)s THEN 1 ELSE 2 END"
+    )
+
+
+def ensure_search_schema(cur):
+    """Install normalize_search() and, when pg_trgm is available, trigram indexes.
+
+    The indexes are built CONCURRENTLY, so cur must be on an autocommit
+    connection. Without pg_trgm the searches still work, they just scan.
+    """
+    cur.execute(NORMALIZE_FUNCTION_SQL)
+    cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    if not cur.fetchone():
+        return False
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, column in SEARCHED_COLUMNS:
+        create_index_concurrently(cur, f"{table}_{column}_search_trgm", table,
+                                  [f"normalize_search({column}) gin_trgm_ops"], method="gin")
+    return True
+
+
+def autocomplete(cur, table, column, query, limit=10):
+    """Distinct values of table.column matching query, best matches first."""
+    params = search_params(query or "")
+    params["limit"] = max(1, min(int(limit), AUTOCOMPLETE_MAX_LIMIT))
+    cur.execute(f"""
+        SELECT value FROM (
+            SELECT DISTINCT {column} AS value
+            FROM {table}
+            WHERE normalize_search({column}) LIKE %(contains)s
+        ) matches
+        ORDER BY {rank_sql('value')}, length(value), value
+        LIMIT %(limit)s
+    """, params)
+    return [row[0] for row in cur.fetchall()]
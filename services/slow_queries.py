@@ -0,0 +1,179 @@
+import json
+import os
+import re
+import threading
+import time
+
+# Statements at least this slow are recorded; 0 disables the log.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 500))
+# Re-run slow SELECTs under EXPLAIN (ANALYZE, BUFFERS). Off by default: it runs the query again.
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN") == "1"
+# Upper bound for one EXPLAIN ANALYZE, in milliseconds.
+SLOW_QUERY_EXPLAIN_TIMEOUT = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT", 10000))
+SLOW_QUERY_DIR = os.getenv("SLOW_QUERY_DIR", "slow_queries")
+SLOW_QUERY_MAX_ENTRIES = int(os.getenv("SLOW_QUERY_MAX_ENTRIES", 500))
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%(?:\(\w+\))?s")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Statement text with literals and placeholders as ?, so equal queries group together."""
+    sql = _STRINGS.sub("?", sql)
+    sql = _PLACEHOLDERS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _LISTS.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def params_shape(params):
+    """Types (and lengths) of the bound parameters; never their values."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: params_shape_item(value) for key, value in params.items()}
+    return [params_shape_item(value) for value in params]
+
+
+def params_shape_item(value):
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def _is_read_only(normalized):
+    head = normalized.lstrip("( ").upper()
+    if head.startswith("SELECT"):
+        return True
+    return head.startswith("WITH") and not re.search(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", head)
+
+
+class SlowQueryStore:
+    """Recent slow statements as JSON files, newest kept, oldest rotated out.
+
+    One file per entry in a directory shared by every worker, like the
+    export cache, so the settings page sees all of them.
+    """
+
+    def __init__(self, directory=SLOW_QUERY_DIR, max_entries=SLOW_QUERY_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        with self._lock:
+            self._counter += 1
+            entry_id = f"{time.time_ns()}-{os.getpid()}-{self._counter}"
+        entry["id"] = entry_id
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{entry_id}.json")
+        tmp = os.path.join(self.directory, f".tmp-{entry_id}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self.rotate()
+        return entry_id
+
+    def _names(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except OSError:
+            return []
+        # Ids start with a nanosecond timestamp, so name order is age order.
+        return sorted(names, key=lambda n: int(n.split("-", 1)[0]), reverse=True)
+
+    def rotate(self):
+        for name in self._names()[self.max_entries:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def get(self, entry_id):
+        if not re.fullmatch(r"[\d-]+", entry_id or ""):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{entry_id}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def recent(self, limit=100):
+        entries = []
+        for name in self._names()[:limit]:
+            entry = self.get(name[:-len(".json")])
+            if entry:
+                entries.append(entry)
+        return entries
+
+
+slow_query_store = SlowQueryStore()
+# One EXPLAIN at a time per worker; slow queries arriving meanwhile are stored without a plan.
+_explain_slot = threading.Semaphore(1)
+_local = threading.local()
+
+
+def explain(sql):
+    """EXPLAIN (ANALYZE, BUFFERS) for a fully bound statement, on its own connection."""
+    from db import get_connection
+    _local.explaining = True
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (SLOW_QUERY_EXPLAIN_TIMEOUT,))
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+            # ANALYZE really ran the statement; keep nothing it might have done.
+            conn.rollback()
+        return plan
+    finally:
+        _local.explaining = False
+
+
+def _explain_and_store(entry, sql):
+    try:
+        entry["plan"] = explain(sql)
+    except Exception as e:
+        entry["plan_error"] = str(e)
+    finally:
+        _explain_slot.release()
+    slow_query_store.add(entry)
+
+
+def maybe_record(cursor, query, params, seconds, caller):
+    """Record the statement if it ran for at least SLOW_QUERY_MS. Called by the timing cursor."""
+    if not SLOW_QUERY_MS or seconds * 1000 < SLOW_QUERY_MS or getattr(_local, "explaining", False):
+        return
+    try:
+        if hasattr(query, "as_string"):
+            query = query.as_string(cursor)
+        elif isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        normalized = normalize_sql(query)
+        entry = {
+            "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "pid": os.getpid(),
+            "duration_ms": round(seconds * 1000, 1),
+            "caller": caller,
+            "sql": normalized,
+            "params": params_shape(params),
+            "plan": None,
+        }
+        print(f"Slow query ({entry['duration_ms']} ms) in {caller}: {normalized[:200]}")
+
+        if SLOW_QUERY_EXPLAIN and _is_read_only(normalized) and _explain_slot.acquire(blocking=False):
+            try:
+                bound = cursor.mogrify(query, params).decode("utf-8", "replace")
+                # Off the request thread: the caller shouldn't wait for a second run of its slow query.
+                threading.Thread(target=_explain_and_store, args=(entry, bound), daemon=True).start()
+            except Exception:
+                _explain_slot.release()
+                raise
+        else:
+            slow_query_store.add(entry)
+    except Exception as e:
+        print(f"Could not record slow query: {e}")
@@ -1,82 +1,111 @@
-import psycopg2
-from db import PG_PARAMS
+from psycopg2 import errors
+from db import get_connection
+from services.count_strategies import get_count_strategy
+from services.search import SEARCH_DEFAULT_LIMIT, rank_sql, search_params
+from services.table_versions import get_tables_version
 
 class BaseTable:
-    def __init__(self, table_name, id_column, name_column, phone_column=None):
+    # How fetch_all totals the table: "exact", "cached", "window" or "estimated".
+    count_strategy = "cached"
+
+    def __init__(self, table_name, id_column, name_column, phone_column=None, count_strategy=None):
         self.table_name = table_name
         self.id_column = id_column
         self.name_column = name_column
         self.phone_column = phone_column
+        self.counter = get_count_strategy(count_strategy or self.count_strategy)
+
+    def count_column(self):
+        # Extra select-list entry for strategies that count inside the page query.
+        return ", COUNT(*) OVER()" if self.counter.in_query else ""
 
     def get_conn(self):
-        return psycopg2.connect(**PG_PARAMS)
+        # Borrowed from the shared pool; use as "with self.get_conn() as conn:".
+        return get_connection()
+
+    def version_tables(self):
+        # Tables whose writes change what this manager's listing shows.
+        return (self.table_name,)
+
+    def version(self):
+        """(versions, modified_at) stamp of the listing; None if unavailable."""
+        try:
+            with self.get_conn() as conn:
+                cur = conn.cursor()
+                stamp = get_tables_version(cur, self.version_tables())
+                cur.close()
+            return stamp
+        except Exception as e:
+            print(f"Error reading table version: {e}")
+            return None
 
     def fetch_all(self, limit=10, offset=0):
         try:
-            conn = self.get_conn()
-            cur = conn.cursor()
+            with self.get_conn() as conn:
+                cur = conn.cursor()
             
-            columns = [self.name_column]
-            if self.phone_column:
-                columns.append(self.phone_column)
+                columns = [self.name_column]
+                if self.phone_column:
+                    columns.append(self.phone_column)
 
-            # This is safe because table_name and column names are defined in the class, not from user input.
-            cur.execute(f"""
-                SELECT {', '.join(columns)}
-                FROM {self.table_name}
-                ORDER BY {self.name_column}
-                LIMIT %s OFFSET %s
-            """, (limit, offset))
-            rows = cur.fetchall()
-            
-            cur.execute(f"SELECT COUNT(*) FROM {self.table_name}")
-            total_count = cur.fetchone()[0]
+                # This is safe because table_name and column names are defined in the class, not from user input.
+                cur.execute(f"""
+                    SELECT {', '.join(columns)}{self.count_column()}
+                    FROM {self.table_name}
+                    ORDER BY {self.name_column}
+                    LIMIT %s OFFSET %s
+                """, (limit, offset))
+                rows = cur.fetchall()
+                total_count = self.counter.total(cur, self.table_name, rows)
             
-            cur.close()
-            conn.close()
+                cur.close()
             
-            if self.phone_column:
-                result = [{self.name_column: r[0], self.phone_column: r[1]} for r in rows]
-            else:
-                result = [{self.name_column: r[0]} for r in rows]
+                if self.phone_column:
+                    result = [{self.name_column: r[0], self.phone_column: r[1]} for r in rows]
+                else:
+                    result = [{self.name_column: r[0]} for r in rows]
 
-            return result, total_count
+                return result, total_count
         except Exception as e:
             print(f"Error fetching records: {e}")
             return [], 0
             
-    def search(self, query):
+    def search(self, query, limit=SEARCH_DEFAULT_LIMIT, offset=0):
+        """Ranked substring search over the name (and phone) column.
+
+        Both sides go through normalize_search(), so Arabic letter variants,
+        diacritics and Arabic-Indic digits match their plain forms, and the
+        trigram indexes from ensure_search_schema() can serve the LIKE.
+        """
         try:
-            conn = self.get_conn()
-            cur = conn.cursor()
+            with self.get_conn() as conn:
+                cur = conn.cursor()
             
-            select_columns = [self.name_column]
-            if self.phone_column:
-                select_columns.append(self.phone_column)
+                select_columns = [self.name_column]
+                if self.phone_column:
+                    select_columns.append(self.phone_column)
             
-            conditions = [f"{self.name_column} ILIKE %s"]
-            params = [f"%{query}%"]
-            
-            if self.phone_column:
-                conditions.append(f"{self.phone_column} ILIKE %s")
-                params.append(f"%{query}%")
+                params = search_params(query)
+                params.update(limit=limit, offset=offset)
+                conditions = [f"normalize_search({col}) LIKE %(contains)s" for col in select_columns]
+                ranks = [rank_sql(col) for col in select_columns]
                 
-            # This is safe because table_name and column names are defined in the class.
-            cur.execute(f"""
-                SELECT {', '.join(select_columns)}
-                FROM {self.table_name}
-                WHERE {' OR '.join(conditions)}
-                ORDER BY {self.name_column}
-            """, tuple(params))
+                # This is safe because table_name and column names are defined in the class.
+                cur.execute(f"""
+                    SELECT {', '.join(select_columns)}
+                    FROM {self.table_name}
+                    WHERE {' OR '.join(conditions)}
+                    ORDER BY LEAST({', '.join(ranks)}), length({self.name_column}), {self.name_column}
+                    LIMIT %(limit)s OFFSET %(offset)s
+                """, params)
             
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
+                rows = cur.fetchall()
+                cur.close()
 
-            if self.phone_column:
-                return [{self.name_column: r[0], self.phone_column: r[1]} for r in rows]
-            else:
-                return [{self.name_column: r[0]} for r in rows]
+                if self.phone_column:
+                    return [{self.name_column: r[0], self.phone_column: r[1]} for r in rows]
+                else:
+                    return [{self.name_column: r[0]} for r in rows]
         
         except Exception as e:
             print(f"Error searching records: {e}")
@@ -84,91 +113,86 @@ class BaseTable:
             
     def delete_record(self, name_value):
         try:
-            conn = self.get_conn()
-            cur = conn.cursor()
-            # This is safe because table_name and column name are defined in the class.
-            cur.execute(f"DELETE FROM {self.table_name} WHERE {self.name_column} = %s", (name_value,))
-            deleted_rows = cur.rowcount
-            conn.commit()
-            cur.close()
-            conn.close()
-            return {'success': deleted_rows > 0}
+            with self.get_conn() as conn:
+                cur = conn.cursor()
+                # This is safe because table_name and column name are defined in the class.
+                cur.execute(f"DELETE FROM {self.table_name} WHERE {self.name_column} = %s", (name_value,))
+                deleted_rows = cur.rowcount
+                conn.commit()
+                cur.close()
+                return {'success': deleted_rows > 0}
+        except errors.ForeignKeyViolation:
+            # Naqla rows and payments reference their dimensions (migration 0006).
+            return {'success': False, 'error': "🚫 لا يمكن الحذف لأن السجل مستخدم في نقلات أو مدفوعات."}
         except Exception as e:
             print(f"Error deleting record: {e}")
-            if 'conn' in locals():
-                conn.rollback()
             return {'success': False, 'error': str(e)}
 
     def insert_record(self, name_value, phone_value=None):
         try:
-            conn = self.get_conn()
-            cur = conn.cursor()
+            with self.get_conn() as conn:
+                cur = conn.cursor()
             
-            if self.phone_column and phone_value is not None:
-                cur.execute(f"""
-                    INSERT INTO {self.table_name} ({self.name_column}, {self.phone_column})
-                    VALUES (%s, %s)
-                    ON CONFLICT ({self.name_column}) DO NOTHING
-                    RETURNING {self.name_column};
-                """, (name_value, phone_value))
-            else:
-                cur.execute(f"""
-                    INSERT INTO {self.table_name} ({self.name_column})
-                    VALUES (%s)
-                    ON CONFLICT ({self.name_column}) DO NOTHING
-                    RETURNING {self.name_column};
-                """, (name_value,))
+                if self.phone_column and phone_value is not None:
+                    cur.execute(f"""
+                        INSERT INTO {self.table_name} ({self.name_column}, {self.phone_column})
+                        VALUES (%s, %s)
+                        ON CONFLICT ({self.name_column}) DO NOTHING
+                        RETURNING {self.name_column};
+                    """, (name_value, phone_value))
+                else:
+                    cur.execute(f"""
+                        INSERT INTO {self.table_name} ({self.name_column})
+                        VALUES (%s)
+                        ON CONFLICT ({self.name_column}) DO NOTHING
+                        RETURNING {self.name_column};
+                    """, (name_value,))
                 
-            result = cur.fetchone()
-            conn.commit()
-            cur.close()
-            conn.close()
+                result = cur.fetchone()
+                conn.commit()
+                cur.close()
             
-            return "inserted" if result else "exists"
+                return "inserted" if result else "exists"
             
         except Exception as e:
             print(f"Error inserting record: {e}")
-            if 'conn' in locals() and conn:
-                conn.rollback()
-                conn.close()
             return str(e)
             
     def update_record(self, original_name, new_data):
         try:
-            conn = self.get_conn()
-            cur = conn.cursor()
+            with self.get_conn() as conn:
+                cur = conn.cursor()
             
-            set_clauses = []
-            params = []
+                set_clauses = []
+                params = []
             
-            if f'new_{self.name_column}' in new_data:
-                set_clauses.append(f"{self.name_column} = %s")
-                params.append(new_data[f'new_{self.name_column}'])
+                if f'new_{self.name_column}' in new_data:
+                    set_clauses.append(f"{self.name_column} = %s")
+                    params.append(new_data[f'new_{self.name_column}'])
             
-            if self.phone_column and 'new_phone' in new_data:
-                set_clauses.append(f"{self.phone_column} = %s")
-                params.append(new_data['new_phone'])
+                if self.phone_column and 'new_phone' in new_data:
+                    set_clauses.append(f"{self.phone_column} = %s")
+                    params.append(new_data['new_phone'])
                 
-            params.append(original_name)
+                params.append(original_name)
             
-            query = f"UPDATE {self.table_name} SET {', '.join(set_clauses)} WHERE {self.name_column} = %s"
+                query = f"UPDATE {self.table_name} SET {', '.join(set_clauses)} WHERE {self.name_column} = %s"
             
-            cur.execute(query, tuple(params))
+                cur.execute(query, tuple(params))
             
-            updated_rows = cur.rowcount
-            conn.commit()
-            cur.close()
-            conn.close()
+                updated_rows = cur.rowcount
+                conn.commit()
+                cur.close()
             
-            return {'success': updated_rows > 0}
+                return {'success': updated_rows > 0}
             
         except Exception as e:
             print(f"Error updating record: {e}")
-            if 'conn' in locals() and conn:
-                conn.rollback()
             return {'success': False, 'error': str(e)}
 
 class SupplierManager(BaseTable):
+    count_strategy = "window"
+
     def __init__(self):
         super().__init__("suppliers", "supplier_id", "supplier_name", "phone")
 
@@ -190,129 +214,111 @@ class BankManager(BaseTable):
 
 # TruckOwnerManager handles truck owners and their associated trucks
 class TruckOwnerManager(BaseTable):
+    # The truck registry is the one table expected to grow large.
+    count_strategy = "estimated"
+
     def __init__(self):
         super().__init__("trucks", "truck_num", "truck_num")
 
+    def version_tables(self):
+        return ("trucks", "truck_owners")
+
     def insert_record(self, truck_number, truck_owner, phone_number):
         try:
-            conn = self.get_conn()
-            cur = conn.cursor()
-            # Edited: Safely using parameterized query for insert
-            cur.execute("SELECT owner_id FROM truck_owners WHERE owner_name = %s AND phone = %s", (truck_owner, phone_number))
-            owner_result = cur.fetchone()
-            if owner_result:
-                owner_id = owner_result[0]
-            else:
-                cur.execute("INSERT INTO truck_owners (owner_name, phone) VALUES (%s, %s) RETURNING owner_id", (truck_owner, phone_number))
-                owner_id = cur.fetchone()[0]
-            cur.execute("SELECT truck_num FROM trucks WHERE truck_num = %s", (truck_number,))
-            truck_exists = cur.fetchone()
-            if truck_exists:
-                raise Exception(f"🚫 رقم الشاحنة '{truck_number}' موجود بالفعل في قاعدة البيانات.")
-            cur.execute("INSERT INTO trucks (truck_num, owner_id) VALUES (%s, %s)", (truck_number, owner_id))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return {'success': True}
+            with self.get_conn() as conn:
+                cur = conn.cursor()
+                # Edited: Safely using parameterized query for insert
+                cur.execute("SELECT owner_id FROM truck_owners WHERE owner_name = %s AND phone = %s", (truck_owner, phone_number))
+                owner_result = cur.fetchone()
+                if owner_result:
+                    owner_id = owner_result[0]
+                else:
+                    cur.execute("INSERT INTO truck_owners (owner_name, phone) VALUES (%s, %s) RETURNING owner_id", (truck_owner, phone_number))
+                    owner_id = cur.fetchone()[0]
+                cur.execute("SELECT truck_num FROM trucks WHERE truck_num = %s", (truck_number,))
+                truck_exists = cur.fetchone()
+                if truck_exists:
+                    raise Exception(f"🚫 رقم الشاحنة '{truck_number}' موجود بالفعل في قاعدة البيانات.")
+                cur.execute("INSERT INTO trucks (truck_num, owner_id) VALUES (%s, %s)", (truck_number, owner_id))
+                conn.commit()
+                cur.close()
+                return {'success': True}
         except Exception as e:
             print(f"Error inserting truck owner and truck: {e}")
-            if 'conn' in locals() and conn:
-                conn.rollback()
             return {'success': False, 'error': str(e)}
 
     def fetch_all(self, limit=10, offset=0):
         try:
-            conn = self.get_conn()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT t.truck_num, o.owner_name, o.phone
-                FROM trucks t
-                JOIN truck_owners o ON t.owner_id = o.owner_id
-                ORDER BY t.truck_num
-                LIMIT %s OFFSET %s
-            """, (limit, offset))
-            rows = cur.fetchall()
-            cur.execute("SELECT COUNT(*) FROM trucks")
-            total_count = cur.fetchone()[0]
-            cur.close()
-            conn.close()
-            truck_owners = [{'truck_number': r[0], 'truck_owner': r[1], 'phone_number': r[2]} for r in rows]
-            return truck_owners, total_count
+            with self.get_conn() as conn:
+                cur = conn.cursor()
+                cur.execute(f"""
+                    SELECT t.truck_num, o.owner_name, o.phone{self.count_column()}
+                    FROM trucks t
+                    JOIN truck_owners o ON t.owner_id = o.owner_id
+                    ORDER BY t.truck_num
+                    LIMIT %s OFFSET %s
+                """, (limit, offset))
+                rows = cur.fetchall()
+                total_count = self.counter.total(cur, self.table_name, rows)
+                cur.close()
+                truck_owners = [{'truck_number': r[0], 'truck_owner': r[1], 'phone_number': r[2]} for r in rows]
+                return truck_owners, total_count
         except Exception as e:
             print(f"Error fetching truck owners: {e}")
             return [], 0
 
-    def search(self, query):
+    def search(self, query, limit=SEARCH_DEFAULT_LIMIT, offset=0):
         try:
-            conn = self.get_conn()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT t.truck_num, o.owner_name, o.phone
-                FROM trucks t
-                JOIN truck_owners o ON t.owner_id = o.owner_id
-                WHERE t.truck_num ILIKE %s
-                    OR o.owner_name ILIKE %s
-                    OR o.phone ILIKE %s
-                ORDER BY t.truck_num
-            """, (f"%{query}%", f"%{query}%", f"%{query}%"))
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
-            return [{'truck_number': r[0], 'truck_owner': r[1], 'phone_number': r[2]} for r in rows]
+            with self.get_conn() as conn:
+                cur = conn.cursor()
+                params = search_params(query)
+                params.update(limit=limit, offset=offset)
+                cur.execute(f"""
+                    SELECT t.truck_num, o.owner_name, o.phone
+                    FROM trucks t
+                    JOIN truck_owners o ON t.owner_id = o.owner_id
+                    WHERE normalize_search(t.truck_num) LIKE %(contains)s
+                        OR normalize_search(o.owner_name) LIKE %(contains)s
+                        OR normalize_search(o.phone) LIKE %(contains)s
+                    ORDER BY LEAST({rank_sql('t.truck_num')}, {rank_sql('o.owner_name')}, {rank_sql('o.phone')}),
+                        length(t.truck_num), t.truck_num
+                    LIMIT %(limit)s OFFSET %(offset)s
+                """, params)
+                rows = cur.fetchall()
+                cur.close()
+                return [{'truck_number': r[0], 'truck_owner': r[1], 'phone_number': r[2]} for r in rows]
         except Exception as e:
             print(f"Error searching truck owners: {e}")
             return []
 
-    def fetch_trucks_with_owners(self):
-        try:
-            conn = self.get_conn()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT t.truck_num, o.owner_name
-                FROM trucks t
-                JOIN truck_owners o ON t.owner_id = o.owner_id
-                ORDER BY t.truck_num
-            """)
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
-            return rows
-        except Exception as e:
-            print(f"Error fetching trucks with owners: {e}")
-            return []
-
     def update_record(self, original_truck_num, new_data):
         try:
-            conn = self.get_conn()
-            cur = conn.cursor()
-            new_truck_num = new_data.get('new_truck_num')
-            new_owner_name = new_data.get('new_owner_name')
-            new_phone = new_data.get('new_phone')
+            with self.get_conn() as conn:
+                cur = conn.cursor()
+                new_truck_num = new_data.get('new_truck_num')
+                new_owner_name = new_data.get('new_owner_name')
+                new_phone = new_data.get('new_phone')
             
-            # Edited: Safely getting owner_id with parameterized query
-            cur.execute("SELECT owner_id FROM trucks WHERE truck_num = %s", (original_truck_num,))
-            truck_row = cur.fetchone()
+                # Edited: Safely getting owner_id with parameterized query
+                cur.execute("SELECT owner_id FROM trucks WHERE truck_num = %s", (original_truck_num,))
+                truck_row = cur.fetchone()
             
-            if not truck_row:
-                conn.rollback()
-                return {'success': False, 'error': 'Truck not found.'}
-            owner_id = truck_row[0]
+                if not truck_row:
+                    return {'success': False, 'error': 'Truck not found.'}
+                owner_id = truck_row[0]
             
-            # Edited: Safely updating truck_owners table with parameterized query
-            cur.execute("UPDATE truck_owners SET owner_name = %s, phone = %s WHERE owner_id = %s", (new_owner_name, new_phone, owner_id))
+                # Edited: Safely updating truck_owners table with parameterized query
+                cur.execute("UPDATE truck_owners SET owner_name = %s, phone = %s WHERE owner_id = %s", (new_owner_name, new_phone, owner_id))
             
-            if original_truck_num != new_truck_num:
-                # Edited: Safely updating trucks table with parameterized query
-                cur.execute("UPDATE trucks SET truck_num = %s WHERE truck_num = %s", (new_truck_num, original_truck_num))
+                if original_truck_num != new_truck_num:
+                    # Edited: Safely updating trucks table with parameterized query
+                    cur.execute("UPDATE trucks SET truck_num = %s WHERE truck_num = %s", (new_truck_num, original_truck_num))
             
-            conn.commit()
-            cur.close()
-            conn.close()
+                conn.commit()
+                cur.close()
             
-            return {'success': True}
+                return {'success': True}
             
         except Exception as e:
             print(f"Error updating truck owner: {e}")
-            if 'conn' in locals() and conn:
-                conn.rollback()
             return {'success': False, 'error': str(e)}
\ No newline at end of file
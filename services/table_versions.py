@@ -0,0 +1,146 @@
+"""Change stamps for tables whose readers want "what changed since X".
+
+Every statement that writes a tracked table bumps that table's row in
+table_versions (version + 1, modified_at = now()) from a statement-level
+trigger. The row lock is held until commit, so writers to one table
+commit in version order: once a reader sees version N, every change up to
+N is visible and anything later gets a higher number.
+
+For main the trigger also records which naqla rows each version touched
+in main_changes, which is what the data-entry grid delta is built from;
+only the last MAIN_CHANGES_KEEP_VERSIONS versions are kept.
+The dimension tables only need the stamp, for conditional GETs on their
+listing pages, and so do the tables behind the transaction export, whose
+cached files are keyed on it, and the payment tables, whose ledger grand
+totals are.
+"""
+
+# Dimension tables whose listing pages are served with ETag/Last-Modified.
+VERSIONED_TABLES = ["suppliers", "factories", "zones", "representatives", "bank_name", "truck_owners", "trucks"]
+# Read by the transaction export (with bank_name above).
+EXPORT_VERSIONED_TABLES = ["transactions", "senders"]
+# Read by the payment ledgers' cached grand totals (with the party tables above).
+PAYMENT_VERSIONED_TABLES = ["suppliers_payment", "truck_owners_payment"]
+
+# main_changes keeps the last this-many versions; a reader further behind
+# gets the whole grid again. The trigger trims it every PRUNE_EVERY versions.
+MAIN_CHANGES_KEEP_VERSIONS = 10_000
+MAIN_CHANGES_PRUNE_EVERY = 500
+
+CHANGE_TRACKING_SQL = f"""
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    modified_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS main_changes (
+    version BIGINT NOT NULL,
+    naqla_id INT NOT NULL,
+    op CHAR(1) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS main_changes_version_idx ON main_changes (version);
+
+CREATE OR REPLACE FUNCTION bump_table_version(name text) RETURNS bigint
+LANGUAGE sql AS $$
+    INSERT INTO table_versions AS tv (table_name, version, modified_at)
+    VALUES (name, 1, now())
+    ON CONFLICT (table_name) DO UPDATE
+        SET version = tv.version + 1, modified_at = now()
+    RETURNING version
+$$;
+
+CREATE OR REPLACE FUNCTION track_table_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM bump_table_version(TG_TABLE_NAME);
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION track_main_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    new_version bigint := bump_table_version('main');
+BEGIN
+    INSERT INTO main_changes (version, naqla_id, op)
+    SELECT new_version, naqla_id, left(TG_OP, 1) FROM changed_rows;
+    IF new_version % {MAIN_CHANGES_PRUNE_EVERY} = 0 THEN
+        DELETE FROM main_changes WHERE version <= new_version - {MAIN_CHANGES_KEEP_VERSIONS};
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS main_track_insert ON main;
+CREATE TRIGGER main_track_insert AFTER INSERT ON main
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_main_changes();
+DROP TRIGGER IF EXISTS main_track_update ON main;
+CREATE TRIGGER main_track_update AFTER UPDATE ON main
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_main_changes();
+DROP TRIGGER IF EXISTS main_track_delete ON main;
+CREATE TRIGGER main_track_delete AFTER DELETE ON main
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_main_changes();
+"""
+
+
+def ensure_change_tracking(cur):
+    """Install the version table, the main change log and their triggers."""
+    cur.execute(CHANGE_TRACKING_SQL)
+    for table in VERSIONED_TABLES + EXPORT_VERSIONED_TABLES + PAYMENT_VERSIONED_TABLES:
+        cur.execute(f"""
+            DROP TRIGGER IF EXISTS {table}_track_version ON {table};
+            CREATE TRIGGER {table}_track_version
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION track_table_version();
+        """)
+
+
+def get_table_version(cur, table):
+    """(version, modified_at) of table; (0, None) if it was never written."""
+    cur.execute("SELECT version, modified_at FROM table_versions WHERE table_name = %s", (table,))
+    row = cur.fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def get_tables_version(cur, tables):
+    """Combined stamp for a page built from several tables.
+
+    Returns (versions, modified_at): the tables' versions in the given
+    order and the latest modification time among them (None if none of
+    them was ever written).
+    """
+    cur.execute(
+        "SELECT table_name, version, modified_at FROM table_versions WHERE table_name = ANY(%s)",
+        (list(tables),)
+    )
+    found = {name: (version, modified) for name, version, modified in cur.fetchall()}
+    versions = tuple(found.get(table, (0, None))[0] for table in tables)
+    stamps = [modified for _, modified in found.values()]
+    return versions, max(stamps) if stamps else None
+
+
+def main_changes_cover(since, until):
+    """True if main_changes still holds every version in (since, until].
+
+    Anything at or below until - MAIN_CHANGES_KEEP_VERSIONS may have been
+    pruned, and since=0 would mean replaying the whole log.
+    """
+    return 0 < since <= until and since >= until - MAIN_CHANGES_KEEP_VERSIONS
+
+
+def get_main_changes(cur, since, until):
+    """{naqla_id: first op} for main rows touched in versions (since, until].
+
+    The first op tells an insert apart from an update of an older row; a
+    row that no longer exists was deleted whatever its first op was. Check
+    main_changes_cover() first: older versions may be gone.
+    """
+    cur.execute("""
+        SELECT DISTINCT ON (naqla_id) naqla_id, op
+        FROM main_changes
+        WHERE version > %s AND version <= %s
+        ORDER BY naqla_id, version
+    """, (since, until))
+    return dict(cur.fetchall())
@@ -1,51 +1,222 @@
+import csv
+import io
 import os
-import pandas as pd
-import psycopg2
-from db import PG_PARAMS
+from datetime import date
+from openpyxl import Workbook
+from db import get_connection
+from services.cursors import decode_key, encode_key
+from services.export_cache import export_cache
+from services.table_versions import get_tables_version
 
-SAVEING_PATH = "exports"
+EXPORT_COLUMNS = ['date', 'bank_name', 'receiver', 'phone_number', 'amount', 'transaction_id', 'status']
+# Rows pulled from the server-side cursor per round trip while exporting.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 5000))
+# Bytes handed to the WSGI server per write when streaming a finished file.
+EXPORT_STREAM_BLOCK = 64 * 1024
+# Bump when the exported layout changes so old cached files stop matching.
+EXPORT_FORMAT_VERSION = 1
+# Every table an export reads; a write to any of them changes the cache key.
+EXPORT_TABLES = ("transactions", "senders", "bank_name")
+EXPORT_MIMETYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
 
-def export_transactions_to_excel(start, end):
+TRANSACTION_COLUMNS = """
+    t.date,
+    b.bank_name,
+    t.receiver,
+    t.phone_number,
+    t.amount,
+    t.transaction_id,
+    t.status
+"""
+
+def iter_transactions(start, end, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield every transaction in [start, end] through a server-side named cursor.
+
+    Only chunk_size rows are held in memory at a time. The pooled connection
+    stays checked out until the generator is exhausted or closed.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor(name="transactions_export")
+        cur.itersize = chunk_size
+        cur.execute(f"""
+        SELECT {TRANSACTION_COLUMNS}
+        FROM transactions t
+        JOIN senders s ON t.sender = s.sender_id
+        LEFT JOIN bank_name b ON s.sender_id = b.bank_id
+        WHERE t.date BETWEEN %s AND %s
+        ORDER BY t.date DESC, t.transaction_id DESC
+        """, (start, end))
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+        cur.close()
+
+def stream_transactions_csv(rows):
+    """Encode rows as UTF-8 CSV (with BOM so Excel shows Arabic), one chunk at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+def write_transactions_xlsx(rows, fileobj):
+    """Write rows into fileobj as an .xlsx using openpyxl's write-only mode."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Transactions")
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(fileobj)
+
+def stream_file(fileobj, block_size=EXPORT_STREAM_BLOCK):
     try:
-        data = fetch_transactions_from_db(start, end)
-        if not data:
-            return None
+        fileobj.seek(0)
+        while True:
+            block = fileobj.read(block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        fileobj.close()
 
-        columns = ['date', 'bank_name', 'receiver', 'phone_number', 'amount', 'transaction_id', 'status']
-        df = pd.DataFrame(data, columns=columns)
+def transactions_fingerprint():
+    """Version stamp of the tables an export reads, from table_versions.
 
-        os.makedirs(SAVEING_PATH, exist_ok=True)
-        file_path = os.path.join(SAVEING_PATH, f"Transactions {start} to {end}.xlsx")
-        df.to_excel(file_path, index=False)
-        return file_path
-    except Exception as e:
-        print(f"Export error: {e}")
+    Any insert, update, delete or truncate on them changes it, so it is a
+    single primary-key lookup however many rows the range holds. It is not
+    per range: a write anywhere retires every cached export.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        versions, _ = get_tables_version(cur, EXPORT_TABLES)
+        cur.close()
+    return ":".join(str(version) for version in versions)
+
+def transactions_exist(start, end):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM transactions t
+            JOIN senders s ON t.sender = s.sender_id
+            WHERE t.date BETWEEN %s AND %s
+        )
+        """, (start, end))
+        exists = cur.fetchone()[0]
+        cur.close()
+    return exists
+
+def _cache_while_streaming(chunks, key, extension):
+    writer = export_cache.open_writer(extension)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            yield chunk
+    except BaseException:
+        # Includes GeneratorExit when the client disconnects mid-download.
+        export_cache.discard(writer)
+        raise
+    export_cache.commit(writer, key, extension)
+
+def export_transactions(start, end, fmt="xlsx"):
+    """Build a streaming export of the transactions between start and end.
+
+    Returns (chunks, mimetype, filename), or None when the range is empty.
+    A rendered export is kept in the export cache under the range and the
+    version stamp of the tables it reads, so re-exporting an unchanged range just
+    streams the cached file. On a miss, CSV is streamed straight from the
+    database cursor and saved to the cache as it goes; an .xlsx has to be
+    zipped before it can be sent, so it is written into the cache first.
+    """
+    filename = f"Transactions {start} to {end}.{fmt}"
+    mimetype = EXPORT_MIMETYPES[fmt]
+    # Read before the rows: a write in between only makes the cached copy newer than its key.
+    fingerprint = transactions_fingerprint()
+    key = export_cache.make_key("transactions", EXPORT_FORMAT_VERSION, start, end, fmt, fingerprint)
+
+    path = export_cache.lookup(key, fmt)
+    if path:
+        return stream_file(open(path, "rb")), mimetype, filename
+    if not transactions_exist(start, end):
         return None
 
-def fetch_transactions_from_db(start, end, limit=10, offset=0):
+    rows = iter_transactions(start, end)
+    if fmt == "csv":
+        return _cache_while_streaming(stream_transactions_csv(rows), key, fmt), mimetype, filename
+
+    writer = export_cache.open_writer(fmt)
     try:
-        conn = psycopg2.connect(**PG_PARAMS)
-        cur = conn.cursor()
-        query = """
-        SELECT 
-            t.date,
-            b.bank_name,
-            t.receiver,
-            t.phone_number,
-            t.amount,
-            t.transaction_id,
-            t.status
+        write_transactions_xlsx(rows, writer)
+    except Exception:
+        export_cache.discard(writer)
+        raise
+    path = export_cache.commit(writer, key, fmt)
+    return stream_file(open(path, "rb")), mimetype, filename
+
+def encode_cursor(row):
+    """Opaque page token for a transaction row, keyed on (date, transaction_id)."""
+    return encode_key([row[0].isoformat(), row[5]])
+
+def decode_cursor(token):
+    row_date, transaction_id = decode_key(token, (str, str))
+    return date.fromisoformat(row_date), transaction_id
+
+def fetch_transactions_page(start, end, cursor=None, direction="next", limit=10):
+    """Seek-based page of transactions between start and end, newest first.
+
+    cursor is a token from a previous page's next_cursor/prev_cursor and
+    direction says which way to move from it. The cost of a page doesn't
+    depend on how deep it is. Returns (rows, next_cursor, prev_cursor).
+    """
+    params = [start, end]
+    where = "t.date BETWEEN %s AND %s"
+    backwards = direction == "prev" and cursor is not None
+    if cursor:
+        # A malformed token raises ValueError for the caller to handle.
+        where += " AND (t.date, t.transaction_id) " + (">" if backwards else "<") + " (%s, %s)"
+        params.extend(decode_cursor(cursor))
+    try:
+        order = "ASC" if backwards else "DESC"
+        params.append(limit + 1)
+        query = f"""
+        SELECT {TRANSACTION_COLUMNS}
         FROM transactions t
         JOIN senders s ON t.sender = s.sender_id
         LEFT JOIN bank_name b ON s.sender_id = b.bank_id
-        WHERE t.date BETWEEN %s AND %s
-        ORDER BY t.date DESC
-        LIMIT %s OFFSET %s;
+        WHERE {where}
+        ORDER BY t.date {order}, t.transaction_id {order}
+        LIMIT %s;
         """
-        cur.execute(query, (start, end, limit, offset))
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            cur.close()
     except Exception as e:
         print(f"DB fetch error: {e}")
-        return []
\ No newline at end of file
+        return [], None, None
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return [], None, None
+    if backwards:
+        next_cursor = encode_cursor(rows[-1])
+        prev_cursor = encode_cursor(rows[0]) if has_more else None
+    else:
+        next_cursor = encode_cursor(rows[-1]) if has_more else None
+        prev_cursor = encode_cursor(rows[0]) if cursor else None
+    return rows, next_cursor, prev_cursor
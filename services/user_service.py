@@ -1,13 +1,12 @@
-import psycopg2
 from psycopg2 import extras
-from db import PG_PARAMS
+from db import get_connection
 
 def get_user_by_username(username):
-    conn = psycopg2.connect(**PG_PARAMS)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username = %s", (username,))
-    row = cur.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM users WHERE username = %s", (username,))
+        row = cur.fetchone()
+        cur.close()
     if row:
         return {
             "user_id": row[0],
@@ -18,28 +17,26 @@ def get_user_by_username(username):
     return None
 
 def update_user_password(user_id, new_password_hash):
-    conn = psycopg2.connect(**PG_PARAMS)
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE users SET password_hash = %s WHERE user_id = %s",
-        (new_password_hash, user_id)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE users SET password_hash = %s WHERE user_id = %s",
+            (new_password_hash, user_id)
+        )
+        conn.commit()
+        cur.close()
 
 def get_all_users(exclude_roles=None):
-    conn = psycopg2.connect(**PG_PARAMS)
-    cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=extras.RealDictCursor)
 
-    if exclude_roles:
-        placeholders = ",".join(["%s"] * len(exclude_roles))
-        query = f"SELECT user_id, username, role FROM users WHERE role NOT IN ({placeholders}) ORDER BY username"
-        cur.execute(query, exclude_roles)
-    else:
-        cur.execute("SELECT user_id, username, role FROM users ORDER BY username")
+        if exclude_roles:
+            placeholders = ",".join(["%s"] * len(exclude_roles))
+            query = f"SELECT user_id, username, role FROM users WHERE role NOT IN ({placeholders}) ORDER BY username"
+            cur.execute(query, exclude_roles)
+        else:
+            cur.execute("SELECT user_id, username, role FROM users ORDER BY username")
 
-    users = cur.fetchall()
-    cur.close()
-    conn.close()
+        users = cur.fetchall()
+        cur.close()
     return users
\ No newline at end of file
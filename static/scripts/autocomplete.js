@@ -0,0 +1,79 @@
+// Typeahead for dimension fields. Any <input data-autocomplete="<source>"> gets
+// suggestions from /api/autocomplete/<source> while typing, and is marked
+// invalid unless its value matches an existing record, so a typo can't
+// silently create a new supplier, zone, etc.
+// Picking a value fires an "autocomplete:pick" event with the matched item.
+(function () {
+    const cache = {};
+    let timer = null;
+
+    function fetchOptions(source, q) {
+        const key = source + "\u0000" + q;
+        if (!cache[key]) {
+            cache[key] = fetch(`/api/autocomplete/${source}?q=${encodeURIComponent(q)}`)
+                .then(res => res.ok ? res.json() : [])
+                .catch(() => {
+                    delete cache[key];
+                    return [];
+                });
+        }
+        return cache[key];
+    }
+
+    function escapeHtml(value) {
+        return String(value ?? "").replace(/[&<>"']/g, c => ({
+            "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"
+        }[c]));
+    }
+
+    function datalistFor(source) {
+        const id = `ac-${source}`;
+        let list = document.getElementById(id);
+        if (!list) {
+            list = document.createElement("datalist");
+            list.id = id;
+            document.body.appendChild(list);
+        }
+        return list;
+    }
+
+    function refresh(input) {
+        const source = input.dataset.autocomplete;
+        const list = datalistFor(source);
+        input.setAttribute("list", list.id);
+        fetchOptions(source, input.value.trim()).then(items => {
+            list.innerHTML = items.map(item =>
+                `<option value="${escapeHtml(item.value)}">${escapeHtml(item.label || "")}</option>`
+            ).join("");
+        });
+    }
+
+    function validate(input) {
+        const value = input.value.trim();
+        if (!value) {
+            input.setCustomValidity("");
+            input.dispatchEvent(new CustomEvent("autocomplete:pick", { bubbles: true, detail: null }));
+            return;
+        }
+        fetchOptions(input.dataset.autocomplete, value).then(items => {
+            const match = items.find(item => String(item.value) === value) || null;
+            input.setCustomValidity(match ? "" : "اختر قيمة موجودة من القائمة");
+            input.dispatchEvent(new CustomEvent("autocomplete:pick", { bubbles: true, detail: match }));
+        });
+    }
+
+    document.addEventListener("focusin", e => {
+        if (e.target.matches && e.target.matches("input[data-autocomplete]")) refresh(e.target);
+    });
+    document.addEventListener("input", e => {
+        if (!(e.target.matches && e.target.matches("input[data-autocomplete]"))) return;
+        e.target.setCustomValidity("");
+        clearTimeout(timer);
+        timer = setTimeout(() => refresh(e.target), 200);
+    });
+    document.addEventListener("change", e => {
+        if (e.target.matches && e.target.matches("input[data-autocomplete]")) validate(e.target);
+    });
+
+    window.fetchAutocomplete = fetchOptions;
+})();
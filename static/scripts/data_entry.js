@@ -1,23 +1,50 @@
 document.addEventListener('DOMContentLoaded', function() {
     const tbody = document.querySelector("#data-table tbody");
     
-    // Check if the variables from Jinja are available
-    if (typeof truckArr === 'undefined' || typeof suppliers === 'undefined' || typeof factories === 'undefined' || typeof zones === 'undefined' || typeof representatives === 'undefined') {
-        console.error("Jinja variables are not defined. Make sure the script is loaded after the variables in the HTML file.");
-        return;
-    }
-
-    // Event listener for truck number changes to update owner
-    tbody.addEventListener('change', function(e) {
-        const sel = e.target;
-        if (sel && sel.matches('select[name="truck_num[]"]')) {
-            const row = sel.closest('tr');
+    // Fill the owner when a truck is picked (autocomplete.js fires the event)
+    document.addEventListener('autocomplete:pick', function(e) {
+        const input = e.target;
+        if (input && input.matches('input[name="truck_num[]"]')) {
+            const row = input.closest('tr');
             const ownerInput = row.querySelector('input[name="truck_owner[]"]');
-            const owner = truckMap[sel.value] || '';
-            if (ownerInput) ownerInput.value = owner;
+            if (ownerInput) ownerInput.value = e.detail ? (e.detail.owner || '') : '';
         }
     });
 
+    // Picking a registered truck fills in its owner; a plate with no owner is
+    // one that isn't registered, and the server would skip that row. So it
+    // would a row missing its supplier, factory, zone or representative.
+    const form = document.getElementById('data-form');
+    const requiredFields = ["supplier", "factory", "zone", "representative"];
+    if (form) {
+        // Editing a flagged field clears its message so the form can be sent again.
+        form.addEventListener('input', function(e) {
+            if (e.target.setCustomValidity) e.target.setCustomValidity('');
+        });
+        form.addEventListener('submit', function(e) {
+            const rows = Array.from(form.querySelectorAll('input[name="truck_num[]"]'))
+                .filter(input => input.value.trim()).map(input => input.closest('tr'));
+            const unownedRow = rows.find(row => !row.querySelector('input[name="truck_owner[]"]').value.trim());
+            if (unownedRow) {
+                const unowned = unownedRow.querySelector('input[name="truck_num[]"]');
+                e.preventDefault();
+                unowned.setCustomValidity('اختر شاحنة مسجلة من القائمة');
+                unowned.reportValidity();
+                return;
+            }
+            for (const row of rows) {
+                const blank = requiredFields.map(name => row.querySelector(`input[name="${name}[]"]`))
+                    .find(input => input && !input.value.trim());
+                if (blank) {
+                    e.preventDefault();
+                    blank.setCustomValidity('هذا الحقل مطلوب');
+                    blank.reportValidity();
+                    return;
+                }
+            }
+        });
+    }
+
     // Event listener for removing a row
     tbody.addEventListener('click', function(e) {
         const btn = e.target;
@@ -46,24 +73,162 @@ document.addEventListener('DOMContentLoaded', function() {
             else el.value = '';
         });
 
-        // The representative select field in the cloned row should have an array name
-        const repSelect = newRow.querySelector('select[name="representative[]"]');
-        if (repSelect) {
-            repSelect.name = 'representative[]';
+        tbody.appendChild(newRow);
+    }
+
+    const columnNames = ["date", "truck_num", "truck_owner", "supplier", "factory", "zone", "weight", "ohda", "factory_price", "sell_price", "representative"];
+    const autocompleteSources = {
+        truck_num: "trucks", supplier: "suppliers", factory: "factories",
+        zone: "zones", representative: "representatives"
+    };
+
+    // Current values of a row in edit mode, keyed by column name
+    function rowValues(row) {
+        const values = {};
+        row.querySelectorAll('td').forEach((cell, idx) => {
+            if (idx < 11) {
+                const inputElement = cell.querySelector('input, select');
+                values[columnNames[idx]] = inputElement ? inputElement.value : cell.innerText.trim();
+            }
+        });
+        return values;
+    }
+
+    function isChanged(row) {
+        const original = JSON.parse(row.dataset.original || '{}');
+        const values = rowValues(row);
+        return columnNames.some(name => (original[name] || '') !== (values[name] || ''));
+    }
+
+    // Back to display mode with the given values
+    function closeRow(row, values) {
+        row.querySelectorAll('td').forEach((cell, idx) => {
+            if (idx < 11) cell.textContent = values[columnNames[idx]] || '';
+        });
+        delete row.dataset.original;
+        row.classList.remove('bg-red-100');
+        row.querySelector('.save-btn').classList.add('hidden');
+        row.querySelector('.edit-btn').classList.remove('hidden');
+    }
+
+    // Send only the rows that actually changed, in one request
+    function saveRows(rows) {
+        const invalid = rows.flatMap(row => Array.from(row.querySelectorAll('input'))).find(el => !el.checkValidity());
+        if (invalid) {
+            invalid.reportValidity();
+            return;
         }
 
-        tbody.appendChild(newRow);
+        const changed = [];
+        rows.forEach(row => {
+            if (isChanged(row)) changed.push(row);
+            else closeRow(row, JSON.parse(row.dataset.original));
+        });
+        if (!changed.length) return;
+
+        const payload = changed.map(row => ({ id: row.querySelector('.save-btn').getAttribute('data-id'), ...rowValues(row) }));
+        fetch('/update_records', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ rows: payload })
+        })
+        .then(res => res.json())
+        .then(res => {
+            const failed = [];
+            (res.rows || []).forEach(result => {
+                const row = changed[result.index];
+                if (result.status === 'updated') {
+                    closeRow(row, payload[result.index]);
+                } else {
+                    row.classList.add('bg-red-100');
+                    failed.push(result.error || result.status);
+                }
+            });
+            if (!res.rows) failed.push(res.error || 'unknown error');
+            if (failed.length) alert('Error saving changes:\n' + failed.join('\n'));
+            refreshGrid();
+        })
+        .catch(() => alert('Error saving changes.'));
+    }
+
+    // Month grid: patch rows in place from /data-entry/grid instead of reloading the page
+    const grid = document.getElementById('month-records');
+    // Same as the server's grid-<month>-<since>-<version>: a copy at version V
+    // asking for changes since V is current until the version moves.
+    const gridEtag = () => `"grid-${grid.dataset.month}-${grid.dataset.version}-${grid.dataset.version}"`;
+
+    function buildRow(rec) {
+        const row = document.createElement('tr');
+        row.className = 'border-b';
+        row.dataset.naqlaId = rec[0];
+        row.dataset.date = rec[1];
+        rec.slice(1).forEach(value => {
+            const cell = document.createElement('td');
+            cell.className = 'p-2';
+            cell.textContent = value === null ? 'None' : value;
+            row.appendChild(cell);
+        });
+        row.insertAdjacentHTML('beforeend', `
+            <td class="p-2">
+                <button type="button" class="edit-btn bg-yellow-500 text-white px-3 py-1 rounded hover:bg-yellow-600" data-id="${rec[0]}">Edit</button>
+                <button type="button" class="save-btn bg-green-500 text-white px-3 py-1 rounded hover:bg-green-600 hidden" data-id="${rec[0]}">Save</button>
+            </td>
+            <td class="p-2">
+                <button class="bg-red-500 hover:bg-red-600 text-white px-3 py-1 rounded" onclick="openModal('${rec[0]}')">Delete</button>
+            </td>`);
+        return row;
+    }
+
+    // Newest date first, then newest id, like the server renders it
+    function placeRow(row) {
+        const after = Array.from(grid.rows).find(other => other !== row && (
+            other.dataset.date < row.dataset.date ||
+            (other.dataset.date === row.dataset.date && Number(other.dataset.naqlaId) < Number(row.dataset.naqlaId))
+        ));
+        grid.insertBefore(row, after || null);
     }
 
+    function applyGridDelta(delta) {
+        if (delta.reset) {
+            Array.from(grid.rows).filter(row => !row.dataset.original).forEach(row => row.remove());
+        }
+        delta.deleted.forEach(id => {
+            const row = grid.querySelector(`tr[data-naqla-id="${id}"]`);
+            if (row) row.remove();
+        });
+        delta.inserted.concat(delta.updated).forEach(rec => {
+            const existing = grid.querySelector(`tr[data-naqla-id="${rec[0]}"]`);
+            if (existing && existing.dataset.original) return; // being edited; leave it alone
+            if (existing) existing.remove();
+            placeRow(buildRow(rec));
+        });
+        grid.dataset.version = delta.version;
+    }
+
+    function refreshGrid() {
+        if (!grid) return;
+        const url = `/data-entry/grid?month=${grid.dataset.month}&since=${grid.dataset.version}`;
+        fetch(url, { headers: { 'If-None-Match': gridEtag() } })
+            .then(res => {
+                if (res.status === 304 || !res.ok) return null;
+                return res.json();
+            })
+            .then(delta => { if (delta) applyGridDelta(delta); })
+            .catch(() => {});
+    }
+    window.refreshGrid = refreshGrid;
+
+    setInterval(() => { if (!document.hidden) refreshGrid(); }, 30000);
+    document.addEventListener('visibilitychange', () => { if (!document.hidden) refreshGrid(); });
+
     // Event listener for edit/save buttons
     document.addEventListener('click', function(e) {
         // Edit mode
         if (e.target.classList.contains('edit-btn')) {
             const row = e.target.closest('tr');
             const cells = row.querySelectorAll('td');
+            row.dataset.original = JSON.stringify(rowValues(row));
 
-            const columnNames = ["date", "truck_num", "truck_owner", "supplier", "factory", "zone", "weight", "ohda", "factory_price", "sell_price", "representative"];
-            
             cells.forEach((cell, idx) => {
                 if (idx < 11) { // 11 columns for data
                     const value = cell.innerText.trim();
@@ -74,38 +239,11 @@ document.addEventListener('DOMContentLoaded', function() {
                             newContent = `<input type="date" name="date[]" class="border rounded px-1 w-full" value="${value}">`;
                             break;
                         case "truck_num":
-                            newContent = `<select name="truck_num[]" class="border rounded px-1 w-full">
-                                <option value="">Select Truck</option>
-                                ${truckArr.map(pair => `<option value="${pair[0]}" ${String(pair[0]) === value ? 'selected' : ''}>${pair[0]}</option>`).join('')}
-                            </select>`;
-                            break;
                         case "supplier":
-                            newContent = `<select name="supplier[]" class="border rounded px-1 w-full">
-                                <option value="">Select Supplier</option>
-                                ${suppliers.map(sup => `<option value="${sup.supplier_name}" ${sup.supplier_name === value ? 'selected' : ''}>${sup.supplier_name}</option>`).join('')}
-                            </select>`;
-                            break;
                         case "factory":
-                            // Corrected mapping for factories
-                            newContent = `<select name="factory[]" class="border rounded px-1 w-full">
-                                <option value="">Select Factory</option>
-                                ${factories.map(fac => `<option value="${fac.factory_name}" ${fac.factory_name === value ? 'selected' : ''}>${fac.factory_name}</option>`).join('')}
-                            </select>`;
-                            break;
                         case "zone":
-                            // Corrected mapping for zones
-                            newContent = `<select name="zone[]" class="border rounded px-1 w-full">
-                                <option value="">Select Zone</option>
-                                ${zones.map(z => `<option value="${z.zone_name}" ${z.zone_name === value ? 'selected' : ''}>${z.zone_name}</option>`).join('')}
-                            </select>`;
-                            break;
                         case "representative":
-                            newContent = `<select name="representative[]" class="border rounded px-1 w-full">
-                                <option value="">Select Representative</option>
-                                ${representatives.map(rep => 
-                                    `<option value="${rep.representative_name}" ${rep.representative_name === value ? 'selected' : ''}>${rep.representative_name}</option>`
-                                ).join('')}
-                            </select>`;
+                            newContent = `<input type="text" name="${columnNames[idx]}[]" data-autocomplete="${autocompleteSources[columnNames[idx]]}" autocomplete="off" class="border rounded px-1 w-full" value="${value}">`;
                             break;
                         case "truck_owner":
                             newContent = `<input type="text" name="truck_owner[]" class="border rounded px-1 w-full bg-gray-100" value="${value}" readonly>`;
@@ -122,43 +260,14 @@ document.addEventListener('DOMContentLoaded', function() {
             row.querySelector('.save-btn').classList.remove('hidden');
         }
 
-        // Save mode
+        // Save one row
         if (e.target.classList.contains('save-btn')) {
-            const row = e.target.closest('tr');
-            const id = e.target.getAttribute('data-id');
-            const cells = row.querySelectorAll('td');
-            const data = { id: id };
-            
-            const columnNames = ["date", "truck_num", "truck_owner", "supplier", "factory", "zone", "weight", "ohda", "factory_price", "sell_price", "representative"];
-            
-            cells.forEach((cell, idx) => {
-                if (idx < 11) {
-                    const inputElement = cell.querySelector('input, select');
-                    if (inputElement) {
-                        data[columnNames[idx]] = inputElement.value;
-                        if (inputElement.tagName === 'SELECT') {
-                            cell.innerHTML = inputElement.options[inputElement.selectedIndex].text;
-                        } else {
-                            cell.innerHTML = inputElement.value;
-                        }
-                    }
-                }
-            });
+            saveRows([e.target.closest('tr')]);
+        }
 
-            fetch('/update_record', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(data)
-            })
-            .then(res => res.json())
-            .then(res => {
-                if (res.success) {
-                    e.target.classList.add('hidden');
-                    row.querySelector('.edit-btn').classList.remove('hidden');
-                } else {
-                    alert('Error saving changes.');
-                }
-            });
+        // Save every row still in edit mode
+        if (e.target.id === 'save-all-btn') {
+            saveRows(Array.from(document.querySelectorAll('tr[data-original]')));
         }
     });
 
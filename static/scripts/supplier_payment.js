@@ -27,7 +27,24 @@ document.addEventListener("DOMContentLoaded", function () {
                 updatedData[cell.dataset.field] = input.value;
             });
             updatedData.id = row.dataset.paymentId;
-            updateRecord(updatedData);
+
+            // The name must match an existing record; the server refuses unknown names.
+            const invalid = Array.from(row.querySelectorAll("td[data-field] input")).find(input => !input.checkValidity());
+            if (invalid) {
+                invalid.reportValidity();
+                return;
+            }
+            const nameInput = row.querySelector("input[data-autocomplete]");
+            const name = nameInput.value.trim();
+            window.fetchAutocomplete(nameInput.dataset.autocomplete, name).then(items => {
+                if (!name || !items.some(item => String(item.value) === name)) {
+                    nameInput.setCustomValidity("اختر قيمة موجودة من القائمة");
+                    nameInput.reportValidity();
+                    return;
+                }
+                updatedData[nameInput.name] = name;
+                updateRecord(updatedData);
+            });
         } else {
             row.classList.add("edit-mode");
             row.querySelectorAll("td[data-field]").forEach(cell => {
@@ -35,12 +52,7 @@ document.addEventListener("DOMContentLoaded", function () {
                 const fieldName = cell.dataset.field;
 
                 if (fieldName === "supplier_name") {
-                    let options = suppliersList.map(s =>
-                        `<option value="${s.supplier_name}" ${originalValue === s.supplier_name ? "selected" : ""}>
-                            ${s.supplier_name}
-                        </option>`
-                    ).join("");
-                    cell.innerHTML = `<select name="supplier_name" data-original-value="${originalValue}">${options}</select>`;
+                    cell.innerHTML = `<input type="text" name="supplier_name" data-autocomplete="suppliers" autocomplete="off" value="${originalValue}" data-original-value="${originalValue}">`;
                 } else if (fieldName === "payment_method") {
                     let options = banksList.map(b =>
                         `<option value="${b.bank_id}" ${originalValue === b.bank_name ? "selected" : ""}>
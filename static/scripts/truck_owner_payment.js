@@ -32,7 +32,24 @@ document.addEventListener("DOMContentLoaded", function () {
                 updatedData[cell.dataset.field] = input.value;
             });
             updatedData.id = row.dataset.paymentId;
-            updateRecord(updatedData);
+
+            // The name must match an existing record; the server refuses unknown names.
+            const invalid = Array.from(row.querySelectorAll("td[data-field] input")).find(input => !input.checkValidity());
+            if (invalid) {
+                invalid.reportValidity();
+                return;
+            }
+            const nameInput = row.querySelector("input[data-autocomplete]");
+            const name = nameInput.value.trim();
+            window.fetchAutocomplete(nameInput.dataset.autocomplete, name).then(items => {
+                if (!name || !items.some(item => String(item.value) === name)) {
+                    nameInput.setCustomValidity("اختر قيمة موجودة من القائمة");
+                    nameInput.reportValidity();
+                    return;
+                }
+                updatedData[nameInput.name] = name;
+                updateRecord(updatedData);
+            });
         } else {
             row.classList.add("edit-mode");
             row.querySelectorAll("td[data-field]").forEach(cell => {
@@ -40,12 +57,7 @@ document.addEventListener("DOMContentLoaded", function () {
                 const fieldName = cell.dataset.field;
 
                 if (fieldName === "owner_name") {
-                    let options = ownersList.map(o =>
-                        `<option value="${o.truck_owner}" ${originalValue === o.truck_owner ? "selected" : ""}>
-                            ${o.truck_owner}
-                        </option>`
-                    ).join("");
-                    cell.innerHTML = `<select name="owner_name" data-original-value="${originalValue}">${options}</select>`;
+                    cell.innerHTML = `<input type="text" name="owner_name" data-autocomplete="truck_owners" autocomplete="off" value="${originalValue}" data-original-value="${originalValue}">`;
                 }
                 else if (fieldName === "payment_method") {
                     let options = banksList.map(b =>
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+
+
+@pytest.fixture
+def app():
+    app = create_app(setup=False)
+    app.config.update(TESTING=True, SECRET_KEY="test")
+    return app
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as an admin."""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = 1
+        sess["role"] = "admin"
+    return client
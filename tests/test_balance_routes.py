@@ -0,0 +1,19 @@
+import pytest
+
+from services.cursors import encode_key as cursor
+
+
+@pytest.mark.parametrize("token", [
+    cursor(5),
+    cursor([None, 1, 2]),
+    cursor(["2024-01-01", None, 3]),
+    cursor(["2024-01-01", 1]),
+    cursor(["not-a-date", 1, 2]),
+    "MQ",
+    "!!!",
+])
+@pytest.mark.parametrize("direction", ["after", "before"])
+def test_statement_rejects_malformed_cursor(client, token, direction):
+    response = client.get(f"/api/balances/supplier/1/statement?{direction}={token}")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid date, cursor or limit"}
@@ -0,0 +1,30 @@
+from datetime import date
+
+import pytest
+
+from services.cursors import decode_key, encode_key
+from services.transaction_service import decode_cursor, encode_cursor
+
+
+def test_round_trip():
+    token = encode_key(["2024-01-31", 7, 12])
+    assert "=" not in token
+    assert decode_key(token, (str, int, int)) == ["2024-01-31", 7, 12]
+
+
+@pytest.mark.parametrize("key", [5, None, [], ["2024-01-31"], ["2024-01-31", 7, 12, 1], [True, 7, 12],
+                                 ["2024-01-31", 7.0, 12], ["2024-01-31", True, 12]])
+def test_wrong_shape_is_value_error(key):
+    with pytest.raises(ValueError):
+        decode_key(encode_key(key), (str, int, int))
+
+
+@pytest.mark.parametrize("token", ["", "MQ", "!!!", "e30"])
+def test_garbage_is_value_error(token):
+    with pytest.raises(ValueError):
+        decode_key(token, (str, int))
+
+
+def test_transaction_cursor():
+    row = (date(2024, 1, 31), "bank", "r", "p", 10, "TX1", "ok")
+    assert decode_cursor(encode_cursor(row)) == (date(2024, 1, 31), "TX1")
@@ -0,0 +1,29 @@
+from services.main_data_manager import save_data_entry
+
+ROW = {
+    "date": "2024-01-15", "truck_num": "123", "truck_owner": "owner", "supplier": "supplier",
+    "factory": "factory", "zone": "zone", "weight": "30", "ohda": "", "factory_price": "100",
+    "sell_price": "120", "representative": "representative",
+}
+
+
+def test_save_rejects_blank_factory():
+    result = save_data_entry([{**ROW, "factory": ""}])
+    assert result["inserted"] == 0
+    assert result["rows"] == [{"index": 0, "status": "skipped", "error": "factory is required"}]
+
+
+def test_save_rejects_every_blank_dimension():
+    result = save_data_entry([{**ROW, "supplier": " ", "zone": None, "representative": ""}])
+    assert result["rows"][0]["status"] == "skipped"
+    assert result["rows"][0]["error"] == "supplier, zone, representative are required"
+
+
+def test_update_records_rejects_blank_factory(client):
+    response = client.post("/update_records", json={"rows": [{**ROW, "naqla_id": 7, "factory": ""}]})
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "success": True,
+        "updated": 0,
+        "rows": [{"index": 0, "naqla_id": 7, "status": "skipped", "error": "factory is required"}],
+    }
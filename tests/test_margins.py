@@ -0,0 +1,12 @@
+import pandas as pd
+
+from services.margins import CSV_COLUMNS, MARGIN_GROUPS, margin_report_csv
+
+
+def test_csv_keeps_integer_keys_for_unnamed_parties():
+    column = MARGIN_GROUPS["supplier"]["column"]
+    series = pd.DataFrame({column: [12.0, 0.0], "period": pd.to_datetime(["2024-01-01", "2024-01-01"])})
+    for metric in CSV_COLUMNS[3:]:
+        series[metric] = 1.0
+    lines = margin_report_csv({"series": series, "names": {}}, "supplier", "month").splitlines()
+    assert [line.split(",")[:2] for line in lines[1:]] == [["12", "12"], ["", ""]]